@@ -1,61 +1,123 @@
 import streamlit as st
 import datetime
+from lap_table import model_fingerprint, precompute_lap_table
+from model_store import load_or_train
+from optimizer import PIT_LOSS
+from results_store import ResultsStore, result_key
+from training_frame import FEATURE_NAMES
 from main import (
     load_multi_year_data, get_f1_weather, train_ml_model,
     simulate_strategies, simulate_alternative_strategies,
     simulate_driver_strategy, plot_lap_times
 )
 
+
+def format_race_time(seconds):
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+# Results store handle shared by every session
+@st.cache_resource
+def get_results_store():
+    return ResultsStore()
+
+
+# Model, weather and lap table of a GP, built once per (GP, years) for the whole server. Keyed on those
+# two instead of hashing the laps frame on every rerun
+@st.cache_resource(show_spinner="Loading data and training the model...")
+def load_gp_model(gp_name, years):
+    laps, sessions = load_multi_year_data(list(years), gp_name)
+    total_laps = int(laps['LapNumber'].max())
+    weather = get_f1_weather(sessions[-1])
+    model, feature_names = load_or_train((gp_name, tuple(years), tuple(FEATURE_NAMES)), laps, train_ml_model)
+    lap_table = precompute_lap_table(model, feature_names, total_laps, weather=weather)
+    return {'model': model, 'feature_names': feature_names, 'total_laps': total_laps, 'weather': weather,
+            'lap_table': lap_table, 'fingerprint': model_fingerprint(model, feature_names)}
+
+
+# Best and alternative strategies, recomputed only when the GP, years or model change
+@st.cache_data(show_spinner="Searching strategies...")
+def gp_strategies(gp_name, years, fingerprint, _gp_model):
+    args = (_gp_model['model'], _gp_model['weather'], _gp_model['total_laps'], _gp_model['feature_names'],
+            _gp_model['lap_table'])
+    best_strategy, best_time, best_lap_times = simulate_strategies(*args)
+    alternatives = {name: (strategy, format_race_time(race_time))
+                    for name, (strategy, race_time, _) in simulate_alternative_strategies(*args).items()}
+    return {'best_strategy': best_strategy, 'best_time': format_race_time(best_time),
+            'best_lap_times': best_lap_times, 'alternatives': alternatives}
+
+
+# The driver-dependent section, the only part recomputed when the driver or grid position changes
+@st.cache_data
+def driver_strategy(gp_name, years, fingerprint, driver_name, grid_position, _gp_model):
+    strategy, race_time, _ = simulate_driver_strategy(
+        driver_name, grid_position, _gp_model['model'], _gp_model['weather'], _gp_model['total_laps'],
+        _gp_model['feature_names'], _gp_model['lap_table']
+    )
+    return strategy, format_race_time(race_time)
+
+
 # Set page title
 st.set_page_config(page_title="F1 Strategy Optimization", layout="wide")
 
 # Sidebar
 st.sidebar.title("F1 Strategy Optimizer")
 gp_name = st.sidebar.selectbox("Select Grand Prix", ["Monaco", "Monza", "Bahrain", "Silverstone", "Spa"])
-years = [2022, 2023, 2024]  # Hardcoded for now
+years = (2022, 2023, 2024)  # Hardcoded for now
 
 st.sidebar.subheader("Driver Strategy Settings")
 driver_name = st.sidebar.text_input("Enter Driver's Code (e.g., VER, HAM, LEC)", "VER")
 grid_position = st.sidebar.number_input("Enter Assumed Grid Position", min_value=1, max_value=20, value=1)
 
-# Load data
-st.write(f"### Loading Data for {gp_name} Grand Prix")
-laps, sessions = load_multi_year_data(years, gp_name)
-total_laps = int(laps['LapNumber'].max())
-weather = get_f1_weather(sessions[-1])
+# Precomputed results for this GP and grid position, when precompute.py has stored them; the model is
+# only loaded for the parts the store does not cover
+results_store, model_key = get_results_store(), result_key(gp_name, years)
+stored = results_store.gp_entry(model_key, PIT_LOSS)
+stored_driver = stored and results_store.grid_result(model_key, PIT_LOSS, grid_position)
+gp_model = None if stored_driver else load_gp_model(gp_name, years)
 
-st.write(f"**Current Weather:** 🌡️ {weather['temperature']}°C, 💧 {weather['humidity']}%, ☁️ {weather['weather_condition']}")
-# Ensure laps is a Pandas DataFrame
-laps_df = laps.to_dataframe() if hasattr(laps, 'to_dataframe') else laps
+if stored:
+    weather, result = stored['weather'], stored['result']
+    strategies = {
+        'best_strategy': result['best_strategy']['strategy'],
+        'best_time': result['best_strategy']['predicted_time'],
+        'best_lap_times': [(lap['Lap'], lap['LapTime'], lap['Compound']) for lap in result['lap_times']],
+        'alternatives': {name: (alternative['strategy'], alternative['predicted_time'])
+                         for name, alternative in result['alternative_strategies'].items()},
+    }
+else:
+    weather = gp_model['weather']
+    strategies = gp_strategies(gp_name, years, gp_model['fingerprint'], gp_model)
 
-# Train the model (cached)
-model, feature_names = train_ml_model(laps_df)
+if stored_driver:
+    driver_stints, driver_time = stored_driver['strategy'], stored_driver['predicted_time']
+else:
+    driver_stints, driver_time = driver_strategy(gp_name, years, gp_model['fingerprint'], driver_name,
+                                                 grid_position, gp_model)
+
+st.write(f"### {gp_name} Grand Prix")
+st.write(f"**Current Weather:** 🌡️ {weather['temperature']}°C, 💧 {weather['humidity']}%, ☁️ {weather['weather_condition']}")
 
 # Best Strategy
 st.write("## 🏁 Best Strategy Found")
-best_strategy, best_time, best_lap_times = simulate_strategies(model, weather, total_laps, feature_names)
-st.write(f"**Predicted Race Time:** ⏱ {str(datetime.timedelta(seconds=int(best_time)))}")
-for stint in best_strategy:
+st.write(f"**Predicted Race Time:** ⏱ {strategies['best_time']}")
+for stint in strategies['best_strategy']:
     st.write(f"- **Lap {stint[0]} - {stint[1]}:** {stint[2]}")
 
 # Alternative Strategies
 st.write("## 🔄 Alternative Strategies")
-alternative_strategies = simulate_alternative_strategies(model, weather, total_laps, feature_names)
-for strat_name, (strategy, race_time, _) in alternative_strategies.items():
+for strat_name, (strategy, race_time) in strategies['alternatives'].items():
     with st.expander(f"🔹 {strat_name} Strategy"):
-        st.write(f"**Predicted Race Time:** ⏱ {str(datetime.timedelta(seconds=int(race_time)))}")
+        st.write(f"**Predicted Race Time:** ⏱ {race_time}")
         for stint in strategy:
             st.write(f"- **Lap {stint[0]} - {stint[1]}:** {stint[2]}")
 
 # Driver-Specific Strategy
 st.write(f"## 🚗 {driver_name}'s Personalized Strategy (Grid Position: {grid_position})")
-driver_strategy, driver_time, driver_lap_times = simulate_driver_strategy(
-    driver_name, grid_position, model, weather, total_laps, feature_names
-)
-st.write(f"**Predicted Race Time:** ⏱ {str(datetime.timedelta(seconds=int(driver_time)))}")
-for stint in driver_strategy:
+st.write(f"**Predicted Race Time:** ⏱ {driver_time}")
+for stint in driver_stints:
     st.write(f"- **Lap {stint[0]} - {stint[1]}:** {stint[2]}")
 
 # Show graph
 st.write("## 📊 Lap Time Visualization")
-plot_lap_times(best_lap_times)
+plot_lap_times(strategies['best_lap_times'])
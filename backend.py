@@ -1,91 +1,119 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS  # Allow frontend requests
-import fastf1
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 import datetime
+import hashlib
+import json
+import os
+import threading
+
+from cache_manager import enable_cache
+from compression import compress_response
+from field_sim import evaluate_driver_strategies, overtake_delta
+from jobs import JobManager, QueueFull
+from lap_store import load_sessions
+from lap_table import precompute_lap_table
+from live import LiveStrategy
+from metrics import register_gauges, render, request_debug, request_scope, stage, timed_stage
+from model_registry import ModelRegistry
+from model_store import data_fingerprint, load_model, read_manifest, save_model
+from monte_carlo import simulate_race_distribution, track_status_model
+from optimizer import PIT_LOSS, optimize_strategies, strategy_race_time
+from prediction import COMPOUNDS, WEATHER_FEATURES, predict_strategies
+from results_store import ResultsStore, result_key
+from sweeps import candidate_strategies, crossover_points, sweep
+from training_frame import COMPOUND_CATEGORIES, FEATURE_NAMES, attach_weather, training_arrays, wet_laps
 
 app = Flask(__name__)
 CORS(app)
 
-# Enable caching for FastF1
-fastf1.Cache.enable_cache('cache')
+# Enable caching for FastF1, bounded by F1_CACHE_MAX_MB
+enable_cache()
+
+DEFAULT_YEARS = [2022, 2023, 2024]
+
+# Trained models kept in memory, keyed by (gp_name, years, feature schema)
+model_registry = ModelRegistry(max_size=int(os.environ.get('F1_MODEL_CACHE_SIZE', 8)))
+
+# Answers precomputed by precompute.py, served without loading a model
+results_store = ResultsStore()
+
+# Live planners, one per (session, car) and model, so each /live/plan update reuses the stint costs and
+# remaining-race tables and only adds the laps completed since the last one
+live_planners = ModelRegistry(max_size=int(os.environ.get('F1_LIVE_PLANNERS', 64)))
+
+# Background executor for /predict/jobs
+job_manager = JobManager(max_workers=int(os.environ.get('F1_JOB_WORKERS', 2)),
+                         max_pending=int(os.environ.get('F1_JOB_QUEUE_SIZE', 32)))
+
+# Bumped when the shape of a /predict response changes, so browsers drop responses cached under old ETags
+RESPONSE_VERSION = 2
 
 # Load multi-year data
+@timed_stage('load')
 def load_multi_year_data(years, gp_name):
-    laps_data, sessions = [], []
-    for year in years:
-        session = fastf1.get_session(year, gp_name, 'R')
-        session.load()
-        sessions.append(session)
-        laps_data.append(session.laps)
-    return pd.concat(laps_data, ignore_index=True), sessions
+    sessions = load_sessions([(year, gp_name) for year in years])
+    laps = [attach_weather(session.laps, session.weather_data) for session in sessions]
+    return pd.concat(laps, ignore_index=True), sessions
 
 # Get latest weather data
+@timed_stage('weather')
 def get_f1_weather(session):
     weather_data = session.weather_data.dropna()
     if weather_data.empty:
-        return {'temperature': 25, 'humidity': 50, 'weather_condition': 'Clear'}
+        return {'temperature': 25, 'track_temperature': 35, 'humidity': 50, 'weather_condition': 'Clear'}
     latest_weather = weather_data.iloc[-1]
     return {
         'temperature': float(latest_weather['AirTemp']),
+        'track_temperature': float(latest_weather['TrackTemp']),
         'humidity': float(latest_weather['Humidity']),
         'weather_condition': "Clear" if latest_weather['Rainfall'] == 0 else "Rain"
     }
 
 # Train ML model
+@timed_stage('train')
 def train_ml_model(laps):
-    laps = laps.dropna(subset=['LapTime']).copy()
-    laps['LapTimeSeconds'] = laps['LapTime'].dt.total_seconds()
-    features = pd.get_dummies(laps[['LapNumber', 'TyreLife', 'TrackStatus', 'Compound']], columns=['Compound', 'TrackStatus'])
-    target = laps['LapTimeSeconds']
+    features, target = training_arrays(laps)
     model = RandomForestRegressor(n_estimators=50, random_state=42, n_jobs=-1)
     model.fit(features, target)
+    model.wet_laps_ = wet_laps(features)
     return model, features.columns
 
 # Predict lap times
-def predict_lap_times(model, strategy, weather, feature_names):
-    lap_times = []
-    for stint in strategy:
-        start_lap, end_lap, compound = stint
-        for lap in range(start_lap, end_lap + 1):
-            features = {'LapNumber': lap, 'TyreLife': lap - start_lap + 1, 'TrackStatus_1': 1}
-            for c in ['HARD', 'MEDIUM', 'SOFT']:
-                features[f'Compound_{c}'] = 1 if compound == c else 0
-            features_df = pd.DataFrame([features]).reindex(columns=feature_names, fill_value=0)
-            lap_time = model.predict(features_df)[0]
-            if weather['weather_condition'] == 'Rain':
-                lap_time *= 1.2
-            lap_times.append((lap, lap_time, compound))
-    return lap_times
+def predict_lap_times(model, strategy, weather, feature_names, lap_table=None):
+    return predict_strategies(model, [strategy], weather, feature_names, lap_table)[0]
 
 # Find best strategy
-def find_best_strategy(model, weather, total_laps, feature_names):
-    compounds = ['SOFT', 'MEDIUM', 'HARD']
-    best_strategy, best_time, best_lap_times = None, float('inf'), []
-
-    for first_tire in compounds:
-        for second_tire in [t for t in compounds if t != first_tire]:
-            for third_tire in [t for t in compounds if t != second_tire]:
-                first_stint_end = min(20, total_laps // 3)
-                second_stint_end = min(first_stint_end + 20, 2 * total_laps // 3)
-                third_stint_end = total_laps
-
-                strategy = [(1, first_stint_end, first_tire),
-                            (first_stint_end + 1, second_stint_end, second_tire),
-                            (second_stint_end + 1, third_stint_end, third_tire)]
-
-                lap_times = predict_lap_times(model, strategy, weather, feature_names)
-                race_time = sum(time for _, time, _ in lap_times) + 2 * 20  # Adding pit stop time
+@timed_stage('search')
+def find_best_strategy(model, weather, total_laps, feature_names, lap_table=None, pit_loss=PIT_LOSS):
+    if lap_table is None:
+        lap_table = precompute_lap_table(model, feature_names, total_laps, weather=weather)
 
-                if race_time < best_time:
-                    best_time, best_strategy, best_lap_times = race_time, strategy, lap_times
+    # Search every pit lap for 1-, 2- and 3-stop strategies using at least two compounds
+    best_strategy, _ = optimize_strategies(lap_table, total_laps, weather, pit_loss=pit_loss, top_k=1)[0]
+    best_lap_times = predict_lap_times(model, best_strategy, weather, feature_names, lap_table)
+    best_time = strategy_race_time(best_strategy, best_lap_times, pit_loss)
 
     return best_strategy, best_time, best_lap_times
 
+# Lap times of a strategy as parallel arrays: times rounded to the millisecond and compounds as indexes into
+# 'compounds', about a third of the size of one {Lap, LapTime, Compound} object per lap
+def encode_lap_series(lap_times):
+    compounds = []
+    codes = []
+    for _, _, compound in lap_times:
+        if compound not in compounds:
+            compounds.append(compound)
+        codes.append(compounds.index(compound))
+    return {'lap': [int(lap) for lap, _, _ in lap_times],
+            'time': [round(float(time), 3) for _, time, _ in lap_times],
+            'compound': codes, 'compounds': compounds}
+
 # Generate alternative strategies
-def generate_alternative_strategies(model, weather, total_laps, feature_names):
+@timed_stage('alternatives')
+def generate_alternative_strategies(model, weather, total_laps, feature_names, lap_table=None, pit_loss=PIT_LOSS):
     strategies = {
         "Aggressive 2-Stop": [(1, total_laps // 3, "SOFT"), (total_laps // 3 + 1, 2 * total_laps // 3, "SOFT"),
                               (2 * total_laps // 3 + 1, total_laps, "MEDIUM")],
@@ -94,14 +122,17 @@ def generate_alternative_strategies(model, weather, total_laps, feature_names):
                             (2 * total_laps // 3 + 1, total_laps, "SOFT")]
     }
     results = {}
-    for name, strategy in strategies.items():
-        lap_times = predict_lap_times(model, strategy, weather, feature_names)
-        race_time = sum(time for _, time, _ in lap_times) + len(strategy) * 20
-        results[name] = {'strategy': strategy, 'predicted_time': str(datetime.timedelta(seconds=int(race_time)))}
+    all_lap_times = predict_strategies(model, list(strategies.values()), weather, feature_names, lap_table)
+    for (name, strategy), lap_times in zip(strategies.items(), all_lap_times):
+        race_time = strategy_race_time(strategy, lap_times, pit_loss)
+        results[name] = {'strategy': strategy, 'predicted_time': str(datetime.timedelta(seconds=int(race_time))),
+                         'laps': encode_lap_series(lap_times)}
     return results
 
 # Generate driver-specific strategy
-def generate_driver_strategy(driver_name, grid_position, model, weather, total_laps, feature_names):
+@timed_stage('driver')
+def generate_driver_strategy(driver_name, grid_position, model, weather, total_laps, feature_names, lap_table=None,
+                             pit_loss=PIT_LOSS):
     if grid_position <= 5:
         strategy = [(1, total_laps // 3, "MEDIUM"), (total_laps // 3 + 1, 2 * total_laps // 3, "HARD"),
                     (2 * total_laps // 3 + 1, total_laps, "SOFT")]
@@ -110,37 +141,497 @@ def generate_driver_strategy(driver_name, grid_position, model, weather, total_l
     else:
         strategy = [(1, total_laps // 2, "MEDIUM"), (total_laps // 2 + 1, total_laps, "HARD")]
 
-    lap_times = predict_lap_times(model, strategy, weather, feature_names)
-    race_time = sum(time for _, time, _ in lap_times) + len(strategy) * 20
-    return {'strategy': strategy, 'predicted_time': str(datetime.timedelta(seconds=int(race_time)))}
+    lap_times = predict_lap_times(model, strategy, weather, feature_names, lap_table)
+    race_time = strategy_race_time(strategy, lap_times, pit_loss)
+    return {'strategy': strategy, 'predicted_time': str(datetime.timedelta(seconds=int(race_time))),
+            'laps': encode_lap_series(lap_times)}
 
-# API Endpoints
-@app.route('/predict', methods=['POST'])
-def predict():
-    data = request.json
-    gp_name = data.get('gp_name', 'Monaco')
-    driver_name = data.get('driver_name', 'VER')
-    grid_position = int(data.get('grid_position', 1))
-    years = [2022, 2023, 2024]
+# Race-time distributions from sampled safety cars, VSCs, pit losses and tyre wear for the optimizer's
+# top candidates plus any extra strategies
+@timed_stage('monte_carlo')
+def generate_race_time_distribution(gp_model, extra_strategies, n_scenarios, pit_loss=PIT_LOSS, top_k=20):
+    lap_table, total_laps, weather = gp_model['lap_table'], gp_model['total_laps'], gp_model['weather']
+    strategies = [strategy for strategy, _ in optimize_strategies(lap_table, total_laps, weather, pit_loss=pit_loss,
+                                                                  top_k=top_k)]
+    strategies += [strategy for strategy in extra_strategies if strategy not in strategies]
+    return simulate_race_distribution(lap_table, strategies, total_laps, weather, gp_model['status_model'],
+                                      n_scenarios=n_scenarios, pit_loss=pit_loss,
+                                      processes=int(os.environ.get('F1_MC_PROCESSES', 1)))
+
+# Registry and model store key; the feature schema is part of it so a schema change retrains
+def gp_model_key(gp_name, years):
+    return (gp_name, tuple(years), tuple(FEATURE_NAMES))
+
+# Map a stored model in if one exists, otherwise load, train and store it; then precompute its lap table
+def build_gp_model(gp_name, years, progress=None):
+    progress = progress or (lambda stage: None)
+    key = gp_model_key(gp_name, years)
+    with stage('model_store'):
+        stored = load_model(key)
+    if stored is not None:
+        model, feature_names = stored['model'], stored['feature_names']
+        total_laps, weather = stored['metadata']['total_laps'], stored['metadata']['weather']
+        status_model = stored['metadata'].get('status_model')
+    else:
+        progress('loading')
+        laps, sessions = load_multi_year_data(years, gp_name)
+        total_laps = int(laps['LapNumber'].max())
+        weather = get_f1_weather(sessions[-1])
+        status_model = track_status_model(sessions)
+        progress('training')
+        model, feature_names = train_ml_model(laps)
+        save_model(key, model, feature_names, data_fingerprint(laps),
+                   {'total_laps': total_laps, 'weather': weather, 'status_model': status_model})
+
+    lap_table = precompute_lap_table(model, feature_names, total_laps, weather=weather)
+    return {'model': model, 'feature_names': feature_names, 'total_laps': total_laps,
+            'weather': weather, 'lap_table': lap_table, 'status_model': status_model}
+
+# Trained model for a GP, built once and then served from the registry
+def get_gp_model(gp_name, years, progress=None):
+    return model_registry.get_or_build(gp_model_key(gp_name, years), lambda: build_gp_model(gp_name, years, progress))
+
+# Preload models for a list of GPs so the first requests for them do not train
+def warm_up_models(gp_names, years=DEFAULT_YEARS):
+    for gp_name in gp_names:
+        try:
+            get_gp_model(gp_name, years)
+        except Exception as e:
+            app.logger.warning("Warm-up failed for %s: %s", gp_name, e)
 
-    # Load data
-    laps, sessions = load_multi_year_data(years, gp_name)
-    total_laps = int(laps['LapNumber'].max())
-    weather = get_f1_weather(sessions[-1])
-    model, feature_names = train_ml_model(laps)
+# Model registry and job queue state, read when /metrics is scraped
+def service_gauges():
+    registry, jobs = model_registry.stats(), job_manager.stats()
+    return [
+        ('f1_model_registry_size', None, registry['size'], 'Models held in memory'),
+        ('f1_model_registry_hits', None, registry['hits'], 'Model registry lookups served from memory'),
+        ('f1_model_registry_misses', None, registry['misses'], 'Model registry lookups that built a model'),
+        ('f1_model_registry_evictions', None, registry['evictions'], 'Models evicted from the registry'),
+        ('f1_model_registry_hit_ratio', None, registry['hit_ratio'], 'Share of registry lookups served from memory'),
+        ('f1_jobs_pending', None, jobs['pending'], 'Prediction jobs queued or running'),
+        ('f1_jobs_merged', None, jobs['merged'], 'Job submissions merged into an in-flight job'),
+    ]
+
+register_gauges(service_gauges)
+
+# Optional boot-time warm-up for the comma-separated GPs in F1_WARM_GPS
+if os.environ.get('F1_WARM_GPS'):
+    threading.Thread(target=warm_up_models, args=([gp.strip() for gp in os.environ['F1_WARM_GPS'].split(',')],),
+                     daemon=True).start()
+
+# A forecast is a list with one reading per lap, each a dict of numeric WEATHER_FEATURES values; a readable
+# error is raised here instead of a failure in the middle of the lap table build
+def check_forecast(forecast):
+    if forecast is None:
+        return None
+    if not isinstance(forecast, list) or not all(isinstance(reading, dict) for reading in forecast):
+        raise ValueError(f"Expected forecast to be a list of readings with {', '.join(WEATHER_FEATURES)}")
+    for lap, reading in enumerate(forecast, 1):
+        for name in WEATHER_FEATURES:
+            value = reading.get(name, 0)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"Forecast {name} for lap {lap} is not a number: {value!r}")
+    return forecast
+
+# Normalised request parameters for /predict and /predict/jobs; raises ValueError on a malformed request
+def parse_predict_request(data):
+    return {
+        'gp_name': data.get('gp_name', 'Monaco'),
+        'driver_name': data.get('driver_name', 'VER'),
+        'grid_position': int(data.get('grid_position', 1)),
+        'pit_loss': float(data.get('pit_loss', PIT_LOSS)),
+        'monte_carlo': int(data.get('monte_carlo', 0)),
+        'field_samples': int(data.get('field_samples', 0)),
+        'forecast': check_forecast(data.get('forecast')),
+        'format': data.get('format', 'rows'),
+    }
+
+# Response in the requested format. 'columnar' gives every strategy its lap series under 'laps' and drops the
+# best strategy's per-lap 'lap_times' objects; the default 'rows' keeps the original response shape
+def format_response(response, response_format):
+    if response_format == 'columnar':
+        response = dict(response)
+        lap_times = response.pop('lap_times', None)
+        if 'best_strategy' in response and 'laps' not in response['best_strategy'] and lap_times is not None:
+            response['best_strategy'] = {**response['best_strategy'], 'laps': encode_lap_series(
+                [(lap['Lap'], lap['LapTime'], lap['Compound']) for lap in lap_times])}
+        return response
+
+    def rows(strategy):
+        return {key: value for key, value in strategy.items() if key != 'laps'} if strategy else strategy
+
+    response = dict(response)
+    for key in ('best_strategy', 'driver_strategy'):
+        if key in response:
+            response[key] = rows(response[key])
+    if 'alternative_strategies' in response:
+        response['alternative_strategies'] = {name: rows(strategy)
+                                              for name, strategy in response['alternative_strategies'].items()}
+    return response
+
+# Weak ETag of a /predict response: a hash of the request parameters, the stored model and the results store,
+# so it is known before anything is computed and changes when either store is rewritten
+def prediction_etag(params):
+    manifest = read_manifest(gp_model_key(params['gp_name'], DEFAULT_YEARS))
+    version = {'response': RESPONSE_VERSION, 'model': manifest and manifest['file'],
+               'results': results_store.version()}
+    return hashlib.sha256(json.dumps([params, version], sort_keys=True).encode()).hexdigest()[:32]
+
+# GP-level part of a prediction, shared by every driver and grid position at that GP. A forecast (one weather
+# reading per lap) replaces the latest recorded weather and gets its own lap table
+def run_gp_prediction(gp_name, pit_loss, progress=None, forecast=None, years=None):
+    progress = progress or (lambda stage: None)
+
+    # Load data and train, or reuse the model already trained for this GP
+    gp_model = get_gp_model(gp_name, years or DEFAULT_YEARS, progress)
+    if forecast:
+        weather = {**gp_model['weather'], 'forecast': forecast}
+        gp_model = {**gp_model, 'weather': weather, 'lap_table': precompute_lap_table(
+            gp_model['model'], gp_model['feature_names'], gp_model['total_laps'], weather=weather)}
+    model, feature_names = gp_model['model'], gp_model['feature_names']
+    total_laps, weather, lap_table = gp_model['total_laps'], gp_model['weather'], gp_model['lap_table']
 
     # Find strategies
-    best_strategy, best_time, best_lap_times = find_best_strategy(model, weather, total_laps, feature_names)
-    alternative_strategies = generate_alternative_strategies(model, weather, total_laps, feature_names)
-    driver_strategy = generate_driver_strategy(driver_name, grid_position, model, weather, total_laps, feature_names)
+    progress('searching')
+    best_strategy, best_time, best_lap_times = find_best_strategy(model, weather, total_laps, feature_names, lap_table, pit_loss)
+    alternative_strategies = generate_alternative_strategies(model, weather, total_laps, feature_names, lap_table,
+                                                             pit_loss)
 
-    # Return response with lap time data
-    return jsonify({
-        'best_strategy': {'strategy': best_strategy, 'predicted_time': str(datetime.timedelta(seconds=int(best_time)))},
+    return gp_model, {
+        'best_strategy': {'strategy': best_strategy, 'predicted_time': str(datetime.timedelta(seconds=int(best_time))),
+                          'laps': encode_lap_series(best_lap_times)},
         'alternative_strategies': alternative_strategies,
-        'driver_strategy': driver_strategy,
         'lap_times': [{'Lap': lap, 'LapTime': time, 'Compound': compound} for lap, time, compound in best_lap_times]
-    })
+    }
+
+# Driver-dependent part of a prediction; only the grid position changes the strategy
+def run_driver_prediction(gp_model, driver_name, grid_position, pit_loss=PIT_LOSS):
+    return generate_driver_strategy(driver_name, grid_position, gp_model['model'], gp_model['weather'],
+                                    gp_model['total_laps'], gp_model['feature_names'], gp_model['lap_table'],
+                                    pit_loss)
+
+# Monte Carlo distributions for a GP result plus the given driver strategies
+def run_race_time_distribution(gp_model, gp_result, driver_strategies, n_scenarios, pit_loss):
+    extra = [gp_result['best_strategy']['strategy']] + [a['strategy'] for a in gp_result['alternative_strategies'].values()]
+    extra += [d['strategy'] for d in driver_strategies]
+    return generate_race_time_distribution(gp_model, extra, n_scenarios, pit_loss)
+
+# Rank the driver's candidate strategies in a simulated 20-car race with traffic, against rivals on the
+# optimizer's top plans and the alternative strategies
+@timed_stage('field')
+def run_field_simulation(gp_model, gp_name, gp_result, driver_strategy, grid_position, n_samples, pit_loss):
+    lap_table, total_laps, weather = gp_model['lap_table'], gp_model['total_laps'], gp_model['weather']
+    top = [strategy for strategy, _ in optimize_strategies(lap_table, total_laps, weather, pit_loss=pit_loss, top_k=10)]
+    alternatives = [a['strategy'] for a in gp_result['alternative_strategies'].values()]
+    candidates = []
+    for strategy in top[:5] + alternatives + [driver_strategy['strategy']]:
+        if strategy not in candidates:
+            candidates.append(strategy)
+    return evaluate_driver_strategies(lap_table, total_laps, weather, candidates, top + alternatives, grid_position,
+                                      n_samples=n_samples, pit_loss=pit_loss, overtake=overtake_delta(gp_name))
+
+# Precomputed response for a plain request (no forecast, Monte Carlo or field mode), or None
+def stored_prediction(params):
+    if params['forecast'] or params['monte_carlo'] > 0 or params['field_samples'] > 0:
+        return None
+    with stage('results_store'):
+        return results_store.lookup(result_key(params['gp_name'], DEFAULT_YEARS), params['pit_loss'],
+                                    params['grid_position'])
+
+# Compute the full /predict response; progress(stage) is told when loading, training and searching start
+def run_prediction(params, progress=None):
+    stored = stored_prediction(params)
+    if stored is not None:
+        return format_response(stored, params['format'])
+
+    gp_model, response = run_gp_prediction(params['gp_name'], params['pit_loss'], progress, params['forecast'])
+    response['driver_strategy'] = run_driver_prediction(gp_model, params['driver_name'], params['grid_position'],
+                                                        params['pit_loss'])
+
+    # Optional Monte Carlo mode: race-time distribution over this many sampled races per strategy
+    if params['monte_carlo'] > 0:
+        response['race_time_distribution'] = run_race_time_distribution(
+            gp_model, response, [response['driver_strategy']], params['monte_carlo'], params['pit_loss'])
+
+    # Optional field mode: the driver's candidates raced against this many sampled 20-car fields
+    if params['field_samples'] > 0:
+        response['field_strategies'] = run_field_simulation(
+            gp_model, params['gp_name'], response, response['driver_strategy'], params['grid_position'],
+            params['field_samples'], params['pit_loss'])
+    return format_response(response, params['format'])
+
+# GP-level result and driver strategies of a batch group from the results store, or None unless all are stored
+def stored_group(gp_name, pit_loss, members):
+    if any(params['forecast'] or params['monte_carlo'] > 0 for params in members):
+        return None
+    with stage('results_store'):
+        model_key = result_key(gp_name, DEFAULT_YEARS)
+        entry = results_store.gp_entry(model_key, pit_loss)
+        if entry is None:
+            return None
+        drivers = [results_store.grid_result(model_key, pit_loss, params['grid_position']) for params in members]
+    if any(driver is None for driver in drivers):
+        return None
+    return entry['result'], drivers
+
+# Predictions for many parsed (gp_name, driver_name, grid_position) requests. Requests are grouped by GP so the
+# load, training and strategy search run once per group; a failing group does not fail the others.
+# Groups the results store covers are answered from it
+def run_batch_prediction(params_list, response_format='rows'):
+    groups = {}
+    for params in params_list:
+        params['forecast_key'] = json.dumps(params['forecast']) if params['forecast'] else None
+        group_key = (params['gp_name'], params['pit_loss'], params['monte_carlo'], params['forecast_key'])
+        groups.setdefault(group_key, []).append(params)
+
+    group_results, group_index, driver_results = [], {}, {}
+    for group_key, members in groups.items():
+        gp_name, pit_loss, monte_carlo, _ = group_key
+        group_index[group_key] = len(group_results)
+        stored = stored_group(gp_name, pit_loss, members)
+        if stored is not None:
+            gp_result, group_drivers = stored
+            for params, driver_result in zip(members, group_drivers):
+                driver_results[group_key + (params['driver_name'], params['grid_position'])] = driver_result
+            group_results.append({'gp_name': gp_name, 'pit_loss': pit_loss,
+                                  **format_response(gp_result, response_format)})
+            continue
+        try:
+            gp_model, gp_result = run_gp_prediction(gp_name, pit_loss, forecast=members[0]['forecast'])
+            group_drivers = []
+            for params in members:
+                key = group_key + (params['driver_name'], params['grid_position'])
+                driver_results[key] = run_driver_prediction(gp_model, params['driver_name'], params['grid_position'],
+                                                            pit_loss)
+                group_drivers.append(driver_results[key])
+            if monte_carlo > 0:
+                gp_result['race_time_distribution'] = run_race_time_distribution(
+                    gp_model, gp_result, group_drivers, monte_carlo, pit_loss)
+        except Exception as e:
+            app.logger.exception("Batch prediction failed for %s", gp_name)
+            gp_result = {'error': str(e)}
+        group_results.append({'gp_name': gp_name, 'pit_loss': pit_loss,
+                              **format_response(gp_result, response_format)})
+
+    results = []
+    for params in params_list:
+        group_key = (params['gp_name'], params['pit_loss'], params['monte_carlo'], params['forecast_key'])
+        key = group_key + (params['driver_name'], params['grid_position'])
+        results.append({'gp_name': params['gp_name'], 'driver_name': params['driver_name'],
+                        'grid_position': params['grid_position'], 'group': group_index[group_key],
+                        'driver_strategy': format_response({'driver_strategy': driver_results.get(key)},
+                                                           response_format)['driver_strategy']})
+    return {'groups': group_results, 'results': results}
+
+# run_prediction on a job worker, timed like a /predict request
+def run_prediction_job(params, progress):
+    with request_scope('predict_job'):
+        response = run_prediction(params, progress)
+        response['debug'] = request_debug()
+        return response
+
+# Compress every response the client accepts compressed
+@app.after_request
+def compress(response):
+    return compress_response(response, request.accept_encodings)
+
+# API Endpoints
+# GET takes the same parameters as query arguments (except a forecast), so browsers can cache the response
+# and revalidate it with If-None-Match; a matching ETag is answered with 304 before anything is computed
+@app.route('/predict', methods=['GET', 'POST'])
+def predict():
+    if request.method == 'GET':
+        data = request.args.to_dict()
+        data.pop('forecast', None)
+    else:
+        data = request.json
+    with request_scope('predict'):
+        try:
+            params = parse_predict_request(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        etag = prediction_etag(params)
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers={'ETag': f'W/"{etag}"', 'Cache-Control': 'no-cache'})
+        response = run_prediction(params)
+        response['debug'] = request_debug()
+        with stage('serialize'):
+            response = jsonify(response)
+        # Recomputed: a first request trains and stores the model, which changes the manifest
+        response.set_etag(prediction_etag(params), weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+# Body: {"requests": [{"gp_name": ..., "driver_name": ..., "grid_position": ...}, ...], "format": ...}. Each
+# result points at its GP-level best and alternative strategies in "groups"
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    items = request.json.get('requests', [])
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': "Expected a non-empty 'requests' list"}), 400
+    with request_scope('predict_batch'):
+        try:
+            params_list = [parse_predict_request(item) for item in items]
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        response = run_batch_prediction(params_list, request.json.get('format', 'rows'))
+        response['debug'] = request_debug()
+        with stage('serialize'):
+            return jsonify(response)
+
+
+# Submit a prediction to the background executor; identical in-flight requests share one job
+@app.route('/predict/jobs', methods=['POST'])
+def submit_prediction_job():
+    try:
+        params = parse_predict_request(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        job = job_manager.submit(json.dumps(params, sort_keys=True), lambda progress: run_prediction_job(params, progress))
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify(job.to_dict()), 202
+
+
+# Live planner for a car, kept between requests when the client names its session and car
+def live_planner(data, gp_model, pit_loss):
+    def build():
+        return {'live': LiveStrategy(gp_model['lap_table'], gp_model['total_laps'], gp_model['weather'], pit_loss),
+                'lock': threading.Lock()}
+
+    if data.get('session_id') is None:
+        return build()
+    key = (str(data['session_id']), str(data.get('car', data.get('driver_name', ''))), data.get('gp_name', 'Monaco'),
+           pit_loss, gp_model['lap_table'].fingerprint)
+    return live_planners.get_or_build(key, build)
+
+# A request field converted with int or float, or None when it is missing or not a number
+def number_field(data, name, convert, default=None):
+    try:
+        return convert(data.get(name, default))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+# A request field that must be a non-empty list of numbers, as floats, or None when it is not one
+def number_list(data, name, default):
+    values = data.get(name, default)
+    if not isinstance(values, list) or not values:
+        return None
+    try:
+        return [float(value) for value in values]
+    except (TypeError, ValueError):
+        return None
+
+# Re-plan the rest of a race from a car's current state. Body: gp_name, lap (last completed), compound,
+# tyre_life, stops, compounds_used and optionally the completed laps so far as
+# [{"lap", "compound", "tyre_life", "lap_time", "track_status"}], which correct the pre-race model.
+# With session_id and car, the planner is kept for the next update: laps it has seen are skipped, so a client
+# can send only the new laps or all of them
+@app.route('/live/plan', methods=['POST'])
+def live_plan():
+    data = request.json
+    # The current tyre has to be one the planner plans with; earlier stints may also have been on wet tyres
+    compounds_used = data.get('compounds_used', [data.get('compound')])
+    if data.get('compound') not in COMPOUNDS:
+        return jsonify({'error': f"Unknown compound {data.get('compound')!r}, expected one of {COMPOUNDS}"}), 400
+    if not isinstance(compounds_used, list) or any(c not in COMPOUND_CATEGORIES for c in compounds_used):
+        return jsonify({'error': f"Unknown compounds_used {compounds_used!r}"}), 400
+    state = {'lap': number_field(data, 'lap', int), 'tyre_life': number_field(data, 'tyre_life', int),
+             'stops': number_field(data, 'stops', int, 0), 'pit_loss': number_field(data, 'pit_loss', float, PIT_LOSS)}
+    invalid = [name for name, value in state.items() if value is None]
+    if invalid:
+        return jsonify({'error': f"Missing or non-numeric {', '.join(invalid)}"}), 400
+    with request_scope('live_plan'):
+        gp_model = get_gp_model(data.get('gp_name', 'Monaco'), DEFAULT_YEARS)
+        planner = live_planner(data, gp_model, state['pit_loss'])
+        live = planner['live']
+        with planner['lock']:
+            for lap in sorted(data.get('laps', []), key=lambda lap: lap['lap']):
+                live.add_lap(lap['lap'], lap['compound'], lap['tyre_life'], float(lap['lap_time']),
+                             lap.get('track_status', '1'))
+            with stage('search'):
+                plan = live.plan(state['lap'], data['compound'], state['tyre_life'], state['stops'], compounds_used)
+            correction = live.correction.tolist()
+        if plan is None:
+            return jsonify({'error': 'No plan for this state'}), 400
+        plan['correction'] = dict(zip(COMPOUNDS, correction))
+        plan['debug'] = request_debug()
+        return jsonify(plan)
+
+
+# Best strategy over a grid of pit losses, rain factors and red-flag race lengths, and where it changes.
+# Body: gp_name and optionally pit_losses, rain_factors and race_laps lists; best[p][r][l] indexes strategies
+@app.route('/sweep', methods=['POST'])
+def sweep_strategies():
+    data = request.json
+    pit_losses, rain = number_list(data, 'pit_losses', [PIT_LOSS]), number_list(data, 'rain_factors', [1.0])
+    for name, values in (('pit_losses', pit_losses), ('rain_factors', rain)):
+        if values is None:
+            return jsonify({'error': f"Expected a non-empty list of numbers for {name}, got {data.get(name)!r}"}), 400
+    with request_scope('sweep'):
+        gp_model = get_gp_model(data.get('gp_name', 'Monaco'), DEFAULT_YEARS)
+        lap_table, total_laps = gp_model['lap_table'], gp_model['total_laps']
+        with stage('search'):
+            strategies = candidate_strategies(lap_table, total_laps, pit_losses)
+            try:
+                result = sweep(lap_table, strategies, total_laps, pit_losses, rain, data.get('race_laps', [total_laps]))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            crossovers = crossover_points(result)
+        return jsonify({'strategies': strategies, 'best': result['best'].tolist(),
+                        'best_time': result['best_time'].tolist(), 'crossovers': crossovers,
+                        'debug': request_debug()})
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.status == 'failed':
+        return jsonify(job.to_dict()), 500
+    if not job.done:
+        return jsonify(job.to_dict()), 202
+    return jsonify(job.result)
+
+
+# Server-sent events with the job's progress stages, ending with a 'done' or 'failed' stage
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    def stream():
+        for event in job.wait_events():
+            if event is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/models', methods=['GET'])
+def models():
+    return jsonify({**model_registry.stats(), 'jobs': job_manager.stats()})
+
+
+# Prometheus text format: per-stage latency histograms, prediction counts and cache hit ratios
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
 
 
 # Run the API
@@ -0,0 +1,76 @@
+"""Compare per-lap prediction with the batched path on all 12 compound orders of a Monaco-length race."""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import backend
+from benchmarks.synthetic import synthetic_multi_year_laps
+from prediction import learns_rain, model_weather, predict_strategies, rain_factors
+
+
+# The original one-DataFrame-per-lap prediction loop, kept as the reference implementation
+def predict_lap_times_per_lap(model, strategy, weather, feature_names):
+    lap_times = []
+    for start_lap, end_lap, compound in strategy:
+        for lap in range(start_lap, end_lap + 1):
+            features = {'LapNumber': lap, 'TyreLife': lap - start_lap + 1, 'TrackStatus_1': 1}
+            models_rain = learns_rain(model, feature_names)
+            features.update({name: values[0] for name, values in model_weather(weather, [lap], models_rain).items()})
+            for c in ['HARD', 'MEDIUM', 'SOFT']:
+                features[f'Compound_{c}'] = 1 if compound == c else 0
+            features_df = pd.DataFrame([features]).reindex(columns=feature_names, fill_value=0)
+            lap_time = model.predict(features_df)[0]
+            lap_time *= rain_factors(weather, [lap], models_rain)[0]
+            lap_times.append((lap, lap_time, compound))
+    return lap_times
+
+
+def compound_orders(total_laps):
+    compounds = ['SOFT', 'MEDIUM', 'HARD']
+    first_stint_end = min(20, total_laps // 3)
+    second_stint_end = min(first_stint_end + 20, 2 * total_laps // 3)
+    return [[(1, first_stint_end, a), (first_stint_end + 1, second_stint_end, b), (second_stint_end + 1, total_laps, c)]
+            for a in compounds for b in compounds if b != a for c in compounds if c != b]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--laps', type=int, default=78)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--rain', action='store_true')
+    args = parser.parse_args()
+
+    laps = synthetic_multi_year_laps(total_laps=args.laps)
+    model, feature_names = backend.train_ml_model(laps)
+    weather = {'weather_condition': 'Rain' if args.rain else 'Clear'}
+    strategies = compound_orders(args.laps)
+
+    per_lap_time, reference = best_of(
+        lambda: [predict_lap_times_per_lap(model, s, weather, feature_names) for s in strategies], args.repeat)
+    batched_time, batched = best_of(
+        lambda: predict_strategies(model, strategies, weather, feature_names), args.repeat)
+
+    reference_rows = [row for lap_times in reference for row in lap_times]
+    batched_rows = [row for lap_times in batched for row in lap_times]
+    same_laps = [(lap, c) for lap, _, c in reference_rows] == [(lap, c) for lap, _, c in batched_rows]
+    max_diff = float(np.max(np.abs(np.array([t for _, t, _ in reference_rows]) - np.array([t for _, t, _ in batched_rows]))))
+
+    print(f"strategies: {len(strategies)}, predicted laps: {len(batched_rows)}")
+    print(f"per-lap:  {per_lap_time * 1000:9.1f} ms")
+    print(f"batched:  {batched_time * 1000:9.1f} ms  ({per_lap_time / batched_time:.0f}x faster)")
+    print(f"laps/compounds identical: {same_laps}, max lap time difference: {max_diff:.3g} s")
+
+
+if __name__ == '__main__':
+    main()
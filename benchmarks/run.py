@@ -0,0 +1,159 @@
+"""Offline benchmark suite: times ingestion, training, prediction, strategy search and /predict end to end
+on synthetic FastF1-shaped sessions, and writes the timings as JSON for comparison between commits."""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'median': statistics.median(timings), 'repeat': repeat}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Run every stage against synthetic sessions stored in a scratch working directory
+def run_benchmarks(total_laps, drivers, seasons, repeat):
+    workdir = tempfile.mkdtemp(prefix='f1-bench-')
+    os.chdir(workdir)
+    os.makedirs('cache')
+
+    import backend
+    import lap_store
+    import lap_table
+    from benchmarks.predict_batch import predict_lap_times_per_lap
+    from benchmarks.synthetic import synthetic_seasons
+    from optimizer import optimize_strategies
+
+    gp_name = 'Synthetic'
+    years = list(range(2024 - seasons + 1, 2025))
+    backend.DEFAULT_YEARS = years
+    sessions = synthetic_seasons(years, gp_name, total_laps=total_laps, drivers=drivers)
+    weather = {'weather_condition': 'Clear'}
+    results = {}
+
+    # Ingestion: write each season to the columnar lap store, then read them back
+    results['ingest_write'] = timed(lambda: [lap_store.write_session(s, s.year, gp_name, tempfile.mkdtemp(dir='.'))
+                                             for s in sessions], repeat)
+    for session in sessions:
+        lap_store.write_session(session, session.year, gp_name)
+    results['ingest_read'] = timed(lambda: backend.load_multi_year_data(years, gp_name), repeat)
+
+    laps, stored_sessions = backend.load_multi_year_data(years, gp_name)
+    results['train'] = timed(lambda: backend.train_ml_model(laps), repeat)
+    model, feature_names = backend.train_ml_model(laps)
+
+    table_laps = int(laps['LapNumber'].max())
+    results['lap_table_build'] = timed(lambda: lap_table.build_lap_time_table(model, feature_names, table_laps, weather), repeat)
+    table = lap_table.precompute_lap_table(model, feature_names, table_laps, weather=weather)
+
+    strategy = [(1, table_laps // 2, 'MEDIUM'), (table_laps // 2 + 1, table_laps, 'HARD')]
+    results['predict_strategy_per_lap'] = timed(
+        lambda: predict_lap_times_per_lap(model, strategy, weather, feature_names), 1)
+    results['predict_strategy_model'] = timed(
+        lambda: backend.predict_lap_times(model, strategy, weather, feature_names), repeat)
+    results['predict_strategy_table'] = timed(
+        lambda: backend.predict_lap_times(model, strategy, weather, feature_names, table), repeat)
+
+    results['strategy_search'] = timed(lambda: optimize_strategies(table, table_laps, weather, top_k=5), repeat)
+    results['find_best_strategy'] = timed(
+        lambda: backend.find_best_strategy(model, weather, table_laps, feature_names, table), repeat)
+    results['alternative_strategies'] = timed(
+        lambda: backend.generate_alternative_strategies(model, weather, table_laps, feature_names, table), repeat)
+
+    # /predict end to end: the first request trains and stores the model, later ones hit the registry
+    client = backend.app.test_client()
+    body = {'gp_name': gp_name, 'driver_name': 'D00', 'grid_position': 3}
+    results['predict_endpoint_cold'] = timed(lambda: client.post('/predict', json=body), 1)
+    results['predict_endpoint_warm'] = timed(lambda: client.post('/predict', json=body), repeat)
+    backend.model_registry.clear()
+    results['predict_endpoint_model_store'] = timed(
+        lambda: (backend.model_registry.clear(), client.post('/predict', json=body)), repeat)
+
+    return results
+
+
+# Compare with an earlier results file; returns the stages slower than threshold (e.g. 1.2 = 20% slower)
+# and by more than min_delta seconds, so sub-millisecond jitter is not reported
+def compare(results, baseline, threshold, min_delta=0.002):
+    regressions = []
+    print(f"{'stage':34s} {'baseline':>12s} {'current':>12s} {'ratio':>7s}")
+    for stage, current in results.items():
+        before = baseline.get('results', {}).get(stage)
+        if not before:
+            continue
+        ratio = current['min'] / before['min'] if before['min'] else float('inf')
+        flag = '  REGRESSION' if ratio > threshold and current['min'] - before['min'] > min_delta else ''
+        print(f"{stage:34s} {before['min'] * 1000:10.2f}ms {current['min'] * 1000:10.2f}ms {ratio:6.2f}x{flag}")
+        if flag:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--laps', type=int, default=78, help='race length')
+    parser.add_argument('--drivers', type=int, default=20, help='field size')
+    parser.add_argument('--seasons', type=int, default=3, help='number of seasons to train on')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='bench_output.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2, help='slowdown ratio reported as a regression')
+    parser.add_argument('--min-delta', type=float, default=0.002, help='smallest slowdown in seconds reported')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    sys.path.insert(0, REPO_ROOT)
+
+    workdir = os.getcwd()
+    try:
+        results = run_benchmarks(args.laps, args.drivers, args.seasons, args.repeat)
+    finally:
+        scratch = os.getcwd()
+        os.chdir(workdir)
+        if scratch != workdir:
+            shutil.rmtree(scratch, ignore_errors=True)
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'config': {'laps': args.laps, 'drivers': args.drivers, 'seasons': args.seasons, 'repeat': args.repeat},
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for stage, timing in results.items():
+        print(f"{stage:34s} {timing['min'] * 1000:10.2f} ms")
+    print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_delta)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
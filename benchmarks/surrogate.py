@@ -0,0 +1,80 @@
+"""Accuracy and speed of the tyre degradation surrogate against the forest: per-lap error over the lap table,
+and a full strategy search on the forest's lap table against a surrogate search finished on the forest."""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import backend
+from benchmarks.synthetic import synthetic_seasons
+from lap_table import build_lap_time_table
+from optimizer import PIT_LOSS, optimize_strategies
+from prediction import COMPOUNDS
+from surrogate import GRID_STEP, RERANK_CANDIDATES, ForestCells, fit_surrogate, optimize_with_surrogate
+from training_frame import attach_weather
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, nargs='+', default=[2022, 2023, 2024])
+    parser.add_argument('--total-laps', type=int, default=78)
+    parser.add_argument('--candidates', type=int, default=RERANK_CANDIDATES, help='plans re-ranked by the forest')
+    parser.add_argument('--step', type=int, default=GRID_STEP, help='laps between the grid points fitted')
+    parser.add_argument('--pit-loss', type=float, default=PIT_LOSS)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    sessions = synthetic_seasons(args.years, total_laps=args.total_laps)
+    laps = pd.concat([attach_weather(s.laps, s.weather_data) for s in sessions], ignore_index=True)
+    model, feature_names = backend.train_ml_model(laps)
+    weather = backend.get_f1_weather(sessions[-1])
+    total_laps = args.total_laps
+
+    def forest_search():
+        table = build_lap_time_table(model, feature_names, total_laps, weather)
+        return table, optimize_strategies(table, total_laps, weather, pit_loss=args.pit_loss)
+
+    def surrogate_search():
+        cells = ForestCells(model, feature_names, total_laps, weather)
+        return cells, optimize_with_surrogate(model, feature_names, total_laps, weather, pit_loss=args.pit_loss,
+                                              candidates=args.candidates, step=args.step, cells=cells)
+
+    (table, forest_plans), forest_time = timed(forest_search, args.repeat)
+    (cells, surrogate_plans), surrogate_time = timed(surrogate_search, args.repeat)
+    surrogate = fit_surrogate(cells, args.step)
+
+    # Per-lap error over every reachable (compound, lap, tyre age) cell of the green-flag table
+    lap, age = np.meshgrid(np.arange(1, total_laps + 1), np.arange(1, total_laps + 1), indexing='ij')
+    reachable = age <= lap
+    forest_laps = table.times[table.statuses.index('1')][:, 1:, 1:]
+    print(f"{'compound':10s} {'MAE (s)':>8s} {'max (s)':>8s}")
+    for c, compound in enumerate(COMPOUNDS):
+        error = np.abs(surrogate.lap_times(c, lap, age) - forest_laps[c])[reachable]
+        print(f"{compound:10s} {error.mean():8.3f} {error.max():8.3f}")
+
+    # Both searches' plans scored by the forest, so the gap is what the surrogate search gives up
+    forest_best, forest_best_time = forest_plans[0]
+    surrogate_best, surrogate_best_time = surrogate_plans[0]
+    overlap = len({str(s) for s, _ in forest_plans} & {str(s) for s, _ in surrogate_plans})
+    table_cells = int(np.isfinite(table.times).sum())
+    print(f"\n{'search':28s} {'time (ms)':>10s} {'predictions':>12s} {'race time (s)':>14s}")
+    print(f"{'forest lap table':28s} {forest_time * 1000:10.1f} {table_cells:12d} {forest_best_time:14.2f}")
+    print(f"{'surrogate + forest finish':28s} {surrogate_time * 1000:10.1f} {cells.predicted:12d} "
+          f"{surrogate_best_time:14.2f}")
+    print(f"\nspeedup {forest_time / surrogate_time:.1f}x, best plan {surrogate_best_time - forest_best_time:+.2f} s "
+          f"against the forest optimum, {overlap}/{len(forest_plans)} of the forest's top plans found")
+    print(f"forest:    {forest_best}\nsurrogate: {surrogate_best}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from lap_store import StoredSession
+
+# Base pace, per-lap wear and fuel effect (seconds) used to generate synthetic lap times
+COMPOUND_PACE = {'SOFT': (0.0, 0.12), 'MEDIUM': (0.6, 0.07), 'HARD': (1.1, 0.04)}
+FUEL_EFFECT = 0.035
+SC_SLOWDOWN = 1.4
+
+
+# Generate a laps frame shaped like FastF1's session.laps for one race
+def synthetic_laps(total_laps=78, drivers=20, base_lap_time=75.0, seed=0, sc_laps=None):
+    rng = np.random.default_rng(seed)
+    compounds = list(COMPOUND_PACE)
+    if sc_laps is None:
+        sc_laps = set(np.flatnonzero(rng.random(total_laps) < 0.03) + 1)
+
+    rows = []
+    for d in range(drivers):
+        pit_window = np.arange(max(2, total_laps // 8), total_laps - max(2, total_laps // 15))
+        pit_laps = sorted(rng.choice(pit_window, size=rng.integers(1, 3), replace=False))
+        stint_starts = [1] + [p + 1 for p in pit_laps]
+        stint_compounds = rng.choice(compounds, size=len(stint_starts))
+        driver_offset = rng.normal(0, 0.4)
+        for i, start in enumerate(stint_starts):
+            end = stint_starts[i + 1] - 1 if i + 1 < len(stint_starts) else total_laps
+            base, wear = COMPOUND_PACE[stint_compounds[i]]
+            for lap in range(start, end + 1):
+                tyre_life = lap - start + 1
+                status = '4' if lap in sc_laps else '1'
+                lap_time = (base_lap_time + driver_offset + base + wear * tyre_life
+                            - FUEL_EFFECT * lap + rng.normal(0, 0.3))
+                if status == '4':
+                    lap_time *= SC_SLOWDOWN
+                rows.append((f'D{d:02d}', float(lap), float(tyre_life), status, stint_compounds[i], lap_time))
+
+    laps = pd.DataFrame(rows, columns=['Driver', 'LapNumber', 'TyreLife', 'TrackStatus', 'Compound', 'LapTime'])
+    laps = laps.sort_values(['Driver', 'LapNumber'], ignore_index=True)
+    laps['Time'] = pd.to_timedelta(laps.groupby('Driver')['LapTime'].cumsum() + 300.0, unit='s')
+    laps['LapStartTime'] = laps['Time'] - pd.to_timedelta(laps['LapTime'], unit='s')
+    laps['LapTime'] = pd.to_timedelta(laps['LapTime'], unit='s')
+    return laps
+
+
+# Weather readings once a minute over the race, like session.weather_data
+def synthetic_weather(duration_s, seed=0, rain_from=None):
+    rng = np.random.default_rng(seed)
+    minutes = np.arange(int(duration_s // 60) + 1)
+    track_temp = 40 + np.cumsum(rng.normal(0, 0.2, len(minutes)))
+    rainfall = np.zeros(len(minutes), dtype=bool) if rain_from is None else minutes * 60 >= rain_from
+    return pd.DataFrame({
+        'Time': pd.to_timedelta(minutes * 60, unit='s'),
+        'AirTemp': track_temp - 15 + rng.normal(0, 0.1, len(minutes)),
+        'Humidity': np.clip(50 + np.cumsum(rng.normal(0, 0.3, len(minutes))), 10, 100),
+        'Pressure': 1010 + rng.normal(0, 0.5, len(minutes)),
+        'Rainfall': rainfall,
+        'TrackTemp': track_temp,
+        'WindDirection': rng.integers(0, 360, len(minutes)),
+        'WindSpeed': np.abs(rng.normal(2, 0.5, len(minutes))),
+    })
+
+
+# One synthetic race session with laps and weather, standing in for a loaded fastf1 Session
+def synthetic_session(year=2024, gp_name='Synthetic', total_laps=78, drivers=20, seed=None):
+    seed = year if seed is None else seed
+    laps = synthetic_laps(total_laps=total_laps, drivers=drivers, seed=seed)
+    weather_data = synthetic_weather(laps['Time'].max().total_seconds() + 60, seed=seed)
+    return StoredSession(year, gp_name, laps, weather_data)
+
+
+# Several seasons of the same synthetic race
+def synthetic_seasons(years=(2022, 2023, 2024), gp_name='Synthetic', **kwargs):
+    return [synthetic_session(year, gp_name, **kwargs) for year in years]
+
+
+# Concatenate several synthetic seasons of the same race
+def synthetic_multi_year_laps(seasons=3, **kwargs):
+    return pd.concat([synthetic_laps(seed=s, **kwargs) for s in range(seasons)], ignore_index=True)
@@ -0,0 +1,57 @@
+"""Peak memory and time to turn many races of laps into model input: the pd.concat + get_dummies path
+against the compact training frame."""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_session
+from training_frame import peak_memory, training_arrays, training_frame_from_sessions
+
+
+# The original path: concatenate every race, copy, add seconds and one-hot encode to default dtypes
+def legacy_training_arrays(sessions):
+    laps = pd.concat([s.laps.assign(Year=s.year, GP=s.gp_name) for s in sessions], ignore_index=True)
+    laps = laps.dropna(subset=['LapTime']).copy()
+    laps['LapTimeSeconds'] = laps['LapTime'].dt.total_seconds()
+    features = pd.get_dummies(laps[['LapNumber', 'TyreLife', 'TrackStatus', 'Compound']],
+                              columns=['Compound', 'TrackStatus'])
+    return features, laps['LapTimeSeconds']
+
+
+def compact_training_arrays(sessions):
+    return training_arrays(training_frame_from_sessions(sessions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--circuits', type=int, default=24)
+    parser.add_argument('--seasons', type=int, default=7, help='seasons per circuit, e.g. 2018-2024')
+    parser.add_argument('--distinct-races', type=int, default=8,
+                        help='races generated; the rest reuse their laps under other circuit/season names')
+    args = parser.parse_args()
+
+    base = [synthetic_session(seed=i) for i in range(args.distinct_races)]
+    sessions = []
+    for c in range(args.circuits):
+        for y in range(args.seasons):
+            race = base[(c * args.seasons + y) % len(base)]
+            sessions.append(type(race)(2018 + y, f'Circuit {c:02d}', race.laps, race.weather_data))
+    total = sum(len(s.laps) for s in sessions)
+    print(f"{len(sessions)} races, {total:,} laps")
+
+    for name, fn in (('get_dummies', legacy_training_arrays), ('compact', compact_training_arrays)):
+        start = time.perf_counter()
+        (features, target), peak = peak_memory(fn, sessions)
+        elapsed = time.perf_counter() - start
+        size = features.memory_usage(index=False).sum() + target.nbytes
+        # RandomForestRegressor.fit converts its input to one float32 array; the compact block already is one
+        _, fit_copy = peak_memory(lambda: np.asarray(features, dtype=np.float32))
+        print(f"{name:12s} {elapsed:6.2f} s  peak {peak / 2 ** 20:8.1f} MiB  result {size / 2 ** 20:7.1f} MiB  "
+              f"fit copy {fit_copy / 2 ** 20:6.1f} MiB  {features.shape[1]} features")
+        del features, target
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""FastF1 cache management: prefetch sessions ahead of a race weekend, keep the cache under a size cap by
+evicting the least recently used sessions, and verify cached files, optionally deleting corrupt or partial
+ones so FastF1 downloads them again."""
+import argparse
+import logging
+import os
+import pathlib
+import pickle
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import fastf1
+
+# POSIX file locks; without fcntl (Windows) the cache is only safe for one process at a time
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# FastF1's cache directory, shared by the API, the dashboard and the CLIs
+CACHE_DIR = os.environ.get('F1_CACHE_DIR', 'cache')
+# Size cap for FastF1's files; the columnar lap store under cache/laps is not counted or evicted
+CACHE_MAX_BYTES = int(float(os.environ.get('F1_CACHE_MAX_MB', 4096)) * 2 ** 20)
+
+HTTP_CACHE_FILE = 'fastf1_http_cache.sqlite'
+LOCK_DIR = '.locks'
+# Sessions loaded by lap_store.ingest_session: 'R' is the race
+PREFETCH_SESSIONS = ('R',)
+PREFETCH_WORKERS = 2
+
+logger = logging.getLogger(__name__)
+
+
+# Hold a lock file under the cache directory. Shared holders (session fetches) run side by side; an
+# exclusive holder (eviction, repair) waits for them all and keeps new ones out
+@contextmanager
+def cache_lock(name, exclusive=True, cache_dir=CACHE_DIR):
+    if fcntl is None:
+        yield
+        return
+    lock_dir = os.path.join(cache_dir, LOCK_DIR)
+    os.makedirs(lock_dir, exist_ok=True)
+    with open(os.path.join(lock_dir, f'{name}.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def session_lock_name(year, gp_name, identifier):
+    return '_'.join(str(part).replace(os.sep, '-').replace(' ', '-').lower() for part in (year, gp_name, identifier))
+
+
+# Point FastF1 at the cache directory (creating it) and trim it to the size cap
+def enable_cache(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    os.makedirs(cache_dir, exist_ok=True)
+    fastf1.Cache.enable_cache(cache_dir)
+    enforce_size_limit(max_bytes, cache_dir)
+
+
+# Load a session through the FastF1 cache. Only one process fetches a given session at a time, so a worker
+# that asks for a session another one is downloading waits and then reads it from the cache instead of
+# downloading it again and writing the same files concurrently. Marks the session as recently used
+def fetch_session(year, gp_name, identifier='R', cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    with cache_lock('cache', exclusive=False, cache_dir=cache_dir), \
+            cache_lock(session_lock_name(year, gp_name, identifier), cache_dir=cache_dir):
+        session = fastf1.get_session(year, gp_name, identifier)
+        session.load(laps=True, telemetry=False, weather=True, messages=False)
+        # FastF1 keeps a session's files under its API path without the leading '/static/'
+        entry = os.path.join(cache_dir, session.api_path[len('/static/'):])
+        if os.path.isdir(entry):
+            os.utime(entry)
+    enforce_size_limit(max_bytes, cache_dir)
+    return session
+
+
+# FastF1's cache entries: one directory per session holding its .ff1pkl files (<year>/<event>/<session>),
+# plus the HTTP response cache. Our own stores (laps/, lock files) are not entries
+def cache_entries(cache_dir=CACHE_DIR):
+    entries = []
+    http_cache = os.path.join(cache_dir, HTTP_CACHE_FILE)
+    if os.path.isfile(http_cache):
+        entries.append(http_cache)
+    for name in sorted(os.listdir(cache_dir)) if os.path.isdir(cache_dir) else []:
+        if not name.isdigit():
+            continue
+        for root, _, files in os.walk(os.path.join(cache_dir, name)):
+            if any(file.endswith('.ff1pkl') for file in files):
+                entries.append(root)
+    return entries
+
+
+# (size in bytes, last used) of an entry. Last used is the newest modification time of the entry and its
+# files; fetch_session touches the entry on every load. Access times are not used: relatime mounts barely
+# update them, and verify reading every file would make the whole cache look recently used
+def entry_usage(path):
+    stat = os.stat(path)
+    if os.path.isfile(path):
+        return stat.st_size, stat.st_mtime
+    size, last_used = 0, stat.st_mtime
+    for entry in os.scandir(path):
+        if entry.is_file():
+            file_stat = entry.stat()
+            size += file_stat.st_size
+            last_used = max(last_used, file_stat.st_mtime)
+    return size, last_used
+
+
+# HTTP cache FastF1 holds open in this process, or None. Deleting it under an open SQLite connection leaves
+# FastF1 writing to an unlinked file, so eviction leaves it alone; `cache_manager.py evict` from another
+# process can still remove it
+def active_http_cache():
+    if fastf1.Cache._CACHE_DIR is None or getattr(fastf1.Cache, '_requests_session_cached', None) is None:
+        return None
+    return os.path.abspath(os.path.join(fastf1.Cache._CACHE_DIR, HTTP_CACHE_FILE))
+
+
+def cache_size(cache_dir=CACHE_DIR):
+    return sum(entry_usage(path)[0] for path in cache_entries(cache_dir))
+
+
+def _remove_entry(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        # The HTTP cache is SQLite: drop its journal files with it
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+# Delete the least recently used entries until the cache is under max_bytes, except the HTTP cache this
+# process has open. Waits for in-progress fetches, so no entry is removed while it is being written.
+# Returns the removed entries
+def enforce_size_limit(max_bytes=CACHE_MAX_BYTES, cache_dir=CACHE_DIR):
+    if max_bytes is None or max_bytes <= 0:
+        return []
+    # Cheap check first: most calls find the cache under the cap and never take the exclusive lock
+    usage = {path: entry_usage(path) for path in cache_entries(cache_dir)}
+    if sum(size for size, _ in usage.values()) <= max_bytes:
+        return []
+
+    removed = []
+    with cache_lock('cache', cache_dir=cache_dir):
+        usage = {path: entry_usage(path) for path in cache_entries(cache_dir)}
+        total = sum(size for size, _ in usage.values())
+        in_use = active_http_cache()
+        for path, (size, _) in sorted(usage.items(), key=lambda item: item[1][1]):
+            if total <= max_bytes:
+                break
+            if os.path.abspath(path) == in_use:
+                continue
+            _remove_entry(path)
+            total -= size
+            removed.append(path)
+            logger.info("Evicted %s (%.1f MB)", path, size / 2 ** 20)
+    return removed
+
+
+# Problem with one cached file, or None if it loads. A .ff1pkl must unpickle to FastF1's
+# {'version', 'data'} dict; an empty or truncated one is what an interrupted write leaves behind
+def check_file(path):
+    if path.endswith('.ff1pkl'):
+        if os.path.getsize(path) == 0:
+            return 'empty'
+        try:
+            with open(path, 'rb') as f:
+                cached = pickle.load(f)
+        except (EOFError, pickle.UnpicklingError):
+            return 'truncated'
+        except Exception as e:
+            return f'unreadable: {type(e).__name__}'
+        if not isinstance(cached, dict) or 'data' not in cached or 'version' not in cached:
+            return 'not a FastF1 cache file'
+        if cached['version'] != fastf1.Cache._API_CORE_VERSION:
+            return f"written by FastF1 API version {cached['version']}"
+        return None
+    if path.endswith('.sqlite'):
+        connection = sqlite3.connect(pathlib.Path(path).absolute().as_uri() + '?mode=ro', uri=True)
+        try:
+            result = connection.execute('PRAGMA quick_check').fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            return f'corrupt database: {e}'
+        finally:
+            connection.close()
+        return None if result == 'ok' else f'corrupt database: {result}'
+    return None
+
+
+# Every cache file with a problem, as (path, problem). With repair, the files are deleted (the HTTP cache
+# as a whole) so the next load downloads them again
+def verify_cache(cache_dir=CACHE_DIR, repair=False):
+    problems = []
+    for entry in cache_entries(cache_dir):
+        files = [entry] if os.path.isfile(entry) else \
+            [os.path.join(entry, name) for name in sorted(os.listdir(entry)) if name.endswith('.ff1pkl')]
+        problems += [(path, problem) for path in files for problem in [check_file(path)] if problem]
+    if repair and problems:
+        with cache_lock('cache', cache_dir=cache_dir):
+            for path, _ in problems:
+                _remove_entry(path)
+    return problems
+
+
+# Load every (year, GP, session) into the FastF1 cache, `workers` at a time; races also go into the lap store
+# so workers memory-map them instead of parsing FastF1's files. A session that fails is logged and skipped.
+# Returns the sessions fetched
+def prefetch(sessions, workers=PREFETCH_WORKERS, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    from lap_store import read_session, write_session
+
+    # The lap store sits inside the cache directory, as LAP_STORE_DIR does inside CACHE_DIR
+    store_dir = os.path.join(cache_dir, 'laps')
+
+    def fetch(year, gp_name, identifier):
+        session = fetch_session(year, gp_name, identifier, cache_dir, max_bytes)
+        if identifier == 'R' and read_session(year, gp_name, store_dir) is None:
+            write_session(session, year, gp_name, store_dir)
+
+    sessions = list(sessions)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(fetch, *session) for session in sessions]
+    fetched = []
+    for session, future in zip(sessions, futures):
+        try:
+            future.result()
+            fetched.append(session)
+        except Exception as e:
+            logger.warning("Prefetch failed for %s %s %s: %s", *session, e)
+    return fetched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--max-mb', type=float, default=CACHE_MAX_BYTES / 2 ** 20, help='size cap in MB')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    prefetch_parser = commands.add_parser('prefetch', help='load sessions into the cache ahead of time')
+    prefetch_parser.add_argument('--years', type=int, nargs='+', required=True)
+    prefetch_parser.add_argument('--gps', nargs='+', help='GPs to prefetch instead of each season calendar')
+    prefetch_parser.add_argument('--sessions', nargs='+', default=list(PREFETCH_SESSIONS),
+                                 help='session identifiers, e.g. R Q FP2')
+    prefetch_parser.add_argument('--workers', type=int, default=PREFETCH_WORKERS)
+
+    commands.add_parser('evict', help='evict least recently used sessions down to the size cap')
+    commands.add_parser('stats', help='print the cache entries by last use')
+
+    verify_parser = commands.add_parser('verify', help='find corrupt or partial cache files')
+    verify_parser.add_argument('--repair', action='store_true', help='delete them so they are downloaded again')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    max_bytes = int(args.max_mb * 2 ** 20)
+    if args.command == 'prefetch':
+        enable_cache(args.cache_dir, max_bytes)
+        if args.gps:
+            races = [(year, gp_name) for year in args.years for gp_name in args.gps]
+        else:
+            from precompute import season_calendar
+            races = [(year, gp_name) for year in args.years for gp_name in season_calendar(year)]
+        sessions = [(year, gp_name, identifier) for year, gp_name in races for identifier in args.sessions]
+        fetched = prefetch(sessions, args.workers, args.cache_dir, max_bytes)
+        print(f"{len(fetched)}/{len(sessions)} sessions cached, cache is "
+              f"{cache_size(args.cache_dir) / 2 ** 20:.1f} MB")
+    elif args.command == 'evict':
+        removed = enforce_size_limit(max_bytes, args.cache_dir)
+        print(f"Evicted {len(removed)} entries, cache is {cache_size(args.cache_dir) / 2 ** 20:.1f} MB")
+    elif args.command == 'stats':
+        usage = sorted(((path, *entry_usage(path)) for path in cache_entries(args.cache_dir)), key=lambda u: u[2])
+        for path, size, last_used in usage:
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used))} {size / 2 ** 20:9.1f} MB  {path}")
+        print(f"{len(usage)} entries, {sum(u[1] for u in usage) / 2 ** 20:.1f} MB of {args.max_mb:.0f} MB")
+    else:
+        problems = verify_cache(args.cache_dir, args.repair)
+        for path, problem in problems:
+            print(f"{path}: {problem}")
+        print(f"{len(problems)} problems" + (' (deleted)' if args.repair and problems else ''))
+        if problems and not args.repair:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import gzip
+
+from metrics import inc
+
+# Brotli is optional (pip install brotli); without it responses fall back to gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent as they are: compressing them saves less than the headers cost
+MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+# Encoding to use for a request's Accept-Encoding header, or None
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+# Compress a Flask response in place when the client accepts it. Streamed responses (job events), 304s and
+# small or already encoded bodies are left alone
+def compress_response(response, accept_encodings):
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    body = response.get_data()
+    if encoding is None or len(body) < MIN_SIZE:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    inc('f1_response_bytes_total', len(body), labels={'encoding': 'identity'},
+        help='Response bytes before and after compression')
+    inc('f1_response_bytes_total', len(compressed), labels={'encoding': encoding})
+    return response
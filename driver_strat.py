@@ -1,24 +1,36 @@
-import fastf1
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 import datetime
+import time
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
+from joblib import Parallel, delayed
 
-# Enable caching for faster data retrieval
-fastf1.Cache.enable_cache('cache')
+from cache_manager import enable_cache
+from lap_store import load_sessions
+from lap_table import precompute_lap_table
+from model_store import data_fingerprint, load_model, save_model
+from optimizer import PIT_LOSS, strategy_race_time
+from prediction import predict_strategies
+from training_frame import (FEATURE_NAMES, attach_weather, feature_array, training_arrays, training_frame_from_sessions,
+                            wet_laps)
+
+# Enable caching for faster data retrieval, bounded by F1_CACHE_MAX_MB
+enable_cache()
+
+# Drivers with fewer timed laps than this at a GP get the model trained on every driver's laps
+MIN_DRIVER_LAPS = 100
+POOLED = '__pooled__'
 
 
 # Function to load multi-year race data dynamically
 def load_multi_year_data(years, gp_name, driver_name=None):
     laps_data = []
-    sessions = []
-    for year in years:
-        session = fastf1.get_session(year, gp_name, 'R')
-        session.load()
-        sessions.append(session)
-        laps = session.laps
+    sessions = load_sessions([(year, gp_name) for year in years])
+    for session in sessions:
+        laps = attach_weather(session.laps, session.weather_data)
         if driver_name:
             laps = laps[laps['Driver'] == driver_name]
         laps_data.append(laps)
@@ -30,10 +42,11 @@ def get_f1_weather(session):
     weather_data = session.weather_data.dropna()
     if weather_data.empty:
         print("⚠️ Warning: No weather data available. Using default conditions.")
-        return {'temperature': 25, 'humidity': 50, 'weather_condition': 'Clear'}
+        return {'temperature': 25, 'track_temperature': 35, 'humidity': 50, 'weather_condition': 'Clear'}
     latest_weather = weather_data.iloc[-1]
     return {
         'temperature': float(latest_weather['AirTemp']),
+        'track_temperature': float(latest_weather['TrackTemp']),
         'humidity': float(latest_weather['Humidity']),
         'weather_condition': "Clear" if latest_weather['Rainfall'] == 0 else "Rain"
     }
@@ -41,45 +54,75 @@ def get_f1_weather(session):
 
 # Function to train ML model
 def train_ml_model(laps):
-    laps = laps.dropna(subset=['LapTime'])
-    laps = laps.copy()
-    laps['LapTimeSeconds'] = laps['LapTime'].dt.total_seconds()
-    features = laps[['LapNumber', 'TyreLife', 'TrackStatus', 'Compound']]
-    features = pd.get_dummies(features, columns=['Compound', 'TrackStatus'])
-    target = laps['LapTimeSeconds']
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    features, target = training_arrays(laps)
+    model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
     model.fit(features, target)
+    model.wet_laps_ = wet_laps(features)
     return model, features.columns
 
 
+def _fit_forest(features, target):
+    model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=1)
+    model.fit(features, target)
+    model.wet_laps_ = wet_laps(features)
+    return model
+
+
+# One model per driver from a compact training frame: laps are split by Driver in one groupby and every
+# fit runs at the same time on its own core (threads, sharing one feature block). Drivers with fewer than
+# min_laps laps, and any driver not seen, use the pooled model trained on all laps.
+# Returns {'drivers': {code: model}, 'pooled': model}
+def train_driver_models(frame, min_laps=MIN_DRIVER_LAPS, n_jobs=-1):
+    X, y = feature_array(frame), frame['LapTimeSeconds'].to_numpy()
+    X = pd.DataFrame(X, columns=FEATURE_NAMES, copy=False)
+    groups = frame.groupby('Driver', observed=True).indices
+    rows = {POOLED: slice(None)}
+    rows.update({driver: idx for driver, idx in groups.items() if len(idx) >= min_laps})
+
+    # The pooled fit is the largest, so it is queued first
+    fitted = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(_fit_forest)(X.iloc[idx], y[idx]) for idx in rows.values())
+    models = dict(zip(rows, fitted))
+    return {'drivers': {driver: model for driver, model in models.items() if driver != POOLED},
+            'pooled': models[POOLED]}
+
+
+# Model for one driver from a train_driver_models set
+def driver_model(models, driver_name):
+    return models['drivers'].get(driver_name, models['pooled'])
+
+
+# Model store key of a GP's per-driver model set, kept apart from the all-driver model of the same GP
+def driver_models_key(gp_name, years):
+    return (gp_name, tuple(years), ('per-driver', MIN_DRIVER_LAPS) + tuple(FEATURE_NAMES))
+
+
+# Per-driver models for a whole grid: the sessions are loaded once, the set is trained in one parallel
+# pass and stored as one entry, which later runs map back in while the laps are unchanged
+def build_driver_models(years, gp_name, min_laps=MIN_DRIVER_LAPS):
+    sessions = load_sessions([(year, gp_name) for year in years])
+    frame = training_frame_from_sessions(sessions)
+    key, data_fp = driver_models_key(gp_name, years), data_fingerprint(frame, list(frame.columns))
+    stored = load_model(key, data_fp)
+    if stored is not None:
+        return stored['model'], frame, sessions
+
+    models = train_driver_models(frame, min_laps)
+    save_model(key, models, FEATURE_NAMES, data_fp,
+               {'drivers': sorted(models['drivers']), 'min_laps': min_laps})
+    return models, frame, sessions
+
+
 # Function to predict lap times
-def predict_lap_times(model, strategy, weather, feature_names):
-    lap_times = []
-    for stint in strategy:
-        start_lap, end_lap, compound = stint
-        for lap in range(start_lap, end_lap + 1):
-            features = {
-                'LapNumber': lap,
-                'TyreLife': lap - start_lap + 1,
-                'TrackStatus_1': 1
-            }
-
-            #TO-DO
-            #INSTEAD OF HARD MEDIUM SOFT, USE C1 - C5 FOR BETTER STRATEGY PREDICTION
-            for c in ['HARD', 'MEDIUM', 'SOFT']:
-                features[f'Compound_{c}'] = 1 if compound == c else 0
-
-            features_df = pd.DataFrame([features])
-            features_df = features_df.reindex(columns=feature_names, fill_value=0)
-            lap_time = model.predict(features_df)[0]
-            if weather['weather_condition'] == 'Rain':
-                lap_time *= 1.2
-            lap_times.append((lap, lap_time, compound))
-    return lap_times
+def predict_lap_times(model, strategy, weather, feature_names, lap_table=None):
+    #TO-DO
+    #INSTEAD OF HARD MEDIUM SOFT, USE C1 - C5 FOR BETTER STRATEGY PREDICTION
+    return predict_strategies(model, [strategy], weather, feature_names, lap_table)[0]
 
 
 # Function to simulate driver-specific strategy
-def simulate_driver_strategy(driver_name, grid_position, model, weather, total_laps, feature_names):
+def simulate_driver_strategy(driver_name, grid_position, model, weather, total_laps, feature_names, lap_table=None,
+                             pit_loss=PIT_LOSS):
     # TO-DO
     # INSTEAD OF HARD MEDIUM SOFT, USE C1 - C5 FOR BETTER STRATEGY PREDICTION
     compounds = ['SOFT', 'MEDIUM', 'HARD']
@@ -91,8 +134,8 @@ def simulate_driver_strategy(driver_name, grid_position, model, weather, total_l
     else:  # Backmarker strategy
         strategy = [(1, total_laps // 2, "MEDIUM"), (total_laps // 2 + 1, total_laps, "HARD")]
 
-    lap_times = predict_lap_times(model, strategy, weather, feature_names)
-    race_time = sum(time for _, time, _ in lap_times) + len(strategy) * 20
+    lap_times = predict_lap_times(model, strategy, weather, feature_names, lap_table)
+    race_time = strategy_race_time(strategy, lap_times, pit_loss)
     return strategy, race_time, lap_times
 
 
@@ -126,11 +169,39 @@ def plot_lap_times(lap_times, title):
     plt.show()
 
 
+# Predicted race time of every driver in the set from one grid position
+def print_grid_strategies(models, frame, grid_position, weather, total_laps):
+    feature_names = pd.Index(FEATURE_NAMES)
+    print(f"\n🏁 **Driver-Specific Strategies from P{grid_position}:**")
+    for driver in sorted(frame['Driver'].cat.categories):
+        model = driver_model(models, driver)
+        strategy, race_time, _ = simulate_driver_strategy(driver, grid_position, model, weather, total_laps,
+                                                          feature_names)
+        source = 'own model' if model is not models['pooled'] else 'pooled model'
+        stints = ', '.join(f"{start}-{end} {compound}" for start, end, compound in strategy)
+        print(f"{driver}: {str(datetime.timedelta(seconds=int(race_time)))}  {stints}  ({source})")
+
+
 # Main function
 def main():
     GP_NAME = "Brazil"
     YEARS = [2022, 2023, 2024]
 
+    parser = argparse.ArgumentParser(description="Driver-specific race strategy")
+    parser.add_argument('--all-drivers', action='store_true',
+                        help='train and store a model for every driver from one load, then predict each of them')
+    parser.add_argument('--grid-position', type=int, default=10, help='grid position used with --all-drivers')
+    args = parser.parse_args()
+
+    if args.all_drivers:
+        start = time.perf_counter()
+        models, frame, sessions = build_driver_models(YEARS, GP_NAME)
+        print(f"{len(models['drivers'])} driver models plus a pooled model ready in "
+              f"{time.perf_counter() - start:.1f}s")
+        print_grid_strategies(models, frame, args.grid_position, get_f1_weather(sessions[-1]),
+                              int(frame['LapNumber'].max()))
+        return
+
     driver_name = input("Enter Driver's Code (e.g., VER, LEC, HAM): ").upper()
     grid_position = int(input(f"Enter assumed grid position for {driver_name}: "))
 
@@ -141,9 +212,10 @@ def main():
     print(f"Current Weather: {weather}")
 
     model, feature_names = train_ml_model(laps)
+    lap_table = precompute_lap_table(model, feature_names, total_laps, weather=weather)
 
     driver_strategy, driver_race_time, driver_lap_times = simulate_driver_strategy(
-        driver_name, grid_position, model, weather, total_laps, feature_names)
+        driver_name, grid_position, model, weather, total_laps, feature_names, lap_table)
 
     print("\n🏁 **Driver-Specific Strategy:**")
     for stint in driver_strategy:
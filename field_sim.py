@@ -0,0 +1,162 @@
+import numpy as np
+
+from optimizer import PIT_LOSS
+from prediction import expand_strategies
+
+FIELD_SIZE = 20
+
+# Pace gap between the fastest and slowest car (s/lap), gap per grid slot at the start, and lap-to-lap noise
+FIELD_PACE_SPREAD = 1.5
+START_GAP = 0.25
+LAP_NOISE_SD = 0.2
+
+# Closest a following car gets to the one ahead at the line, time lost completing a pass, and the pace
+# advantage (s/lap) needed to pass; the last depends on the circuit
+MIN_GAP = 0.5
+PASS_COST = 0.3
+OVERTAKE_DELTA = 1.0
+CIRCUIT_OVERTAKE_DELTA = {'Monaco': 3.0, 'Singapore': 1.6, 'Hungary': 1.5, 'Emilia Romagna': 1.5, 'Zandvoort': 1.4}
+
+# Rival stops within this many laps of the driver's stop count as the same pit cycle (undercut/overcut)
+PIT_CYCLE_LAPS = 5
+
+
+# Pace advantage a car needs to pass at this circuit
+def overtake_delta(gp_name):
+    for name, delta in CIRCUIT_OVERTAKE_DELTA.items():
+        if name.lower() in str(gp_name).lower():
+            return delta
+    return OVERTAKE_DELTA
+
+
+# Per-lap green-flag lap times (pit loss added on in-laps) and padded pit laps for a list of strategies,
+# so a field of cars can be assembled by indexing with strategy ids
+def strategy_lap_arrays(lap_table, strategies, total_laps, weather, pit_loss=PIT_LOSS):
+    laps, tyre_life, compounds, offsets = expand_strategies(strategies)
+    times = lap_table.lookup(laps, tyre_life, compounds, weather=weather)
+    max_stops = max(len(strategy) - 1 for strategy in strategies)
+
+    lap_times = np.zeros((len(strategies), total_laps))
+    pit_laps = np.full((len(strategies), max(max_stops, 1)), -total_laps)
+    for i, (strategy, start, end) in enumerate(zip(strategies, offsets[:-1], offsets[1:])):
+        lap_times[i, laps[start:end] - 1] = times[start:end]
+        stops = [end_lap for _, end_lap, _ in strategy[:-1]]
+        lap_times[i, np.array(stops, dtype=int) - 1] += pit_loss
+        pit_laps[i, :len(stops)] = stops
+    return lap_times, pit_laps
+
+
+# Race every scenario's field lap by lap. strategy_ids[s, car] picks each car's row of lap_times; cars start
+# in index order (car 0 on pole). A car that would finish a lap within MIN_GAP of the car ahead is held
+# there unless it is quicker by more than overtake_delta, in which case it passes for PASS_COST.
+# lap_noise (scenarios, cars, laps) overrides the sampled lap-to-lap noise.
+# Returns cumulative times and positions after each lap, shape (scenarios, cars, laps), and traffic losses
+def simulate_field(lap_times, strategy_ids, pace_offsets=None, overtake=OVERTAKE_DELTA, noise_sd=LAP_NOISE_SD,
+                   lap_noise=None, seed=0):
+    rng = np.random.default_rng(seed)
+    n_scenarios, n_cars = strategy_ids.shape
+    total_laps = lap_times.shape[1]
+    if pace_offsets is None:
+        pace_offsets = np.linspace(0, FIELD_PACE_SPREAD, n_cars)
+
+    free_laps = lap_times[strategy_ids] + np.asarray(pace_offsets)[..., None]
+    if lap_noise is not None:
+        free_laps = free_laps + lap_noise
+    elif noise_sd:
+        free_laps = free_laps + rng.normal(0, noise_sd, free_laps.shape)
+
+    elapsed = np.broadcast_to(np.arange(n_cars) * START_GAP, (n_scenarios, n_cars)).copy()
+    times = np.empty((n_scenarios, n_cars, total_laps))
+    positions = np.empty((n_scenarios, n_cars, total_laps), dtype=np.int8)
+    traffic_loss = np.zeros((n_scenarios, n_cars))
+    ranks = np.broadcast_to(np.arange(n_cars), (n_scenarios, n_cars))
+
+    for lap in range(total_laps):
+        order = np.argsort(elapsed, axis=1, kind='stable')
+        lap_time = np.take_along_axis(free_laps[:, :, lap], order, axis=1)
+        free = np.take_along_axis(elapsed, order, axis=1) + lap_time
+
+        arrival = free.copy()
+        for k in range(1, n_cars):
+            limit = arrival[:, k - 1] + MIN_GAP
+            blocked = free[:, k] < limit
+            passes = lap_time[:, k - 1] - lap_time[:, k] > overtake
+            arrival[:, k] = np.where(blocked, np.where(passes, free[:, k] + PASS_COST, limit), free[:, k])
+
+        held = np.empty_like(arrival)
+        np.put_along_axis(held, order, arrival - free, axis=1)
+        np.put_along_axis(elapsed, order, arrival, axis=1)
+        traffic_loss += held
+        times[:, :, lap] = elapsed
+        np.put_along_axis(positions[:, :, lap], np.argsort(elapsed, axis=1, kind='stable'), ranks, axis=1)
+    return {'times': times, 'positions': positions + 1, 'traffic_loss': traffic_loss}
+
+
+# Time gained on the car ahead through each pit cycle: for each of the driver's stops, the rival directly
+# ahead before it and stopping within PIT_CYCLE_LAPS laps is compared from the lap before the first of the
+# two stops to the lap after the second. Positive means the undercut/overcut worked; NaN when no rival stopped
+def pit_cycle_gains(result, car, driver_pit_laps, strategy_ids, pit_laps):
+    times, positions = result['times'], result['positions']
+    n_scenarios, n_cars, total_laps = times.shape
+    rows = np.arange(n_scenarios)
+    gains = np.full((n_scenarios, len(driver_pit_laps)), np.nan)
+
+    for i, stop in enumerate(driver_pit_laps):
+        if stop < 2:
+            continue
+        ahead_pos = positions[:, car, stop - 2] - 1
+        ahead_mask = positions[:, :, stop - 2] == ahead_pos[:, None]
+        has_rival = ahead_mask.any(axis=1)
+        rival = np.argmax(ahead_mask, axis=1)
+
+        rival_stops = pit_laps[strategy_ids[rows, rival]]
+        distance = np.abs(rival_stops - stop)
+        nearest = np.argmin(distance, axis=1)
+        rival_stop = rival_stops[rows, nearest]
+        in_cycle = has_rival & (distance[rows, nearest] <= PIT_CYCLE_LAPS)
+
+        before = np.clip(np.minimum(stop, rival_stop) - 2, 0, total_laps - 1)
+        after = np.clip(np.maximum(stop, rival_stop), 0, total_laps - 1)
+        gap_before = times[rows, car, before] - times[rows, rival, before]
+        gap_after = times[rows, car, after] - times[rows, rival, after]
+        gains[:, i] = np.where(in_cycle, gap_before - gap_after, np.nan)
+    return gains
+
+
+# Score a driver's candidate strategies from a grid slot against rivals running strategies sampled from
+# rival_strategies. Every candidate races the same n_samples rival fields with the same lap noise, all in one batch.
+# Returns one summary per candidate, best mean finishing position first
+def evaluate_driver_strategies(lap_table, total_laps, weather, candidates, rival_strategies, grid_position,
+                               n_samples=200, field_size=FIELD_SIZE, pit_loss=PIT_LOSS, overtake=OVERTAKE_DELTA,
+                               seed=0):
+    rng = np.random.default_rng(seed)
+    pool = list(candidates) + [s for s in rival_strategies if s not in candidates]
+    lap_times, pit_laps = strategy_lap_arrays(lap_table, pool, total_laps, weather, pit_loss)
+    rival_ids = np.array([pool.index(s) for s in rival_strategies])
+
+    car = min(max(grid_position, 1), field_size) - 1
+    fields = rival_ids[rng.integers(0, len(rival_ids), (n_samples, field_size))]
+    strategy_ids = np.repeat(fields, len(candidates), axis=0)
+    strategy_ids[:, car] = np.tile(np.arange(len(candidates)), n_samples)
+
+    noise = np.repeat(rng.normal(0, LAP_NOISE_SD, (n_samples, field_size, total_laps)), len(candidates), axis=0)
+    result = simulate_field(lap_times, strategy_ids, overtake=overtake, lap_noise=noise)
+    finish = result['positions'][:, car, -1].reshape(n_samples, len(candidates))
+    race_time = result['times'][:, car, -1].reshape(n_samples, len(candidates))
+    traffic = result['traffic_loss'][:, car].reshape(n_samples, len(candidates))
+
+    summaries = []
+    for i, strategy in enumerate(candidates):
+        scenario_rows = np.arange(i, len(strategy_ids), len(candidates))
+        stops = [end_lap for _, end_lap, _ in strategy[:-1]]
+        gains = pit_cycle_gains({name: values[scenario_rows] for name, values in result.items()}, car, stops,
+                                strategy_ids[scenario_rows], pit_laps)
+        summaries.append({
+            'strategy': strategy,
+            'mean_position': float(finish[:, i].mean()),
+            'positions_gained': float(grid_position - finish[:, i].mean()),
+            'mean_race_time': float(race_time[:, i].mean()),
+            'traffic_loss': float(traffic[:, i].mean()),
+            'pit_cycle_gain': float(np.nanmean(gains)) if np.isfinite(gains).any() else None,
+        })
+    return sorted(summaries, key=lambda s: (s['mean_position'], s['mean_race_time']))
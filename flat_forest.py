@@ -0,0 +1,95 @@
+import weakref
+
+import numpy as np
+
+# Rows scored per traversal pass; bounds the (trees x rows) node index arrays
+PREDICT_CHUNK = 8192
+
+# Above this many rows sklearn's compiled tree walk is faster than the flat traversal plus its per-call overhead
+SMALL_BATCH = 512
+
+_compiled = weakref.WeakKeyDictionary()
+
+
+# A fitted tree ensemble flattened into one set of node arrays. children[2 * node + went_left] is the next
+# node; leaves point at themselves with an infinite threshold, so every row can take max_depth steps
+# without checking where it stopped. missing_left says where a NaN feature value goes at each split
+class FlatForest:
+    def __init__(self, feature, threshold, children, value, roots, max_depth, n_features, missing_left):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_features = n_features
+        self.missing_left = missing_left
+
+    @classmethod
+    def from_model(cls, model):
+        features, thresholds, lefts, rights, values, roots, missing = [], [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            values.append(tree.value[:, 0, 0])
+            missing.append(np.asarray(getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count)), dtype=bool))
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+        children = np.empty(2 * offset, dtype=np.intp)
+        children[0::2] = np.concatenate(rights)
+        children[1::2] = np.concatenate(lefts)
+        return cls(np.concatenate(features).astype(np.intp), np.concatenate(thresholds), children,
+                   np.concatenate(values), np.array(roots, dtype=np.intp), max_depth, model.n_features_in_,
+                   np.concatenate(missing))
+
+    # Same result as model.predict: rows are compared as float32 like sklearn's trees, and tree outputs
+    # are summed in estimator order before dividing by the number of trees
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        out = np.empty(len(X))
+        for start in range(0, len(X), PREDICT_CHUNK):
+            out[start:start + PREDICT_CHUNK] = self._predict_chunk(X[start:start + PREDICT_CHUNK])
+        return out
+
+    def _predict_chunk(self, X):
+        cells = X.ravel()
+        row_start = (np.arange(len(X)) * X.shape[1])[None, :]
+        node = np.repeat(self.roots[:, None], len(X), axis=1)
+        has_missing = np.isnan(cells).any()
+        for _ in range(self.max_depth):
+            values = cells[row_start + self.feature[node]]
+            went_left = values <= self.threshold[node]
+            if has_missing:
+                went_left |= np.isnan(values) & self.missing_left[node]
+            node = self.children[2 * node + went_left]
+        leaf_values = self.value[node]
+        total = np.zeros(len(X))
+        for tree_values in leaf_values:
+            total += tree_values
+        return total / len(self.roots)
+
+
+# Flat copy of a fitted forest, built once per model object
+def compile_forest(model):
+    flat = _compiled.get(model)
+    if flat is None:
+        flat = FlatForest.from_model(model)
+        _compiled[model] = flat
+    return flat
+
+
+# Predict small batches with the flat forest when the model is a single-output tree ensemble;
+# everything else goes to model.predict
+def fast_predict(model, X):
+    estimators = getattr(model, 'estimators_', None)
+    if (len(X) > SMALL_BATCH or estimators is None or getattr(model, 'n_outputs_', 1) != 1
+            or not all(hasattr(estimator, 'tree_') for estimator in estimators)):
+        return model.predict(X)
+    return compile_forest(model).predict(X)
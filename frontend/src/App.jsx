@@ -1,20 +1,60 @@
-import React, { useState } from "react";
-import { fetchStrategy } from "./api";
+import React, { useRef, useState } from "react";
+import { decodeLaps, fetchStrategy, fetchStrategyAsync } from "./api";
 import Plot from "react-plotly.js";
 import "./App.css";
 
 const compoundColors = { SOFT: "red", MEDIUM: "yellow", HARD: "white" };
 
+// One plot trace per strategy with a lap series, markers coloured by compound
+const lapTraces = (strategyData) => {
+    const strategies = [
+        ["Best", strategyData.best_strategy],
+        ...Object.entries(strategyData.alternative_strategies),
+        ["Driver", strategyData.driver_strategy]
+    ];
+    return strategies.filter(([, strat]) => strat && strat.laps).map(([name, strat], index) => {
+        const laps = decodeLaps(strat.laps);
+        return {
+            name,
+            x: laps.map(lap => lap.Lap),
+            y: laps.map(lap => lap.LapTime),
+            mode: "lines+markers",
+            line: { width: index === 0 ? 3 : 1 },
+            marker: {
+                color: laps.map(lap => compoundColors[lap.Compound] || "gray"),
+                size: index === 0 ? 8 : 4
+            },
+            type: "scatter"
+        };
+    });
+};
+
 const App = () => {
     const [gpName, setGpName] = useState("Monaco");
     const [driverName, setDriverName] = useState("VER");
     const [gridPosition, setGridPosition] = useState(1);
     const [strategyData, setStrategyData] = useState(null);
     const [loading, setLoading] = useState(false);
+    const [stage, setStage] = useState("");
+    // Queries answered before: the model is trained, so they go through the cacheable GET, which the browser
+    // revalidates with its ETag. New ones run as a job to show progress while the model trains
+    const answered = useRef(new Set());
 
     const handleSubmit = async () => {
         setLoading(true);
-        const data = await fetchStrategy(gpName, driverName, gridPosition);
+        const query = JSON.stringify([gpName, driverName, gridPosition]);
+        let data = null;
+        if (answered.current.has(query)) {
+            setStage("cached");
+            data = await fetchStrategy(gpName, driverName, gridPosition);
+        }
+        if (!data) {
+            setStage("queued");
+            data = await fetchStrategyAsync(gpName, driverName, gridPosition, setStage);
+        }
+        if (data) {
+            answered.current.add(query);
+        }
         setStrategyData(data);
         setLoading(false);
     };
@@ -45,7 +85,7 @@ const App = () => {
             </div>
 
             <button className="submit-btn" onClick={handleSubmit} disabled={loading}>
-                {loading ? "Optimizing..." : "Optimize Strategy"}
+                {loading ? `Optimizing (${stage})...` : "Optimize Strategy"}
             </button>
 
             {strategyData && (
@@ -68,20 +108,9 @@ const App = () => {
                     ))}
 
                     <h2>📊 Lap Time Visualization</h2>
-                    {strategyData.lap_times && (
+                    {strategyData.best_strategy.laps && (
                         <Plot
-                            data={[
-                                {
-                                    x: strategyData.lap_times.map(lap => lap.Lap),
-                                    y: strategyData.lap_times.map(lap => lap.LapTime),
-                                    mode: "lines+markers",
-                                    marker: {
-                                        color: strategyData.lap_times.map(lap => compoundColors[lap.Compound] || "gray"),
-                                        size: 8
-                                    },
-                                    type: "scatter"
-                                }
-                            ]}
+                            data={lapTraces(strategyData)}
                             layout={{
                                 title: "Race Lap Times",
                                 xaxis: { title: "Lap Number" },
@@ -1,12 +1,56 @@
 import axios from 'axios';
 
+const API_URL = "http://127.0.0.1:5000";
+
+// Expand a strategy's columnar lap series into {Lap, LapTime, Compound} rows
+export const decodeLaps = (laps) =>
+    laps.lap.map((lap, i) => ({ Lap: lap, LapTime: laps.time[i], Compound: laps.compounds[laps.compound[i]] }));
+
+// GET, so the browser keeps the response and revalidates it with its ETag instead of downloading it again
 export const fetchStrategy = async (gpName, driverName, gridPosition) => {
     try {
-        const response = await axios.post("http://127.0.0.1:5000/predict", {
+        const response = await axios.get(`${API_URL}/predict`, {
+            params: {
+                gp_name: gpName,
+                driver_name: driverName,
+                grid_position: gridPosition,
+                format: "columnar"
+            }
+        });
+        return response.data;
+    } catch (error) {
+        console.error("Error fetching strategy:", error);
+        return null;
+    }
+};
+
+// Submit a background job and follow its progress events until the result is ready
+export const fetchStrategyAsync = async (gpName, driverName, gridPosition, onProgress = () => {}) => {
+    try {
+        const { data: job } = await axios.post(`${API_URL}/predict/jobs`, {
             gp_name: gpName,
             driver_name: driverName,
-            grid_position: gridPosition
+            grid_position: gridPosition,
+            format: "columnar"
         });
+
+        await new Promise((resolve, reject) => {
+            const events = new EventSource(`${API_URL}/jobs/${job.job_id}/events`);
+            events.addEventListener("progress", (event) => {
+                const { stage } = JSON.parse(event.data);
+                onProgress(stage);
+                if (stage === "done" || stage === "failed") {
+                    events.close();
+                    resolve();
+                }
+            });
+            events.onerror = () => {
+                events.close();
+                reject(new Error("Lost connection to job progress stream"));
+            };
+        });
+
+        const response = await axios.get(`${API_URL}/jobs/${job.job_id}/result`);
         return response.data;
     } catch (error) {
         console.error("Error fetching strategy:", error);
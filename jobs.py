@@ -0,0 +1,116 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Raised when the job queue is at capacity
+class QueueFull(Exception):
+    pass
+
+
+# A background computation with its progress events and result
+class Job:
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.events = [{'stage': 'queued', 'time': self.created}]
+        self._changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed')
+
+    def _update(self, stage, status=None, **fields):
+        with self._changed:
+            self.stage = stage
+            if status:
+                self.status = status
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.events.append({'stage': stage, 'time': time.time()})
+            self._changed.notify_all()
+
+    # Yield progress events from index `after` on, blocking until new ones arrive or the job ends
+    def wait_events(self, after=0, timeout=15.0):
+        while True:
+            with self._changed:
+                if len(self.events) <= after and not self.done:
+                    self._changed.wait(timeout)
+                new_events = self.events[after:]
+                finished = self.done
+            for event in new_events:
+                yield event
+            after += len(new_events)
+            if finished and not new_events:
+                return
+            if not new_events:
+                yield None  # Heartbeat so idle connections can be kept alive
+
+    def to_dict(self):
+        return {'job_id': self.id, 'status': self.status, 'stage': self.stage, 'error': self.error,
+                'created': self.created, 'finished': self.finished}
+
+
+# Runs jobs on a bounded worker pool. Submitting a key that is already queued or running returns
+# the existing job instead of starting a second one
+class JobManager:
+    def __init__(self, max_workers=2, max_pending=32, keep_finished=256):
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._in_flight = {}
+        self.merged = 0
+
+    # fn(progress) computes the result; progress(stage) reports a stage change to listeners
+    def submit(self, key, fn):
+        with self._lock:
+            job = self._in_flight.get(key)
+            if job is not None:
+                self.merged += 1
+                return job
+            if len(self._in_flight) >= self.max_pending:
+                raise QueueFull(f"{len(self._in_flight)} jobs already pending")
+
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        job._update('running', status='running')
+        try:
+            result = fn(lambda stage: job._update(stage))
+        except Exception as e:
+            job._update('failed', status='failed', error=str(e), finished=time.time())
+        else:
+            job._update('done', status='done', result=result, finished=time.time())
+        finally:
+            with self._lock:
+                self._in_flight.pop(job.key, None)
+
+    # Drop the oldest finished jobs beyond keep_finished
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {'pending': len(self._in_flight), 'max_pending': self.max_pending,
+                    'tracked': len(self._jobs), 'merged': self.merged}
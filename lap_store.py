@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import re
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cache_manager import CACHE_DIR, fetch_session
+
+# Columns kept from session.laps and session.weather_data; everything else FastF1 loads is dropped
+LAP_COLUMNS = ['Driver', 'LapNumber', 'TyreLife', 'TrackStatus', 'Compound', 'LapTime', 'LapStartTime', 'Time']
+WEATHER_COLUMNS = ['Time', 'AirTemp', 'TrackTemp', 'Humidity', 'Rainfall']
+CATEGORY_COLUMNS = {'Driver', 'TrackStatus', 'Compound'}
+FLOAT_COLUMNS = {'LapNumber', 'TyreLife', 'AirTemp', 'TrackTemp', 'Humidity'}
+
+# One directory per (year, GP) race, holding one .npy file per column, next to FastF1's files under F1_CACHE_DIR
+LAP_STORE_DIR = os.path.join(CACHE_DIR, 'laps')
+STORE_VERSION = 2
+
+# Upper bound on races loaded at the same time
+LOAD_WORKERS = int(os.environ.get('F1_LOAD_WORKERS', 8))
+
+logger = logging.getLogger(__name__)
+
+
+# Lightweight stand-in for a loaded fastf1 Session: just the laps and weather frames
+class StoredSession:
+    def __init__(self, year, gp_name, laps, weather_data):
+        self.year = year
+        self.gp_name = gp_name
+        self.laps = laps
+        self.weather_data = weather_data
+
+
+def session_path(year, gp_name, store_dir=LAP_STORE_DIR):
+    gp_slug = re.sub(r'[^A-Za-z0-9]+', '-', str(gp_name)).strip('-').lower()
+    return os.path.join(store_dir, f'v{STORE_VERSION}', f'{year}_{gp_slug}')
+
+
+# Write one frame as per-column arrays: categories as small integer codes, numbers as float32
+def _write_columns(frame, columns, directory, prefix):
+    schema = {}
+    for column in columns:
+        if column not in frame.columns:
+            continue
+        values = frame[column]
+        if column in CATEGORY_COLUMNS:
+            codes, categories = pd.factorize(values.astype(str).where(values.notna()), sort=True)
+            dtype = np.int8 if len(categories) < 127 else np.int16
+            np.save(os.path.join(directory, f'{prefix}.{column}.npy'), codes.astype(dtype))
+            schema[column] = {'categories': categories.tolist()}
+        elif column in FLOAT_COLUMNS:
+            np.save(os.path.join(directory, f'{prefix}.{column}.npy'), values.to_numpy(dtype=np.float32))
+            schema[column] = {}
+        else:
+            np.save(os.path.join(directory, f'{prefix}.{column}.npy'), values.to_numpy())
+            schema[column] = {}
+    return schema
+
+
+def _read_columns(directory, prefix, schema):
+    columns = {}
+    for column, spec in schema.items():
+        values = np.load(os.path.join(directory, f'{prefix}.{column}.npy'), mmap_mode='r')
+        if 'categories' in spec:
+            columns[column] = pd.Categorical.from_codes(values, categories=spec['categories'])
+        else:
+            columns[column] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+# Store the columns we use from a loaded session (or any object with .laps and .weather_data)
+def write_session(session, year, gp_name, store_dir=LAP_STORE_DIR):
+    path = session_path(year, gp_name, store_dir)
+    tmp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+    os.makedirs(tmp_path)
+
+    laps = pd.DataFrame(session.laps)
+    weather_data = pd.DataFrame(session.weather_data)
+    meta = {
+        'version': STORE_VERSION,
+        'year': year,
+        'gp_name': gp_name,
+        'laps': _write_columns(laps, LAP_COLUMNS, tmp_path, 'laps'),
+        'weather': _write_columns(weather_data, WEATHER_COLUMNS, tmp_path, 'weather'),
+    }
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    # Publish atomically; if another worker stored the same race first, keep theirs
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+# Memory-map a stored race back as a StoredSession, or None if it has not been ingested
+def read_session(year, gp_name, store_dir=LAP_STORE_DIR):
+    path = session_path(year, gp_name, store_dir)
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return StoredSession(year, gp_name, _read_columns(path, 'laps', meta['laps']),
+                         _read_columns(path, 'weather', meta['weather']))
+
+
+# Load only laps and weather from FastF1 (no telemetry or race-control messages) and store them. Workers
+# ingesting the same race wait for the first one's download and then read FastF1's cache
+def ingest_session(year, gp_name, store_dir=LAP_STORE_DIR):
+    session = fetch_session(year, gp_name, 'R')
+    write_session(session, year, gp_name, store_dir)
+    return read_session(year, gp_name, store_dir)
+
+
+# Race laps and weather for one season, ingested on first use and memory-mapped afterwards
+def load_session(year, gp_name, store_dir=LAP_STORE_DIR):
+    session = read_session(year, gp_name, store_dir)
+    if session is None:
+        session = ingest_session(year, gp_name, store_dir)
+    return session
+
+
+# Load many (year, GP) races concurrently. Sessions come back in the order requested; a race that
+# fails to load is logged and skipped so one bad season does not abort the rest
+def load_sessions(races, max_workers=LOAD_WORKERS, store_dir=LAP_STORE_DIR):
+    races = list(races)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(races)))) as pool:
+        futures = [pool.submit(load_session, year, gp_name, store_dir) for year, gp_name in races]
+
+    sessions = []
+    for (year, gp_name), future in zip(races, futures):
+        try:
+            sessions.append(future.result())
+        except Exception as e:
+            logger.warning("Skipping %s %s: %s", year, gp_name, e)
+    if not sessions:
+        raise RuntimeError(f"No session data could be loaded for {races}")
+    return sessions
+
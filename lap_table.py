@@ -0,0 +1,167 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import weakref
+
+import numpy as np
+
+from metrics import count_predictions, inc, timed_stage
+from model_registry import ModelRegistry
+from prediction import (COMPOUNDS, WEATHER_FEATURES, build_feature_matrix, expand_strategies, learns_rain,
+                        model_weather, rain_factors)
+
+# Lap tables are stored next to the trained models
+LAP_TABLE_DIR = 'models'
+MAX_CACHED_TABLES = 16
+
+_fingerprints = weakref.WeakKeyDictionary()
+# Tables in memory by cache key, least recently used evicted first; shared by request threads
+_tables = ModelRegistry(MAX_CACHED_TABLES)
+
+
+# Hash a fitted model together with the feature columns it was trained on
+def model_fingerprint(model, feature_names):
+    key = tuple(feature_names)
+    cached = _fingerprints.get(model)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    digest = hashlib.sha256('\0'.join(key).encode())
+    if hasattr(model, 'estimators_'):
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            for array in (tree.children_left, tree.children_right, tree.feature, tree.threshold, tree.value):
+                digest.update(np.ascontiguousarray(array).tobytes())
+    else:
+        digest.update(pickle.dumps(model))
+    fingerprint = digest.hexdigest()[:16]
+    _fingerprints[model] = (key, fingerprint)
+    return fingerprint
+
+
+# Short hash of the weather a table was predicted for; empty when the model has no weather features,
+# so those models keep a single table whatever the weather
+def weather_key(weather, feature_names):
+    if weather is None or not any(name in feature_names for name in WEATHER_FEATURES):
+        return ''
+    used = {name: weather.get(name) for name in ('temperature', 'track_temperature', 'humidity', 'weather_condition',
+                                                 'forecast')}
+    return hashlib.sha256(json.dumps(used, sort_keys=True, default=float).encode()).hexdigest()[:12]
+
+
+# Track statuses the model was trained on, taken from its one-hot columns
+def track_statuses(feature_names):
+    statuses = [name[len('TrackStatus_'):] for name in feature_names if name.startswith('TrackStatus_')]
+    return statuses or ['1']
+
+
+# Dense table of predicted lap times indexed by [track status, compound, lap, tyre life] for one weather
+# trajectory. Models that have not learned rain (prediction.learns_rain) are predicted dry and slowed by
+# RAIN_FACTOR on wet laps at lookup
+class LapTimeTable:
+    def __init__(self, times, statuses, fingerprint, models_rain=False):
+        self.times = times
+        self.statuses = list(statuses)
+        self.fingerprint = fingerprint
+        self.models_rain = models_rain
+        self._status_index = {s: i for i, s in enumerate(self.statuses)}
+        self._compound_index = {c: i for i, c in enumerate(COMPOUNDS)}
+
+    @property
+    def total_laps(self):
+        return self.times.shape[2] - 1
+
+    # Multiplier for wet conditions on top of the table's times, indexed by lap number
+    def rain_factors(self, weather):
+        return rain_factors(weather, np.arange(self.total_laps + 1), self.models_rain)
+
+    # Predicted lap times for arrays of laps, tyre ages and compounds
+    def lookup(self, laps, tyre_life, compounds, track_status='1', weather=None):
+        compound_idx = np.array([self._compound_index[c] for c in compounds], dtype=int)
+        times = self.times[self._status_index[track_status], compound_idx, laps, tyre_life]
+        return times * self.rain_factors(weather)[laps]
+
+    # Same output as prediction.predict_strategies, answered from the table
+    def lap_times(self, strategies, weather):
+        laps, tyre_life, compounds, offsets = expand_strategies(strategies)
+        times = self.lookup(laps, tyre_life, compounds, weather=weather)
+        rows = list(zip(laps.tolist(), times, compounds))
+        return [rows[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+# Predict every (track status, compound, lap, tyre life <= lap) combination in one model call, with each
+# lap's weather taken from the weather dict (its forecast, or the current reading throughout)
+@timed_stage('lap_table')
+def build_lap_time_table(model, feature_names, total_laps, weather=None):
+    statuses = track_statuses(feature_names)
+    lap_grid, life_grid = np.tril_indices(total_laps)
+    lap_grid, life_grid = lap_grid + 1, life_grid + 1
+    rows = len(lap_grid)
+
+    laps = np.tile(lap_grid, len(statuses) * len(COMPOUNDS))
+    tyre_life = np.tile(life_grid, len(statuses) * len(COMPOUNDS))
+    compounds = np.tile(np.repeat(COMPOUNDS, rows), len(statuses))
+    status = np.repeat(statuses, rows * len(COMPOUNDS))
+
+    models_rain = learns_rain(model, feature_names)
+    weather_rows = model_weather(weather, laps, models_rain)
+    predicted = model.predict(build_feature_matrix(laps, tyre_life, compounds, feature_names, status, weather_rows))
+    count_predictions(len(laps))
+
+    times = np.full((len(statuses), len(COMPOUNDS), total_laps + 1, total_laps + 1), np.nan)
+    status_idx = np.repeat(np.arange(len(statuses)), rows * len(COMPOUNDS))
+    compound_idx = np.tile(np.repeat(np.arange(len(COMPOUNDS)), rows), len(statuses))
+    times[status_idx, compound_idx, laps, tyre_life] = predicted
+    return LapTimeTable(times, statuses, model_fingerprint(model, feature_names), models_rain)
+
+
+def _count_lookup(source):
+    inc('f1_lap_table_lookups_total', labels={'source': source}, help='Lap table requests by where they were served from')
+
+
+# Build the lap table for a trained model and weather, reusing a cached one while both are unchanged. Only
+# tables for recorded weather are written to disk: forecasts come from requests, so their tables are kept
+# in memory alone and the disk holds one table per model
+def precompute_lap_table(model, feature_names, total_laps, cache_dir=LAP_TABLE_DIR, weather=None):
+    fingerprint = model_fingerprint(model, feature_names)
+    conditions = weather_key(weather, feature_names)
+    cache_key = f'{fingerprint}_{conditions}' if conditions else fingerprint
+    table = _tables.get(cache_key)
+    if table is not None and table.total_laps >= total_laps:
+        _count_lookup('memory')
+        return table
+
+    persist = cache_dir and not (weather or {}).get('forecast')
+    path = os.path.join(cache_dir, f'lap_table_{cache_key}.npz') if persist else None
+    if path and os.path.exists(path):
+        with np.load(path) as stored:
+            table = LapTimeTable(stored['times'], stored['statuses'].tolist(), fingerprint,
+                                 learns_rain(model, feature_names))
+    if table is None or table.total_laps < total_laps:
+        _count_lookup('built')
+        table = build_lap_time_table(model, feature_names, total_laps, weather)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = path + '.tmp.npz'
+            np.savez(tmp_path, times=table.times, statuses=np.array(table.statuses))
+            os.replace(tmp_path, path)
+    else:
+        _count_lookup('disk')
+
+    _tables.put(cache_key, table)
+    return table
+
+
+# Drop the lap tables of a model that has been replaced, on disk and in memory, so superseded models do not
+# leave their tables behind in the model directory
+def prune_lap_tables(fingerprint, cache_dir=LAP_TABLE_DIR):
+    _tables.discard(lambda cache_key: cache_key.split('_')[0] == fingerprint)
+    if not cache_dir:
+        return
+    for path in glob.glob(os.path.join(cache_dir, f'lap_table_{fingerprint}*.npz')):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
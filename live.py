@@ -0,0 +1,172 @@
+"""Live strategy replay: feeds a recorded race lap by lap into the live planner and prints the re-optimised
+plan for the rest of the race after every lap, with how long each update took."""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from optimizer import MAX_STOPS, PIT_LOSS, best_plan_from_state, remaining_race_costs, stint_cost_matrix
+from prediction import COMPOUNDS
+
+# Laps of evidence a compound needs before its correction moves halfway from the pre-race model
+PRIOR_LAPS = 5
+# Laps further than this (seconds) from the prediction are treated as traffic, incidents or pit laps
+RESIDUAL_LIMIT = 5.0
+
+
+# Re-plans the rest of a race after every completed lap. The pre-race lap table and its stint cost matrix
+# are computed once; completed laps only fit a per-compound bias and tyre-age slope on top of them, which
+# shifts the stint costs in closed form before the remaining-race DP is rerun
+class LiveStrategy:
+    def __init__(self, lap_table, total_laps, weather, pit_loss=PIT_LOSS, max_stops=MAX_STOPS):
+        self.total_laps = total_laps
+        self.pit_loss = pit_loss
+        self.max_stops = max_stops
+        lap_times = lap_table.times[lap_table.statuses.index('1') if '1' in lap_table.statuses else 0]
+        rain = lap_table.rain_factors(weather)[None, :total_laps + 1, None]
+        self.lap_times = lap_times[:, :total_laps + 1, :total_laps + 1] * rain
+        self.base_costs = stint_cost_matrix(self.lap_times, total_laps)
+
+        stint_laps = np.arange(total_laps + 1)[None, :] - np.arange(total_laps + 2)[:, None] + 1
+        self._stint_laps = np.clip(stint_laps, 0, None)
+        self._stint_age_sum = self._stint_laps * (self._stint_laps + 1) / 2
+
+        self.observations = {c: [] for c in COMPOUNDS}
+        self.correction = np.zeros((len(COMPOUNDS), 2))
+        self.last_lap = 0
+        self._remaining = None
+
+    # Record a completed lap; green-flag dry-compound laps update the correction for that compound. Laps up
+    # to the last one recorded are skipped, so a client can resend every lap of the race so far
+    def add_lap(self, lap, compound, tyre_life, lap_time, track_status='1'):
+        lap = int(lap)
+        if lap <= self.last_lap:
+            return False
+        self.last_lap = lap
+        if compound not in self.observations or str(track_status) != '1' or not np.isfinite(lap_time):
+            return False
+        tyre_life = int(min(tyre_life, lap))
+        if not 1 <= lap <= self.total_laps or tyre_life < 1:
+            return False
+        residual = lap_time - self.lap_times[COMPOUNDS.index(compound), lap, tyre_life]
+        if not abs(residual) <= RESIDUAL_LIMIT:
+            return False
+        self.observations[compound].append((tyre_life, residual))
+        self._remaining = None
+        return True
+
+    # Ridge fit of residual = bias + slope * tyre_age per compound, shrunk towards the pre-race model
+    def _fit_correction(self):
+        for c, compound in enumerate(COMPOUNDS):
+            if not self.observations[compound]:
+                continue
+            age, residual = np.array(self.observations[compound]).T
+            a = np.array([[len(age) + PRIOR_LAPS, age.sum()], [age.sum(), (age ** 2).sum() + PRIOR_LAPS]])
+            self.correction[c] = np.linalg.solve(a, [residual.sum(), (age * residual).sum()])
+
+    # Remaining-race tables for the current correction, rebuilt only after new laps arrive
+    def _remaining_tables(self):
+        if self._remaining is None:
+            self._fit_correction()
+            bias, slope = self.correction[:, 0], self.correction[:, 1]
+            costs = (self.base_costs + bias[:, None, None] * self._stint_laps
+                     + slope[:, None, None] * self._stint_age_sum)
+            self._remaining = remaining_race_costs(costs, self.total_laps, self.pit_loss, self.max_stops)
+        return self._remaining
+
+    # Corrected lap times of the current tyre if it stays on: current_stint[e] covers laps lap + 1 to e
+    def _current_stint(self, lap, compound, tyre_life):
+        c = COMPOUNDS.index(compound)
+        laps = np.arange(lap + 1, self.total_laps + 1)
+        ages = np.minimum(tyre_life + laps - lap, laps)
+        times = self.lap_times[c, laps, ages] + self.correction[c, 0] + self.correction[c, 1] * ages
+        current_stint = np.full(self.total_laps + 1, np.inf)
+        current_stint[lap] = 0.0
+        current_stint[lap + 1:] = np.cumsum(times)
+        return current_stint
+
+    # Best plan for the laps after `lap`, given the car's tyre and the stops and compounds used so far, or None
+    # when the race is over, the tyre is not one the planner knows or no plan is feasible (e.g. one dry
+    # compound used and no stops left). Wet compounds among compounds_used do not count towards the
+    # two-compound rule
+    def plan(self, lap, compound, tyre_life, stops, compounds_used=()):
+        if lap >= self.total_laps or compound not in COMPOUNDS:
+            return None
+        remaining = self._remaining_tables()
+        stints, remaining_time = best_plan_from_state(
+            remaining, self._current_stint(lap, compound, tyre_life), self.total_laps, lap, compound,
+            min(stops, self.max_stops), [c for c in compounds_used if c in COMPOUNDS], self.pit_loss)
+        if stints is None:
+            return None
+        return {'lap': lap, 'strategy': stints, 'remaining_time': remaining_time}
+
+
+# Feed one driver's recorded laps into a LiveStrategy in order, yielding the updated plan after each lap
+# together with the time the update took. Laps without a tyre age or compound (FastF1 leaves them out on some
+# first laps and after red flags) are skipped, as they cannot place the car on a tyre
+def replay_laps(live, driver_laps):
+    driver_laps = driver_laps.dropna(subset=['LapNumber', 'TyreLife', 'Compound']).sort_values('LapNumber')
+    stops, used, previous = 0, [], None
+    for row in driver_laps.itertuples(index=False):
+        start = time.perf_counter()
+        if previous is not None and (row.Compound != previous.Compound or row.TyreLife < previous.TyreLife):
+            stops += 1
+        if row.Compound not in used:
+            used.append(row.Compound)
+        lap_time = row.LapTime.total_seconds() if hasattr(row.LapTime, 'total_seconds') else float(row.LapTime)
+        live.add_lap(row.LapNumber, row.Compound, row.TyreLife, lap_time, row.TrackStatus)
+        plan = live.plan(int(row.LapNumber), row.Compound, int(row.TyreLife), stops, used)
+        previous = row
+        yield row, plan, time.perf_counter() - start
+
+
+# Plan the laps of one recorded session for a driver with a lap table trained on other seasons
+def replay_session(lap_table, session_laps, driver, total_laps, weather, pit_loss=PIT_LOSS):
+    live = LiveStrategy(lap_table, total_laps, weather, pit_loss)
+    return replay_laps(live, session_laps[session_laps['Driver'] == driver])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--gp', default='Monaco')
+    parser.add_argument('--year', type=int, default=2024, help='season whose race is replayed')
+    parser.add_argument('--train-years', type=int, nargs='+', default=[2022, 2023], help='seasons the model is trained on')
+    parser.add_argument('--driver', default='VER')
+    parser.add_argument('--pit-loss', type=float, default=PIT_LOSS)
+    parser.add_argument('--synthetic', action='store_true', help='replay a generated race instead of a recorded one')
+    args = parser.parse_args()
+
+    import backend
+    from lap_table import precompute_lap_table
+
+    if args.synthetic:
+        from benchmarks.synthetic import synthetic_seasons
+        sessions = synthetic_seasons(args.train_years + [args.year], args.gp)
+        laps = pd.concat([s.laps for s in sessions[:-1]], ignore_index=True)
+        model, feature_names = backend.train_ml_model(laps)
+        total_laps = int(laps['LapNumber'].max())
+        weather, replayed = backend.get_f1_weather(sessions[-1]), sessions[-1]
+        lap_table = precompute_lap_table(model, feature_names, total_laps, cache_dir=None, weather=weather)
+        driver = args.driver if args.driver in set(replayed.laps['Driver']) else replayed.laps['Driver'].iloc[0]
+    else:
+        from lap_store import load_session
+        gp_model = backend.get_gp_model(args.gp, args.train_years)
+        lap_table, total_laps, weather = gp_model['lap_table'], gp_model['total_laps'], gp_model['weather']
+        replayed, driver = load_session(args.year, args.gp), args.driver
+
+    timings = []
+    for row, plan, elapsed in replay_session(lap_table, replayed.laps, driver, total_laps, weather, args.pit_loss):
+        timings.append(elapsed)
+        if plan is None:
+            continue
+        stints = ', '.join(f"{start}-{end} {compound}" for start, end, compound in plan['strategy'])
+        print(f"Lap {int(row.LapNumber):3d} {row.Compound:6s} age {int(row.TyreLife):2d}: {stints}  "
+              f"(+{plan['remaining_time']:.1f}s, {elapsed * 1000:.1f} ms)")
+    if timings:
+        print(f"\n{len(timings)} laps replayed, median update {np.median(timings) * 1000:.1f} ms, "
+              f"max {max(timings) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
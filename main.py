@@ -1,4 +1,3 @@
-import fastf1
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
@@ -8,61 +7,62 @@ import matplotlib.ticker as ticker
 import streamlit as st
 import plotly.express as px
 
-# Enable caching for faster data retrieval
-fastf1.Cache.enable_cache('cache')
+from cache_manager import enable_cache
+from field_sim import evaluate_driver_strategies, overtake_delta
+from lap_store import load_sessions
+from lap_table import precompute_lap_table
+from metrics import request_debug, request_scope, timed_stage
+from model_store import load_or_train
+from optimizer import PIT_LOSS, optimize_strategies, strategy_race_time
+from prediction import predict_strategies
+from training_frame import FEATURE_NAMES, attach_weather, training_arrays, wet_laps
+
+# Enable caching for faster data retrieval, bounded by F1_CACHE_MAX_MB
+enable_cache()
 
 
 # Function to load multi-year race data dynamically
+@timed_stage('load')
 @st.cache_data
 def load_multi_year_data(years, gp_name):
-    laps_data = []
-    sessions = []
-    for year in years:
-        session = fastf1.get_session(year, gp_name, 'R')
-        session.load()
-        sessions.append(session)
-        laps_data.append(session.laps)
-    return pd.concat(laps_data, ignore_index=True), sessions
+    sessions = load_sessions([(year, gp_name) for year in years])
+    # Attach the weather reading in force at the start of each lap
+    laps = [attach_weather(session.laps, session.weather_data) for session in sessions]
+    return pd.concat(laps, ignore_index=True), sessions
 
 
 # Function to get weather data from FastF1
+@timed_stage('weather')
 def get_f1_weather(session):
     weather_data = session.weather_data.dropna()
     if weather_data.empty:
         print("⚠️ Warning: No weather data available. Using default conditions.")
-        return {'temperature': 25, 'humidity': 50, 'weather_condition': 'Clear'}
+        return {'temperature': 25, 'track_temperature': 35, 'humidity': 50, 'weather_condition': 'Clear'}
     latest_weather = weather_data.iloc[-1]  # Get the latest recorded weather data
 
     weather = {
         'temperature': float(latest_weather['AirTemp']),
+        'track_temperature': float(latest_weather['TrackTemp']),
         'humidity': float(latest_weather['Humidity']),
         'weather_condition': "Clear" if latest_weather['Rainfall'] == 0 else "Rain"
     }
     return weather
 
-# Train and cache ML model
-@st.cache_resource
+# Train ML model; app.py caches the trained model per (GP, years) so the laps frame is never hashed
+@timed_stage('train')
 def train_ml_model(laps):
     # Ensure _laps is a DataFrame
     if not isinstance(laps, pd.DataFrame):
         raise ValueError("Expected a Pandas DataFrame for laps data.")
 
-    # Drop rows where 'LapTime' is missing
-    laps = laps.dropna(subset=['LapTime']).copy()
-
-    # Convert LapTime to total seconds
-    laps['LapTimeSeconds'] = laps['LapTime'].dt.total_seconds()
-
-    # Feature selection & encoding categorical variables
-    features = laps[['LapNumber', 'TyreLife', 'TrackStatus', 'Compound']]
-    features = pd.get_dummies(features, columns=['Compound', 'TrackStatus'])
-
-    # Target variable
-    target = laps['LapTimeSeconds']
+    # Timed laps as a float32 matrix in the fixed feature layout, with lap times in seconds as the target
+    features, target = training_arrays(laps)
 
     # Train the RandomForest model
     model = RandomForestRegressor(n_estimators=50, random_state=42, n_jobs=-1)
     model.fit(features, target)
+    # Wet laps seen in training; with too few, rain is priced by a flat slowdown instead
+    model.wet_laps_ = wet_laps(features)
 
     return model, features.columns
 
@@ -70,26 +70,8 @@ def train_ml_model(laps):
 
 
 # Function to predict lap times using the trained model
-def predict_lap_times(model, strategy, weather, feature_names):
-    lap_times = []
-    for stint in strategy:
-        start_lap, end_lap, compound = stint
-        for lap in range(start_lap, end_lap + 1):
-            features = {
-                'LapNumber': lap,
-                'TyreLife': lap - start_lap + 1,
-                'TrackStatus_1': 1
-            }
-            for c in ['HARD', 'MEDIUM', 'SOFT']:
-                features[f'Compound_{c}'] = 1 if compound == c else 0
-
-            features_df = pd.DataFrame([features])
-            features_df = features_df.reindex(columns=feature_names, fill_value=0)
-            lap_time = model.predict(features_df)[0]
-            if weather['weather_condition'] == 'Rain':
-                lap_time *= 1.2  # Slower lap times in wet conditions
-            lap_times.append((lap, lap_time, compound))
-    return lap_times
+def predict_lap_times(model, strategy, weather, feature_names, lap_table=None):
+    return predict_strategies(model, [strategy], weather, feature_names, lap_table)[0]
 
 
 # Function to plot lap times with compounds using both scatter and line plots
@@ -127,36 +109,22 @@ def plot_lap_times(lap_times):
 
 
 # Function to simulate different strategies
-def simulate_strategies(model, weather, total_laps, feature_names):
-    compounds = ['SOFT', 'MEDIUM', 'HARD']
-    best_strategy = None
-    best_time = float('inf')
-    best_lap_times = []
+@timed_stage('search')
+def simulate_strategies(model, weather, total_laps, feature_names, lap_table=None, pit_loss=PIT_LOSS):
+    if lap_table is None:
+        lap_table = precompute_lap_table(model, feature_names, total_laps, weather=weather)
 
-    for first_tire in compounds:
-        for second_tire in [t for t in compounds if t != first_tire]:
-            for third_tire in [t for t in compounds if t != second_tire]:
-                first_stint_end = min(20, total_laps // 3)
-                second_stint_end = min(first_stint_end + 20, 2 * total_laps // 3)
-                third_stint_end = total_laps
-
-                strategy = [(1, first_stint_end, first_tire),
-                            (first_stint_end + 1, second_stint_end, second_tire),
-                            (second_stint_end + 1, third_stint_end, third_tire)]
-
-                lap_times = predict_lap_times(model, strategy, weather, feature_names)
-                race_time = sum(time for _, time, _ in lap_times) + 2 * 20
-
-                if race_time < best_time:
-                    best_time = race_time
-                    best_strategy = strategy
-                    best_lap_times = lap_times
+    # Search every pit lap for 1-, 2- and 3-stop strategies using at least two compounds
+    best_strategy, _ = optimize_strategies(lap_table, total_laps, weather, pit_loss=pit_loss, top_k=1)[0]
+    best_lap_times = predict_lap_times(model, best_strategy, weather, feature_names, lap_table)
+    best_time = strategy_race_time(best_strategy, best_lap_times, pit_loss)
 
     return best_strategy, best_time, best_lap_times
 
 
 # Function to simulate multiple strategies
-def simulate_alternative_strategies(model, weather, total_laps, feature_names):
+@timed_stage('alternatives')
+def simulate_alternative_strategies(model, weather, total_laps, feature_names, lap_table=None, pit_loss=PIT_LOSS):
     strategies = {
         "Aggressive 2-Stop": [(1, total_laps // 3, "SOFT"), (total_laps // 3 + 1, 2 * total_laps // 3, "SOFT"),
                               (2 * total_laps // 3 + 1, total_laps, "MEDIUM")],
@@ -166,15 +134,17 @@ def simulate_alternative_strategies(model, weather, total_laps, feature_names):
     }
     results = {}
 
-    for strategy_name, strategy in strategies.items():
-        lap_times = predict_lap_times(model, strategy, weather, feature_names)
-        race_time = sum(time for _, time, _ in lap_times) + len(strategy) * 20
+    all_lap_times = predict_strategies(model, list(strategies.values()), weather, feature_names, lap_table)
+    for (strategy_name, strategy), lap_times in zip(strategies.items(), all_lap_times):
+        race_time = strategy_race_time(strategy, lap_times, pit_loss)
         results[strategy_name] = (strategy, race_time, lap_times)
 
     return results
 
 # Function to simulate driver-specific strategy
-def simulate_driver_strategy(driver_name, grid_position, model, weather, total_laps, feature_names):
+@timed_stage('driver')
+def simulate_driver_strategy(driver_name, grid_position, model, weather, total_laps, feature_names, lap_table=None,
+                             pit_loss=PIT_LOSS):
     compounds = ['SOFT', 'MEDIUM', 'HARD']
     if grid_position <= 5:  # Front row strategy
         strategy = [(1, total_laps // 3, "MEDIUM"), (total_laps // 3 + 1, 2 * total_laps // 3, "HARD"),
@@ -184,8 +154,8 @@ def simulate_driver_strategy(driver_name, grid_position, model, weather, total_l
     else:  # Backmarker strategy
         strategy = [(1, total_laps // 2, "MEDIUM"), (total_laps // 2 + 1, total_laps, "HARD")]
 
-    lap_times = predict_lap_times(model, strategy, weather, feature_names)
-    race_time = sum(time for _, time, _ in lap_times) + len(strategy) * 20
+    lap_times = predict_lap_times(model, strategy, weather, feature_names, lap_table)
+    race_time = strategy_race_time(strategy, lap_times, pit_loss)
     return strategy, race_time, lap_times
 
 
@@ -205,11 +175,15 @@ def main():
     weather = get_f1_weather(sessions[-1])
     print(f"Current Weather: {weather}")
 
-    model, feature_names = train_ml_model(laps)
+    # Reuse the stored model when these laps were already trained on
+    model, feature_names = load_or_train((GP_NAME, tuple(YEARS), tuple(FEATURE_NAMES)), laps, train_ml_model)
 
-    best_strategy, best_time, best_lap_times = simulate_strategies(model, weather, total_laps, feature_names)
+    # Predict every lap, tyre age and compound once; strategies are then scored by table lookups
+    lap_table = precompute_lap_table(model, feature_names, total_laps, weather=weather)
 
-    alternative_strategies = simulate_alternative_strategies(model, weather, total_laps, feature_names)
+    best_strategy, best_time, best_lap_times = simulate_strategies(model, weather, total_laps, feature_names, lap_table)
+
+    alternative_strategies = simulate_alternative_strategies(model, weather, total_laps, feature_names, lap_table)
 
     #BEST STRATEGY
     print("\n🏁 **Best Strategy Found:**")
@@ -226,7 +200,7 @@ def main():
         plot_lap_times(lap_times)
 
         driver_strategy, driver_race_time, driver_lap_times = simulate_driver_strategy(
-            driver_name, grid_position, model, weather, total_laps, feature_names)
+            driver_name, grid_position, model, weather, total_laps, feature_names, lap_table)
 
         print("\n🏁 **Driver-Specific Strategy:**")
         for stint in driver_strategy:
@@ -236,9 +210,24 @@ def main():
 
         plot_lap_times(driver_lap_times)
 
+    # Rank the options again in a simulated 20-car race, where traffic and undercuts count
+    rivals = [strategy for strategy, _ in optimize_strategies(lap_table, total_laps, weather, top_k=10)]
+    candidates = [best_strategy] + [strategy for strategy, _, _ in alternative_strategies.values()]
+    field_results = evaluate_driver_strategies(lap_table, total_laps, weather, candidates, rivals + candidates[1:],
+                                               grid_position, overtake=overtake_delta(GP_NAME))
+    print(f"\n🏎 **Field Simulation for {driver_name} from P{grid_position}:**")
+    for result in field_results[:3]:
+        stints = ', '.join(f"{start}-{end} {compound}" for start, end, compound in result['strategy'])
+        print(f"{stints}: average finish P{result['mean_position']:.1f}, "
+              f"{result['traffic_loss']:.1f}s lost in traffic")
+
     # Plot the lap times
     plot_lap_times(best_lap_times)
 
 
 if __name__ == "__main__":
-    main()
+    with request_scope('main'):
+        main()
+        timings = request_debug()
+    if timings:
+        print(f"\n⏱ Stage timings (ms): {timings['stages_ms']}, model predictions: {timings['model_predictions']}")
@@ -0,0 +1,166 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+# Set F1_METRICS=0 to turn instrumentation off; decorators then return the undecorated function
+ENABLED = os.environ.get('F1_METRICS', '1') != '0'
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PREDICTION_BUCKETS = (0, 10, 100, 1000, 10000, 100000, 1000000)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_help = {}
+_gauge_callbacks = []
+_request = contextvars.ContextVar('f1_request_metrics', default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((labels or {}).items()))
+
+
+def inc(name, value=1, labels=None, help=''):
+    if not ENABLED:
+        return
+    with _lock:
+        _help.setdefault(name, ('counter', help))
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, labels=None, help='', buckets=LATENCY_BUCKETS):
+    if not ENABLED:
+        return
+    with _lock:
+        _help.setdefault(name, ('histogram', help))
+        key = _key(name, labels)
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram['counts'][i] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+# callback() returns (name, labels, value, help) tuples that are read at scrape time, e.g. cache hit ratios
+def register_gauges(callback):
+    _gauge_callbacks.append(callback)
+
+
+@contextmanager
+def _timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe('f1_stage_duration_seconds', elapsed, {'stage': name}, 'Time spent per pipeline stage')
+        state = _request.get()
+        if state is not None:
+            state['stages'][name] = state['stages'].get(name, 0.0) + elapsed
+
+
+# Time a block as a named pipeline stage (load, weather, train, predict, search, ...)
+def stage(name):
+    return _timed(name) if ENABLED else nullcontext()
+
+
+# Decorator form of stage()
+def timed_stage(name):
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _timed(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Record rows sent through model.predict, globally and for the current request
+def count_predictions(rows):
+    if not ENABLED:
+        return
+    inc('f1_model_predictions_total', rows, help='Rows passed to model.predict')
+    state = _request.get()
+    if state is not None:
+        state['predictions'] += rows
+
+
+# Collect stage timings and prediction counts for one request
+@contextmanager
+def request_scope(endpoint):
+    if not ENABLED:
+        yield None
+        return
+    state = {'stages': {}, 'predictions': 0}
+    token = _request.set(state)
+    start = time.perf_counter()
+    try:
+        yield state
+    finally:
+        observe('f1_request_duration_seconds', time.perf_counter() - start, {'endpoint': endpoint},
+                'End-to-end request latency')
+        observe('f1_request_model_predictions', state['predictions'], {'endpoint': endpoint},
+                'Model predictions per request', buckets=PREDICTION_BUCKETS)
+        inc('f1_requests_total', labels={'endpoint': endpoint}, help='Requests handled')
+        _request.reset(token)
+
+
+# Stage timings (ms) and prediction count of the current request, for a response's debug field
+def request_debug():
+    state = _request.get()
+    if state is None:
+        return None
+    return {'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in state['stages'].items()},
+            'model_predictions': state['predictions']}
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in labels) + '}'
+
+
+# Everything recorded so far in the Prometheus text exposition format
+def render():
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items(), key=lambda item: item[0])
+        help_text = dict(_help)
+
+    emitted = set()
+
+    def header(name, kind, text):
+        if name not in emitted:
+            emitted.add(name)
+            lines.append(f'# HELP {name} {text or name}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in counters:
+        header(name, 'counter', help_text[name][1])
+        lines.append(f'{name}{_format_labels(labels)} {value}')
+
+    for (name, labels), histogram in histograms:
+        header(name, 'histogram', help_text[name][1])
+        for bound, count in zip(histogram['buckets'], histogram['counts']):
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {count}')
+        lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+        lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+
+    for callback in _gauge_callbacks:
+        for name, labels, value, text in callback():
+            header(name, 'gauge', text)
+            lines.append(f'{name}{_format_labels(tuple(sorted((labels or {}).items())))} {value}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import re
+
+import joblib
+import pandas as pd
+import sklearn
+
+from lap_table import model_fingerprint, prune_lap_tables
+
+# Trained models are persisted here, one directory per (gp_name, years, feature schema) key
+MODEL_DIR = 'models'
+DATA_COLUMNS = ['LapNumber', 'TyreLife', 'TrackStatus', 'Compound', 'LapTime']
+
+
+# Stable hash of the lap data a model is trained on
+def data_fingerprint(laps, columns=DATA_COLUMNS):
+    columns = [c for c in columns if c in laps.columns]
+    hashed = pd.util.hash_pandas_object(laps[columns], index=False).values
+    return hashlib.sha256(hashed.tobytes()).hexdigest()[:16]
+
+
+# Directory name for a registry key such as ('Monaco', (2022, 2023, 2024), feature_columns)
+def key_path(key, model_dir=MODEL_DIR):
+    gp_name, years, schema = key
+    gp_slug = re.sub(r'[^A-Za-z0-9]+', '-', str(gp_name)).strip('-').lower()
+    schema_hash = hashlib.sha256('\0'.join(map(str, schema)).encode()).hexdigest()[:8]
+    return os.path.join(model_dir, f"{gp_slug}_{'-'.join(map(str, years))}_{schema_hash}")
+
+
+# Write the model uncompressed so its arrays can be memory-mapped back, then point the manifest at it. The lap
+# tables of a model it replaces, stored next to the models, are removed
+def save_model(key, model, feature_names, data_fp, metadata=None, model_dir=MODEL_DIR):
+    directory = key_path(key, model_dir)
+    os.makedirs(directory, exist_ok=True)
+    filename = f'{data_fp}-sklearn-{sklearn.__version__}.joblib'
+
+    tmp_path = os.path.join(directory, filename + '.tmp')
+    joblib.dump({'model': model, 'feature_names': list(feature_names)}, tmp_path)
+    os.replace(tmp_path, os.path.join(directory, filename))
+
+    previous = read_manifest(key, model_dir)
+    manifest = {
+        'key': [key[0], list(key[1]), list(key[2])],
+        'file': filename,
+        'data_fingerprint': data_fp,
+        'sklearn_version': sklearn.__version__,
+        # Lap tables are stored under this fingerprint; model sets (a dict of models) have none
+        'model_fingerprint': model_fingerprint(model, feature_names) if hasattr(model, 'predict') else None,
+        'metadata': metadata or {},
+    }
+    tmp_manifest = os.path.join(directory, 'manifest.json.tmp')
+    with open(tmp_manifest, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_manifest, os.path.join(directory, 'manifest.json'))
+
+    # The replaced model's lap tables can no longer be looked up
+    replaced = (previous or {}).get('model_fingerprint')
+    if replaced and replaced != manifest['model_fingerprint']:
+        prune_lap_tables(replaced, model_dir)
+
+
+# Manifest of a stored model, or None; a cheap way to tell whether the stored model changed
+def read_manifest(key, model_dir=MODEL_DIR):
+    try:
+        with open(os.path.join(key_path(key, model_dir), 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Map a stored model back in. Returns None when nothing usable is stored: no entry, a model written by
+# another scikit-learn version, or one trained on different data than data_fp (when given)
+def load_model(key, data_fp=None, model_dir=MODEL_DIR):
+    directory = key_path(key, model_dir)
+    manifest = read_manifest(key, model_dir)
+    if manifest is None:
+        return None
+
+    if manifest['sklearn_version'] != sklearn.__version__:
+        return None
+    if data_fp is not None and manifest['data_fingerprint'] != data_fp:
+        return None
+
+    try:
+        stored = joblib.load(os.path.join(directory, manifest['file']), mmap_mode='r')
+    except (OSError, EOFError, ValueError):
+        return None
+    return {
+        'model': stored['model'],
+        'feature_names': pd.Index(stored['feature_names']),
+        'data_fingerprint': manifest['data_fingerprint'],
+        'metadata': manifest['metadata'],
+    }
+
+
+# Reuse the stored model for these laps, or train one and store it
+def load_or_train(key, laps, train, metadata=None, model_dir=MODEL_DIR):
+    data_fp = data_fingerprint(laps)
+    stored = load_model(key, data_fp, model_dir)
+    if stored is not None:
+        return stored['model'], stored['feature_names']
+
+    model, feature_names = train(laps)
+    save_model(key, model, feature_names, data_fp, metadata, model_dir)
+    return model, feature_names
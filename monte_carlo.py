@@ -0,0 +1,143 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from optimizer import PIT_LOSS
+from prediction import COMPOUNDS, expand_strategies
+
+GREEN, SAFETY_CAR, VIRTUAL_SAFETY_CAR = 0, 1, 2
+
+# Fallbacks when a GP has no history, or the model never saw neutralised laps
+DEFAULT_STATUS_MODEL = {'sc_start': 0.01, 'vsc_start': 0.01, 'sc_durations': [4], 'vsc_durations': [2]}
+SC_SLOWDOWN, VSC_SLOWDOWN = 1.4, 1.3
+
+PIT_LOSS_SD = 1.5
+SC_PIT_FACTOR = 0.5
+WEAR_SD = 0.15
+SCENARIO_CHUNK = 2500
+
+
+# Per-lap chance of a safety car or VSC starting, and how long they lasted, from historical TrackStatus
+def track_status_model(sessions):
+    race_laps, sc_durations, vsc_durations = 0, [], []
+    for session in sessions:
+        laps = session.laps.dropna(subset=['LapNumber'])
+        if laps.empty:
+            continue
+        status = laps['TrackStatus'].astype(str)
+        by_lap = laps.assign(SC=status.str.contains('4'), VSC=status.str.contains('6|7'))
+        by_lap = by_lap.groupby('LapNumber')[['SC', 'VSC']].any().sort_index()
+        race_laps += len(by_lap)
+
+        neutralised = np.where(by_lap['SC'], SAFETY_CAR, np.where(by_lap['VSC'], VIRTUAL_SAFETY_CAR, GREEN))
+        run_starts = np.flatnonzero(np.diff(neutralised, prepend=GREEN - 1) != 0)
+        run_lengths = np.diff(np.append(run_starts, len(neutralised)))
+        for start, length in zip(run_starts, run_lengths):
+            if neutralised[start] == SAFETY_CAR:
+                sc_durations.append(int(length))
+            elif neutralised[start] == VIRTUAL_SAFETY_CAR:
+                vsc_durations.append(int(length))
+
+    if not race_laps:
+        return dict(DEFAULT_STATUS_MODEL)
+    return {
+        'sc_start': len(sc_durations) / race_laps,
+        'vsc_start': len(vsc_durations) / race_laps,
+        'sc_durations': sc_durations or DEFAULT_STATUS_MODEL['sc_durations'],
+        'vsc_durations': vsc_durations or DEFAULT_STATUS_MODEL['vsc_durations'],
+    }
+
+
+# Sample neutralised laps for many scenarios at once: status[n, lap - 1] is GREEN, SAFETY_CAR or VSC
+def sample_track_status(rng, n_scenarios, total_laps, status_model):
+    status = np.zeros((n_scenarios, total_laps), dtype=np.int8)
+    for kind, start_p, durations in ((VIRTUAL_SAFETY_CAR, status_model['vsc_start'], status_model['vsc_durations']),
+                                     (SAFETY_CAR, status_model['sc_start'], status_model['sc_durations'])):
+        starts = rng.random((n_scenarios, total_laps)) < start_p
+        length = np.where(starts, rng.choice(np.asarray(durations), size=starts.shape), 0)
+        for offset in range(min(int(np.max(durations)), total_laps)):
+            covered = np.zeros_like(starts)
+            covered[:, offset:] = length[:, :total_laps - offset] > offset
+            status[covered] = kind
+    return status
+
+
+# Per-lap arrays a strategy is simulated from: fresh-tyre pace, degradation on top of it,
+# neutralised lap times, compound index and the laps on which it pits
+def strategy_arrays(lap_table, strategies, weather):
+    laps, tyre_life, compounds, offsets = expand_strategies(strategies)
+    factor = lap_table.rain_factors(weather)[laps]
+
+    green = lap_table.lookup(laps, tyre_life, compounds) * factor
+    fresh = lap_table.lookup(laps, np.ones_like(tyre_life), compounds) * factor
+    if '4' in lap_table.statuses:
+        sc = lap_table.lookup(laps, tyre_life, compounds, track_status='4') * factor
+    else:
+        sc = green * SC_SLOWDOWN
+    vsc_status = next((s for s in ('6', '7') if s in lap_table.statuses), None)
+    if vsc_status:
+        vsc = lap_table.lookup(laps, tyre_life, compounds, track_status=vsc_status) * factor
+    else:
+        vsc = green * VSC_SLOWDOWN
+    compound_idx = np.array([COMPOUNDS.index(c) for c in compounds])
+
+    arrays = []
+    for strategy, start, end in zip(strategies, offsets[:-1], offsets[1:]):
+        arrays.append({
+            'fresh': fresh[start:end],
+            'wear': green[start:end] - fresh[start:end],
+            'sc': sc[start:end],
+            'vsc': vsc[start:end],
+            'compound': compound_idx[start:end],
+            'pit_laps': np.array([end_lap for _, end_lap, _ in strategy[:-1]], dtype=int),
+        })
+    return arrays
+
+
+# Race times of every strategy over one chunk of scenarios, shape (strategies, scenarios)
+def _simulate_chunk(arrays, total_laps, status_model, n_scenarios, seed, pit_loss, pit_loss_sd, wear_sd,
+                    sc_pit_factor):
+    rng = np.random.default_rng(seed)
+    status = sample_track_status(rng, n_scenarios, total_laps, status_model)
+    green, sc, vsc = ((status == kind).astype(float) for kind in (GREEN, SAFETY_CAR, VIRTUAL_SAFETY_CAR))
+    wear_factor = np.clip(rng.normal(1.0, wear_sd, (n_scenarios, len(COMPOUNDS))), 0, None)
+    max_stops = max(len(a['pit_laps']) for a in arrays)
+    pit_samples = np.clip(rng.normal(pit_loss, pit_loss_sd, (n_scenarios, max(max_stops, 1))), 0, None)
+
+    times = np.empty((len(arrays), n_scenarios))
+    for i, a in enumerate(arrays):
+        wear = a['wear'] * wear_factor[:, a['compound']]
+        total = (green * (a['fresh'] + wear)).sum(axis=1) + sc @ a['sc'] + vsc @ a['vsc']
+        if len(a['pit_laps']):
+            stops = pit_samples[:, :len(a['pit_laps'])]
+            neutralised = status[:, a['pit_laps'] - 1] != GREEN
+            total += np.where(neutralised, stops * sc_pit_factor, stops).sum(axis=1)
+        times[i] = total
+    return times
+
+
+# Race-time distribution (mean, P10/P50/P90) for each strategy over n_scenarios sampled races.
+# Scenarios are split into fixed chunks with their own seeds, so results do not depend on `processes`
+def simulate_race_distribution(lap_table, strategies, total_laps, weather, status_model=None, n_scenarios=10000,
+                               pit_loss=PIT_LOSS, pit_loss_sd=PIT_LOSS_SD, wear_sd=WEAR_SD,
+                               sc_pit_factor=SC_PIT_FACTOR, seed=0, processes=1):
+    status_model = status_model or DEFAULT_STATUS_MODEL
+    arrays = strategy_arrays(lap_table, strategies, weather)
+    chunk_sizes = [min(SCENARIO_CHUNK, n_scenarios - start) for start in range(0, n_scenarios, SCENARIO_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    args = [(arrays, total_laps, status_model, size, chunk_seed, pit_loss, pit_loss_sd, wear_sd, sc_pit_factor)
+            for size, chunk_seed in zip(chunk_sizes, seeds)]
+
+    if processes and processes > 1:
+        with ProcessPoolExecutor(max_workers=min(processes, os.cpu_count() or 1)) as pool:
+            chunks = list(pool.map(_simulate_chunk, *zip(*args)))
+    else:
+        chunks = [_simulate_chunk(*chunk_args) for chunk_args in args]
+    times = np.concatenate(chunks, axis=1)
+
+    p10, p50, p90 = np.percentile(times, [10, 50, 90], axis=1)
+    results = [{'strategy': strategy, 'mean': float(times[i].mean()), 'std': float(times[i].std()),
+                'p10': float(p10[i]), 'p50': float(p50[i]), 'p90': float(p90[i])}
+               for i, strategy in enumerate(strategies)]
+    return sorted(results, key=lambda r: r['mean'])
@@ -0,0 +1,196 @@
+import numpy as np
+
+from prediction import COMPOUNDS
+
+# Default time lost driving through the pit lane, in seconds
+PIT_LOSS = 20
+MAX_STOPS = 3
+TOP_K = 5
+
+
+# Race time of a strategy from its predicted laps: every lap plus pit_loss for each stop. The search, the
+# alternatives and the driver strategies all score with it so one response compares like with like
+def strategy_race_time(strategy, lap_times, pit_loss=PIT_LOSS):
+    return sum(time for _, time, _ in lap_times) + (len(strategy) - 1) * pit_loss
+
+
+# Cost of every stint: costs[c, start, end] is the summed lap time of compound c fitted on lap `start`
+# and run to lap `end` inclusive, with tyre age counted from 1 at the start of the stint
+def stint_cost_matrix(lap_times, total_laps, min_stint_laps=1, max_stint_laps=None):
+    n_compounds = lap_times.shape[0]
+    start = np.arange(1, total_laps + 1)[:, None]
+    offset = np.arange(total_laps)[None, :]
+    lap = start + offset
+    valid = lap <= total_laps
+
+    costs = np.full((n_compounds, total_laps + 2, total_laps + 1), np.inf)
+    starts, offsets = np.nonzero(valid)
+    for c in range(n_compounds):
+        per_lap = np.where(valid, lap_times[c, np.minimum(lap, total_laps), np.minimum(offset + 1, total_laps)], 0)
+        cumulative = np.cumsum(per_lap, axis=1)
+        costs[c, starts + 1, starts + 1 + offsets] = cumulative[starts, offsets]
+
+    stint_laps = np.arange(total_laps + 1)[None, :] - np.arange(total_laps + 2)[:, None] + 1
+    too_short = stint_laps < min_stint_laps
+    too_long = stint_laps > max_stint_laps if max_stint_laps else np.zeros_like(too_short)
+    costs[:, too_short | too_long] = np.inf
+    return costs
+
+
+# Keep the k smallest entries along axis 0, sorted, together with their row indices
+def _top_k(values, k):
+    k = min(k, values.shape[0])
+    idx = np.argpartition(values, k - 1, axis=0)[:k]
+    picked = np.take_along_axis(values, idx, axis=0)
+    order = np.argsort(picked, axis=0, kind='stable')
+    return np.take_along_axis(picked, order, axis=0), np.take_along_axis(idx, order, axis=0)
+
+
+# K-best dynamic programme over (lap, compound, tyre age, stops used, compounds used).
+# Tyre age is carried by the stint cost matrix, so each state only records where the last stint ended.
+def search_stint_plans(costs, total_laps, pit_loss=PIT_LOSS, max_stops=MAX_STOPS, top_k=TOP_K):
+    n_compounds = costs.shape[0]
+    width = total_laps + 1
+    states = [{} for _ in range(max_stops + 1)]
+
+    for c in range(n_compounds):
+        best = np.full((top_k, width), np.inf)
+        best[0] = costs[c, 1]
+        states[0][(c, 1 << c)] = {'cost': best, 'source': None}
+
+    for stops in range(max_stops):
+        sources = list(states[stops].items())
+        for next_c in range(n_compounds):
+            targets = {}
+            for source_id, ((c, mask), state) in enumerate(sources):
+                targets.setdefault(mask | (1 << next_c), []).append(source_id)
+
+            for mask, source_ids in targets.items():
+                stacked = np.concatenate([sources[i][1]['cost'] for i in source_ids])
+                merged, merged_row = _top_k(stacked, top_k)
+
+                # candidates[k, p, e]: k-th best plan up to pit lap p, then compound next_c from p + 1 to e
+                candidates = merged[:, :, None] + pit_loss + costs[next_c, 1:width + 1][None, :, :]
+                flat = candidates.reshape(-1, width)
+                best, row = _top_k(flat, top_k)
+                k_idx, prev_end = np.divmod(row, width)
+                merged_row = merged_row[k_idx, prev_end]
+
+                states[stops + 1][(next_c, mask)] = {
+                    'cost': best,
+                    'source': (stops, [sources[i][0] for i in source_ids], top_k),
+                    'source_row': merged_row,
+                    'prev_end': prev_end,
+                }
+    return states
+
+
+# Walk the back-pointers of one DP entry into a list of (start_lap, end_lap, compound) stints
+def _reconstruct(states, stops, key, k, end):
+    stints = []
+    while True:
+        state = states[stops][key]
+        if state['source'] is None:
+            stints.append((1, end, COMPOUNDS[key[0]]))
+            break
+        prev_end = int(state['prev_end'][k, end])
+        stints.append((prev_end + 1, end, COMPOUNDS[key[0]]))
+        source_stops, source_keys, block = state['source']
+        row = int(state['source_row'][k, end])
+        key, k = source_keys[row // block], row % block
+        stops, end = source_stops, prev_end
+    return stints[::-1]
+
+
+# Search every pit lap for 1- to max_stops-stop strategies using at least two compounds, best first
+def optimize_strategies(lap_table, total_laps, weather, pit_loss=PIT_LOSS, max_stops=MAX_STOPS, top_k=TOP_K,
+                        min_stint_laps=1, max_stint_laps=None):
+    lap_times = lap_table.times[lap_table.statuses.index('1') if '1' in lap_table.statuses else 0]
+    rain = lap_table.rain_factors(weather)[None, :total_laps + 1, None]
+    lap_times = lap_times[:, :total_laps + 1, :total_laps + 1] * rain
+
+    costs = stint_cost_matrix(lap_times, total_laps, min_stint_laps, max_stint_laps)
+    states = search_stint_plans(costs, total_laps, pit_loss, max_stops, top_k)
+    return best_plans(states, total_laps, max_stops, top_k)
+
+
+# The top_k finished plans of a search_stint_plans result that use at least two compounds, best first.
+# A search run with a smaller top_k than asked for here gives the best plan of each (stops, compound, compound set)
+def best_plans(states, total_laps, max_stops=MAX_STOPS, top_k=TOP_K):
+    finishers = []
+    for stops in range(1, max_stops + 1):
+        for key, state in states[stops].items():
+            if bin(key[1]).count('1') < 2:
+                continue
+            for k in range(len(state['cost'])):
+                if np.isfinite(state['cost'][k, total_laps]):
+                    finishers.append((state['cost'][k, total_laps], stops, key, k))
+
+    finishers.sort(key=lambda entry: entry[0])
+    return [(_reconstruct(states, stops, key, k, total_laps), float(cost))
+            for cost, stops, key, k in finishers[:top_k]]
+
+
+# Backward DP over the rest of the race: value[r, mask, p] is the cheapest way to run laps p + 1 to the flag
+# with a fresh stint starting on lap p + 1, at most r more stops after it and `mask` the compounds used so
+# far. next_compound/next_end hold the first stint of that plan. Finishing needs two compounds, as above
+def remaining_race_costs(costs, total_laps, pit_loss=PIT_LOSS, max_stops=MAX_STOPS):
+    n_compounds = costs.shape[0]
+    width = total_laps + 1
+    n_masks = 1 << n_compounds
+    value = np.full((max_stops + 1, n_masks, width), np.inf)
+    next_compound = np.zeros((max_stops + 1, n_masks, width), dtype=np.int8)
+    next_end = np.full((max_stops + 1, n_masks, width), total_laps, dtype=np.int16)
+
+    for r in range(max_stops + 1):
+        for mask in range(n_masks):
+            for c in range(n_compounds):
+                new_mask = mask | (1 << c)
+                stint = costs[c, 1:width + 1]  # stint[p, e]: compound c from lap p + 1 to lap e
+                best = stint[:, total_laps] if bin(new_mask).count('1') >= 2 else np.full(width, np.inf)
+                end = np.full(width, total_laps)
+                if r > 0:
+                    pitted = stint[:, :total_laps] + pit_loss + value[r - 1, new_mask, :total_laps][None, :]
+                    pit_end = np.argmin(pitted, axis=1)
+                    pit_cost = pitted[np.arange(width), pit_end]
+                    better = pit_cost < best
+                    best = np.where(better, pit_cost, best)
+                    end = np.where(better, pit_end, end)
+                improved = best < value[r, mask]
+                value[r, mask] = np.where(improved, best, value[r, mask])
+                next_compound[r, mask] = np.where(improved, c, next_compound[r, mask])
+                next_end[r, mask] = np.where(improved, end, next_end[r, mask])
+    return value, next_compound, next_end
+
+
+# Best plan for the rest of the race from a car's current state: lap just completed, compound fitted, its tyre
+# age, stops made and the compounds used so far. current_stint[e] is the cost of staying out until lap e.
+# Returns the remaining stints (the first continues the current tyre) and their summed time
+def best_plan_from_state(remaining, current_stint, total_laps, lap, compound, stops, compounds_used,
+                         pit_loss=PIT_LOSS):
+    value, next_compound, next_end = remaining
+    stops_left = value.shape[0] - 1 - stops
+    mask = 0
+    for used in set(compounds_used) | {compound}:
+        mask |= 1 << COMPOUNDS.index(used)
+
+    best_cost, best_end = np.inf, total_laps
+    if bin(mask).count('1') >= 2:
+        best_cost = current_stint[total_laps]
+    if stops_left > 0 and lap + 1 < total_laps:
+        ends = np.arange(lap + 1, total_laps)
+        pitted = current_stint[ends] + pit_loss + value[stops_left - 1, mask, ends]
+        i = int(np.argmin(pitted))
+        if pitted[i] < best_cost:
+            best_cost, best_end = pitted[i], int(ends[i])
+    if not np.isfinite(best_cost):
+        return None, float('inf')
+
+    stints = [(lap + 1, best_end, compound)]
+    r, p = stops_left - 1, best_end
+    while p < total_laps:
+        c, end = int(next_compound[r, mask, p]), int(next_end[r, mask, p])
+        stints.append((p + 1, end, COMPOUNDS[c]))
+        mask |= 1 << c
+        r, p = r - 1, end
+    return stints, float(best_cost)
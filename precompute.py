@@ -0,0 +1,91 @@
+"""Precompute strategy results for a season calendar: trains (or maps in) each GP's model, runs the strategy
+search and alternative strategies, and the driver strategy for every grid position, one GP per worker
+process, and writes them to the results store that backend.py and app.py answer from."""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fastf1
+
+from field_sim import FIELD_SIZE
+from optimizer import PIT_LOSS
+from results_store import RESULTS_STORE_PATH, ResultsWriter, result_key
+
+logger = logging.getLogger(__name__)
+
+
+# Race names of a season calendar, without testing events
+def season_calendar(year):
+    schedule = fastf1.get_event_schedule(year, include_testing=False)
+    return schedule['EventName'].tolist()
+
+
+# Everything stored for one GP: (pit_loss, GP-level result, weather, total laps, {grid_position: driver strategy})
+# for each pit loss. Runs in a worker process
+def precompute_gp(gp_name, years, pit_losses, grid_positions):
+    import backend
+
+    entries = []
+    for pit_loss in pit_losses:
+        gp_model, gp_result = backend.run_gp_prediction(gp_name, pit_loss, years=years)
+        drivers = {grid_position: backend.run_driver_prediction(gp_model, None, grid_position, pit_loss)
+                   for grid_position in grid_positions}
+        entries.append((pit_loss, gp_result, gp_model['weather'], gp_model['total_laps'], drivers))
+    return entries
+
+
+# Precompute every GP in gp_names into the results store, `processes` GPs at a time. A failing GP is
+# logged and skipped; the GPs that finished are stored either way. Returns the GPs stored
+def precompute_calendar(gp_names, years, pit_losses=(PIT_LOSS,), grid_positions=range(1, FIELD_SIZE + 1),
+                        processes=1, path=RESULTS_STORE_PATH):
+    stored = []
+    grid_positions = list(grid_positions)
+    with ResultsWriter(path) as writer, ProcessPoolExecutor(max_workers=max(1, processes)) as pool:
+        futures = {pool.submit(precompute_gp, gp_name, years, list(pit_losses), grid_positions): gp_name
+                   for gp_name in gp_names}
+        for future in as_completed(futures):
+            gp_name = futures[future]
+            try:
+                entries = future.result()
+            except Exception:
+                logger.exception("Precompute failed for %s", gp_name)
+                continue
+            model_key = result_key(gp_name, years)
+            for pit_loss, gp_result, weather, total_laps, drivers in entries:
+                writer.add_gp(model_key, pit_loss, gp_result, weather, total_laps)
+                for grid_position, driver_strategy in drivers.items():
+                    writer.add_grid(model_key, pit_loss, grid_position, driver_strategy)
+            writer.commit()
+            stored.append(gp_name)
+            logger.info("Stored %s", gp_name)
+    return stored
+
+
+def main():
+    from backend import DEFAULT_YEARS
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--season', type=int, default=DEFAULT_YEARS[-1], help='season whose calendar is precomputed')
+    parser.add_argument('--gps', nargs='+', help='GPs to precompute instead of the whole calendar')
+    parser.add_argument('--years', type=int, nargs='+', default=DEFAULT_YEARS, help='seasons the models are trained on')
+    parser.add_argument('--pit-loss', type=float, nargs='+', default=[PIT_LOSS])
+    parser.add_argument('--grid-positions', type=int, default=FIELD_SIZE, help='precompute grid positions 1 to N')
+    parser.add_argument('--processes', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--output', default=RESULTS_STORE_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    gp_names = args.gps or season_calendar(args.season)
+    start = time.perf_counter()
+    stored = precompute_calendar(gp_names, args.years, args.pit_loss, range(1, args.grid_positions + 1),
+                                 args.processes, args.output)
+    print(f"{len(stored)}/{len(gp_names)} GPs stored in {args.output} in {time.perf_counter() - start:.0f}s")
+    missing = [gp_name for gp_name in gp_names if gp_name not in stored]
+    if missing:
+        print(f"Failed: {', '.join(missing)}")
+
+
+if __name__ == '__main__':
+    main()
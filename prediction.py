@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+from flat_forest import fast_predict
+from metrics import count_predictions, stage
+
+# Compounds the strategy code plans with and the slowdown applied in wet conditions
+COMPOUNDS = ['HARD', 'MEDIUM', 'SOFT']
+RAIN_FACTOR = 1.2
+# Wet laps a model has to be trained on before its Rainfall feature is trusted to price in the rain. Few
+# seasons have that many, so most models are predicted dry and slowed by RAIN_FACTOR on wet laps instead
+MIN_WET_LAPS = 200
+
+# Per-lap weather columns, and the reading used for any the weather dict leaves out
+WEATHER_FEATURES = ['AirTemp', 'TrackTemp', 'Humidity', 'Rainfall']
+DEFAULT_WEATHER = {'AirTemp': 25.0, 'TrackTemp': 35.0, 'Humidity': 50.0, 'Rainfall': 0.0}
+
+
+# Weather features for the given lap numbers. A weather dict describes the current conditions
+# (temperature, track_temperature, humidity, weather_condition) and may add 'forecast': one
+# {AirTemp, TrackTemp, Humidity, Rainfall} reading per lap from lap 1, the last one holding to the flag
+def weather_trajectory(weather, laps):
+    current = {
+        'AirTemp': weather.get('temperature', DEFAULT_WEATHER['AirTemp']),
+        'TrackTemp': weather.get('track_temperature', DEFAULT_WEATHER['TrackTemp']),
+        'Humidity': weather.get('humidity', DEFAULT_WEATHER['Humidity']),
+        'Rainfall': 1.0 if weather.get('weather_condition') == 'Rain' else 0.0,
+    }
+    laps = np.asarray(laps, dtype=int)
+    forecast = weather.get('forecast')
+    if not forecast:
+        return {name: np.full(len(laps), float(value)) for name, value in current.items()}
+    step = np.clip(laps - 1, 0, len(forecast) - 1)
+    return {name: np.array([float(reading.get(name, current[name])) for reading in forecast])[step]
+            for name in WEATHER_FEATURES}
+
+
+# Whether a model predicts rain itself: it has a Rainfall feature and the training functions recorded at least
+# MIN_WET_LAPS wet laps on it (wet_laps_). Models stored before that was recorded count as dry-only
+def learns_rain(model, feature_names):
+    return 'Rainfall' in feature_names and getattr(model, 'wet_laps_', 0) >= MIN_WET_LAPS
+
+
+# Weather fed to the model for the given laps; a model that has not learned rain is always asked for dry laps
+def model_weather(weather, laps, models_rain):
+    trajectory = weather_trajectory(weather or {}, laps)
+    if not models_rain:
+        trajectory['Rainfall'] = np.zeros(len(trajectory['Rainfall']))
+    return trajectory
+
+
+# Slowdown on top of each lap's prediction: RAIN_FACTOR on the laps the weather (its forecast, or the current
+# condition throughout) has rain, unless the model predicts rain itself
+def rain_factors(weather, laps, models_rain):
+    laps = np.asarray(laps, dtype=int)
+    if models_rain or not weather:
+        return np.ones(len(laps))
+    return np.where(weather_trajectory(weather, laps)['Rainfall'] > 0, RAIN_FACTOR, 1.0)
+
+
+# Expand strategies into flat per-lap arrays plus the row offset where each strategy starts
+def expand_strategies(strategies):
+    laps, tyre_life, compounds, offsets = [], [], [], [0]
+    for strategy in strategies:
+        for start_lap, end_lap, compound in strategy:
+            stint_laps = np.arange(start_lap, end_lap + 1)
+            laps.append(stint_laps)
+            tyre_life.append(stint_laps - start_lap + 1)
+            compounds.extend([compound] * len(stint_laps))
+        offsets.append(len(compounds))
+    if not compounds:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), [], offsets
+    return np.concatenate(laps), np.concatenate(tyre_life), compounds, offsets
+
+
+# Build the model input for many laps at once, encoded the same way as a single-lap prediction.
+# weather maps weather feature names to per-row values
+def build_feature_matrix(laps, tyre_life, compounds, feature_names, track_status='1', weather=None):
+    columns = {name: i for i, name in enumerate(feature_names)}
+    matrix = np.zeros((len(laps), len(feature_names)))
+    if 'LapNumber' in columns:
+        matrix[:, columns['LapNumber']] = laps
+    if 'TyreLife' in columns:
+        matrix[:, columns['TyreLife']] = tyre_life
+    for name, values in (weather or {}).items():
+        if name in columns:
+            matrix[:, columns[name]] = values
+    track_status = np.broadcast_to(np.asarray(track_status), (len(laps),))
+    for status in np.unique(track_status):
+        if f'TrackStatus_{status}' in columns:
+            matrix[:, columns[f'TrackStatus_{status}']] = track_status == status
+    compounds = np.asarray(compounds)
+    for c in COMPOUNDS:
+        if f'Compound_{c}' in columns:
+            matrix[:, columns[f'Compound_{c}']] = compounds == c
+    return pd.DataFrame(matrix, columns=feature_names)
+
+
+# Predict every lap of every strategy with a single model call, or by lookups when a lap table is given.
+# Small batches go through the flat forest to skip sklearn's per-call validation and thread dispatch
+def predict_strategies(model, strategies, weather, feature_names, lap_table=None):
+    if lap_table is not None:
+        return lap_table.lap_times(strategies, weather)
+
+    laps, tyre_life, compounds, offsets = expand_strategies(strategies)
+    if not compounds:
+        return [[] for _ in strategies]
+
+    models_rain = learns_rain(model, feature_names)
+    with stage('predict'):
+        times = fast_predict(model, build_feature_matrix(laps, tyre_life, compounds, feature_names,
+                                                         weather=model_weather(weather, laps, models_rain)))
+    count_predictions(len(laps))
+    times = times * rain_factors(weather, laps, models_rain)
+
+    rows = list(zip(laps.tolist(), times, compounds))
+    return [rows[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
@@ -0,0 +1,141 @@
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import threading
+
+from metrics import inc
+from model_store import key_path
+from training_frame import FEATURE_NAMES
+
+# Precomputed strategy results written by precompute.py; the API and the dashboard only ever read it
+RESULTS_STORE_PATH = os.environ.get('F1_RESULTS_STORE', os.path.join('models', 'strategy_results.sqlite'))
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS gp_results (model_key TEXT, pit_loss REAL, payload TEXT, '
+    'PRIMARY KEY (model_key, pit_loss)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS grid_results (model_key TEXT, pit_loss REAL, grid_position INTEGER, payload TEXT, '
+    'PRIMARY KEY (model_key, pit_loss, grid_position)) WITHOUT ROWID',
+]
+
+
+# Store key of a GP's results: the model store directory name, so results follow the model's years and
+# feature schema
+def result_key(gp_name, years):
+    return key_path((gp_name, tuple(years), tuple(FEATURE_NAMES)), '')
+
+
+def _pit_loss(pit_loss):
+    return round(float(pit_loss), 3)
+
+
+def _count_lookup(result):
+    inc('f1_results_store_lookups_total', labels={'result': result}, help='Results store lookups by outcome')
+
+
+# Read-only view of the results store. The file is opened with mode=ro and reopened when precompute.py
+# replaces it; a missing store just answers None
+class ResultsStore:
+    def __init__(self, path=RESULTS_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._version = None
+
+    def _connect(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version != self._version:
+            if self._connection is not None:
+                self._connection.close()
+            uri = pathlib.Path(self.path).absolute().as_uri() + '?mode=ro'
+            self._connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._version = version
+        return self._connection
+
+    # Changes whenever precompute.py replaces the store; None while there is no store
+    def version(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return [stat.st_ino, stat.st_mtime_ns]
+
+    def _fetch(self, query, args):
+        with self._lock:
+            connection = self._connect()
+            if connection is None:
+                return None
+            try:
+                row = connection.execute(query, args).fetchone()
+            except sqlite3.DatabaseError:
+                return None
+        return json.loads(row[0]) if row else None
+
+    # {'result': GP-level /predict fields, 'weather': ..., 'total_laps': ...} or None
+    def gp_entry(self, model_key, pit_loss):
+        entry = self._fetch('SELECT payload FROM gp_results WHERE model_key = ? AND pit_loss = ?',
+                            (model_key, _pit_loss(pit_loss)))
+        _count_lookup('hit' if entry is not None else 'miss')
+        return entry
+
+    # Driver strategy for a grid position, or None
+    def grid_result(self, model_key, pit_loss, grid_position):
+        return self._fetch('SELECT payload FROM grid_results WHERE model_key = ? AND pit_loss = ? AND grid_position = ?',
+                           (model_key, _pit_loss(pit_loss), int(grid_position)))
+
+    # A whole /predict response (GP-level fields plus driver_strategy), or None unless both parts are stored
+    def lookup(self, model_key, pit_loss, grid_position):
+        entry = self.gp_entry(model_key, pit_loss)
+        if entry is None:
+            return None
+        driver_strategy = self.grid_result(model_key, pit_loss, grid_position)
+        if driver_strategy is None:
+            return None
+        return {**entry['result'], 'driver_strategy': driver_strategy}
+
+
+# Adds results to a copy of the store and swaps it in when closed, so readers never see a partial write
+# and GPs precomputed earlier are kept
+class ResultsWriter:
+    def __init__(self, path=RESULTS_STORE_PATH):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path):
+            shutil.copyfile(path, self.tmp_path)
+        elif os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self._connection = sqlite3.connect(self.tmp_path)
+        for statement in SCHEMA:
+            self._connection.execute(statement)
+
+    def add_gp(self, model_key, pit_loss, result, weather, total_laps):
+        payload = {'result': result, 'weather': weather, 'total_laps': total_laps}
+        self._connection.execute('INSERT OR REPLACE INTO gp_results VALUES (?, ?, ?)',
+                                 (model_key, _pit_loss(pit_loss), json.dumps(payload, default=float)))
+
+    def add_grid(self, model_key, pit_loss, grid_position, driver_strategy):
+        self._connection.execute('INSERT OR REPLACE INTO grid_results VALUES (?, ?, ?, ?)',
+                                 (model_key, _pit_loss(pit_loss), int(grid_position),
+                                  json.dumps(driver_strategy, default=float)))
+
+    def commit(self):
+        self._connection.commit()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+        os.replace(self.tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,210 @@
+import numpy as np
+
+from flat_forest import fast_predict
+from metrics import count_predictions
+from optimizer import MAX_STOPS, PIT_LOSS, TOP_K, best_plans, search_stint_plans, stint_cost_matrix
+from prediction import COMPOUNDS, build_feature_matrix, learns_rain, model_weather, rain_factors
+
+# Laps between the (lap, tyre age) grid points the forest is asked for when fitting the surrogate
+GRID_STEP = 4
+# Plans the surrogate search hands to the forest, and how many of the best of them are refined on pit laps
+RERANK_CANDIDATES = 24
+REFINE_STARTS = 5
+# Pit laps are moved up to this many laps either way when refining a plan
+PIT_SHIFT = 3
+# Best plans whose neighbours are all scored before the refinement stops
+REFINE_BEAM = 10
+
+
+# Green-flag lap times of the forest for [compound, lap, tyre age], predicted on first use and kept, with the
+# weather slowdown applied like the lap table. Lets a search score plans on the forest without predicting
+# every cell of the lap table
+class ForestCells:
+    def __init__(self, model, feature_names, total_laps, weather):
+        self.model = model
+        self.feature_names = feature_names
+        self.total_laps = total_laps
+        self.weather = weather
+        self.models_rain = learns_rain(model, feature_names)
+        self.rain = rain_factors(weather, np.arange(total_laps + 1), self.models_rain)
+        self.times = np.full((len(COMPOUNDS), total_laps + 1, total_laps + 1), np.nan)
+        self.predicted = 0
+
+    # Lap times for arrays of compound indexes, laps and tyre ages; missing cells go to the forest in one call
+    def get(self, compound_idx, laps, ages):
+        times = self.times[compound_idx, laps, ages]
+        missing = np.isnan(times)
+        if missing.any():
+            cells = np.unique(np.stack([compound_idx[missing], laps[missing], ages[missing]]), axis=1)
+            c, lap, age = cells
+            X = build_feature_matrix(lap, age, np.array(COMPOUNDS)[c], self.feature_names, '1',
+                                     model_weather(self.weather, lap, self.models_rain))
+            self.times[c, lap, age] = fast_predict(self.model, X) * self.rain[lap]
+            count_predictions(len(lap))
+            self.predicted += len(lap)
+            times = self.times[compound_idx, laps, ages]
+        return times
+
+    # Race time of every plan: its laps plus pit_loss for each stop
+    def race_times(self, strategies, pit_loss=PIT_LOSS):
+        stints = np.array([(COMPOUNDS.index(compound), start, end) for strategy in strategies
+                           for start, end, compound in strategy])
+        lengths = stints[:, 2] - stints[:, 1] + 1
+        stint_offsets = np.cumsum(lengths) - lengths
+        ages = np.arange(lengths.sum()) - np.repeat(stint_offsets, lengths) + 1
+        laps = np.repeat(stints[:, 1], lengths) + ages - 1
+        stint_times = np.add.reduceat(self.get(np.repeat(stints[:, 0], lengths), laps, ages), stint_offsets)
+        stint_counts = np.array([len(strategy) for strategy in strategies])
+        return np.add.reduceat(stint_times, np.cumsum(stint_counts) - stint_counts) + (stint_counts - 1) * pit_loss
+
+
+# Additive lap time model: base[c] + fuel[lap] + wear[c, age]. fuel is the per-lap effect shared by every
+# compound (fuel burn and track evolution), wear the loss of each compound over tyre age, with fuel[1] and
+# wear[c, 1] zero. Prefix sums over laps and tyre ages make any stint's cost O(1)
+class DegradationSurrogate:
+    def __init__(self, base, fuel, wear):
+        self.base = np.asarray(base, dtype=float)
+        self.fuel = np.asarray(fuel, dtype=float)
+        self.wear = np.asarray(wear, dtype=float)
+        # _fuel_prefix[k] is the fuel effect summed over laps 1..k, _wear_prefix[c, n] the wear over ages 1..n
+        self._fuel_prefix = np.cumsum(self.fuel)
+        self._wear_prefix = np.cumsum(self.wear, axis=1)
+
+    @property
+    def total_laps(self):
+        return len(self.fuel) - 1
+
+    def lap_times(self, compound_idx, laps, ages):
+        compound_idx, laps, ages = np.asarray(compound_idx), np.asarray(laps), np.asarray(ages)
+        return self.base[compound_idx] + self.fuel[laps] + self.wear[compound_idx, ages]
+
+    # Summed lap time of compound c fitted on lap `start` and run to lap `end` inclusive
+    def stint_cost(self, compound, start, end):
+        c = COMPOUNDS.index(compound)
+        n = end - start + 1
+        return n * self.base[c] + self._fuel_prefix[end] - self._fuel_prefix[start - 1] + self._wear_prefix[c, n]
+
+    # Every stint cost in the layout of optimizer.stint_cost_matrix, costs[c, start, end]
+    def stint_costs(self, total_laps):
+        start = np.arange(total_laps + 2)[:, None]
+        end = np.arange(total_laps + 1)[None, :]
+        n = end - start + 1
+        valid = (start >= 1) & (n >= 1)
+        n_idx = np.where(valid, n, 0)
+        fuel_sum = self._fuel_prefix[end] - self._fuel_prefix[np.clip(start - 1, 0, total_laps)]
+        costs = self.base[:, None, None] * n + fuel_sum + self._wear_prefix[:, n_idx]
+        return np.where(valid, costs, np.inf)
+
+    def to_dict(self):
+        return {'base': self.base.tolist(), 'fuel': self.fuel.tolist(), 'wear': self.wear.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['base'], data['fuel'], data['wear'])
+
+
+# Fit the surrogate to the forest's green-flag dry lap times on a grid of laps and tyre ages every `step` laps
+# (plus the last lap), by least squares on one column per grid lap and per (compound, grid age); the curves
+# are interpolated in between. The cells fetched stay in `cells` for re-ranking
+def fit_surrogate(cells, step=GRID_STEP):
+    total_laps = cells.total_laps
+    grid = np.unique(np.r_[np.arange(1, total_laps + 1, step), total_laps])
+    lap, age = np.meshgrid(grid, grid, indexing='ij')
+    reachable = age <= lap
+    lap, age = np.tile(lap[reachable], len(COMPOUNDS)), np.tile(age[reachable], len(COMPOUNDS))
+    compound_idx = np.repeat(np.arange(len(COMPOUNDS)), reachable.sum())
+    # Fitted without the rain slowdown, which surrogate_strategies applies per lap
+    lap_time = cells.get(compound_idx, lap, age) / cells.rain[lap]
+
+    position = np.searchsorted(grid, np.arange(total_laps + 1))
+    rows = np.arange(len(lap_time))
+    columns = np.zeros((len(lap_time), len(grid) * (1 + len(COMPOUNDS))))
+    columns[rows, position[lap]] = 1
+    columns[rows, len(grid) * (1 + compound_idx) + position[age]] = 1
+    coef = np.linalg.lstsq(columns, lap_time, rcond=None)[0]
+
+    laps = np.arange(total_laps + 1)
+    fuel = np.interp(laps, grid, coef[:len(grid)])
+    wear = np.stack([np.interp(laps, grid, coef[len(grid) * (1 + c):len(grid) * (2 + c)])
+                     for c in range(len(COMPOUNDS))])
+    base = wear[:, 1] + fuel[1]
+    fuel, wear = fuel - fuel[1], wear - wear[:, 1:2]
+    fuel[0], wear[:, 0] = 0.0, 0.0
+    return DegradationSurrogate(base, fuel, wear)
+
+
+# Strategy search with the surrogate's stint costs in place of the forest's lap table, best first.
+# per_state=1 keeps one plan per (stops, final compound, compound set), which spreads the results over
+# different stop counts and compound orders instead of near-copies of the best plan. Wet laps are slowed
+# by RAIN_FACTOR unless models_rain (the surrogate was fitted to a forest that predicts rain itself)
+def surrogate_strategies(surrogate, total_laps, weather, pit_loss=PIT_LOSS, max_stops=MAX_STOPS, top_k=TOP_K,
+                         per_state=None, models_rain=False):
+    rain = rain_factors(weather, np.arange(total_laps + 1), models_rain)
+    if np.all(rain == 1):
+        costs = surrogate.stint_costs(total_laps)
+    else:
+        # Wet laps are slowed one by one, which the prefix sums cannot do: sum the scaled lap times instead
+        lap, age = np.meshgrid(np.arange(total_laps + 1), np.arange(total_laps + 1), indexing='ij')
+        lap_times = np.stack([surrogate.lap_times(c, lap, age) for c in range(len(COMPOUNDS))]) * rain[None, :, None]
+        costs = stint_cost_matrix(lap_times, total_laps)
+    states = search_stint_plans(costs, total_laps, pit_loss, max_stops, per_state or top_k)
+    return best_plans(states, total_laps, max_stops, top_k)
+
+
+# Plans one move from a plan: a pit stop up to PIT_SHIFT laps earlier or later, or one stint on another
+# compound, keeping at least two compounds
+def neighbour_plans(strategy):
+    plans = []
+    for i in range(len(strategy) - 1):
+        for shift in range(-PIT_SHIFT, PIT_SHIFT + 1):
+            end = strategy[i][1] + shift
+            if shift and strategy[i][0] <= end < strategy[i + 1][1]:
+                plans.append(strategy[:i] + [(strategy[i][0], end, strategy[i][2]),
+                                             (end + 1, strategy[i + 1][1], strategy[i + 1][2])] + strategy[i + 2:])
+    for i, (start, end, compound) in enumerate(strategy):
+        for other in COMPOUNDS:
+            plan = strategy[:i] + [(start, end, other)] + strategy[i + 1:]
+            if other != compound and len({c for _, _, c in plan}) >= 2:
+                plans.append(plan)
+    return plans
+
+
+# Search on the surrogate, then finish on the forest: the best `candidates` plans (one per stop count and
+# compound sequence) are scored by the forest, the REFINE_STARTS best each descend to their best neighbouring
+# plan, and the neighbours of the REFINE_BEAM best plans found are scored until those stop changing. Returns
+# the top_k plans by forest race time, best first. Only the cells those plans visit are predicted; pass a
+# ForestCells to keep them
+def optimize_with_surrogate(model, feature_names, total_laps, weather, pit_loss=PIT_LOSS, max_stops=MAX_STOPS,
+                            top_k=TOP_K, candidates=RERANK_CANDIDATES, step=GRID_STEP, cells=None):
+    cells = cells or ForestCells(model, feature_names, total_laps, weather)
+    surrogate = fit_surrogate(cells, step)
+    scored = {}
+
+    # Forest race time of every plan not scored yet, all in one batch
+    def score(plans):
+        new = list({tuple(plan): plan for plan in plans if tuple(plan) not in scored}.values())
+        if new:
+            scored.update(zip(map(tuple, new), zip(cells.race_times(new, pit_loss).tolist(), new)))
+
+    def best(count):
+        return sorted(scored.values(), key=lambda entry: entry[0])[:count]
+
+    score([plan for plan, _ in surrogate_strategies(surrogate, total_laps, weather, pit_loss, max_stops,
+                                                    candidates, per_state=1, models_rain=cells.models_rain)])
+    # Every start takes its best neighbour while that improves on it; one batch per round for all of them
+    current = best(REFINE_STARTS)
+    while current:
+        neighbours = [neighbour_plans(plan) for _, plan in current]
+        score([plan for plans in neighbours for plan in plans])
+        moves = [min((scored[tuple(plan)] for plan in plans), key=lambda entry: entry[0], default=entry)
+                 for entry, plans in zip(current, neighbours)]
+        current = [move for move, entry in zip(moves, current) if move[0] < entry[0]]
+
+    expanded = set()
+    while True:
+        beam = [plan for _, plan in best(REFINE_BEAM) if tuple(plan) not in expanded]
+        if not beam:
+            break
+        expanded.update(map(tuple, beam))
+        score([neighbour for plan in beam for neighbour in neighbour_plans(plan)])
+    return [(plan, float(time)) for time, plan in best(top_k)]
@@ -0,0 +1,152 @@
+"""Strategy sensitivity sweeps: evaluates strategy candidates over a grid of pit losses, rain factors and
+shortened race lengths (red flags) from one set of lap time predictions, and prints where the best strategy
+changes."""
+import argparse
+import json
+
+import numpy as np
+
+from optimizer import MAX_STOPS, best_plans, search_stint_plans, stint_cost_matrix
+from prediction import RAIN_FACTOR, expand_strategies
+
+# Plans kept per search when building the candidate set
+CANDIDATES_PER_SEARCH = 64
+
+
+# The best plan of every stop count, final compound and compound set, searched at the lowest, middle and
+# highest pit loss of the sweep so that cheap- and expensive-stop plans are both candidates
+def candidate_strategies(lap_table, total_laps, pit_losses, max_stops=MAX_STOPS, extra=()):
+    lap_times = lap_table.times[lap_table.statuses.index('1') if '1' in lap_table.statuses else 0]
+    costs = stint_cost_matrix(lap_times[:, :total_laps + 1, :total_laps + 1], total_laps)
+    pit_losses = np.sort(np.asarray(pit_losses, dtype=float))
+    strategies = [list(strategy) for strategy in extra]
+    for pit_loss in sorted({pit_losses[0], pit_losses[len(pit_losses) // 2], pit_losses[-1]}):
+        states = search_stint_plans(costs, total_laps, pit_loss, max_stops, top_k=1)
+        for strategy, _ in best_plans(states, total_laps, max_stops, CANDIDATES_PER_SEARCH):
+            if strategy not in strategies:
+                strategies.append(strategy)
+    return strategies
+
+
+# Race time of every strategy at every (pit loss, rain factor, race length) grid point. A race stopped at
+# lap L counts the laps up to L and the stops made before it. The lap times are looked up once (dry, green
+# flag); race time is rain_factor * laps + pit_loss * stops, so the whole grid is one broadcast.
+# Returns the grid axes, the strategies, totals[s, p, r, l] and the best strategy index at each point
+def sweep(lap_table, strategies, total_laps, pit_losses, rain_factors=(1.0, RAIN_FACTOR), race_laps=None):
+    pit_losses = np.asarray(pit_losses, dtype=float)
+    rain_factors = np.asarray(rain_factors, dtype=float)
+    race_laps = np.asarray(race_laps if race_laps is not None else [total_laps], dtype=int)
+    if race_laps.min() < 1 or race_laps.max() > total_laps:
+        raise ValueError(f"Race lengths must be between 1 and {total_laps} laps")
+
+    laps, tyre_life, compounds, offsets = expand_strategies(strategies)
+    times = lap_table.lookup(laps, tyre_life, compounds)
+    strategy_rows = np.repeat(np.arange(len(strategies)), np.diff(offsets))
+    per_lap = np.zeros((len(strategies), total_laps + 1))
+    per_lap[strategy_rows, laps] = times
+    pit_laps = np.zeros((len(strategies), total_laps + 1))
+    for i, strategy in enumerate(strategies):
+        for _, end_lap, _ in strategy[:-1]:
+            pit_laps[i, end_lap] += 1
+
+    lap_time_sum = np.cumsum(per_lap, axis=1)[:, race_laps]
+    # A stop at the end of the final lap never happens: the race is over
+    stops = np.cumsum(pit_laps, axis=1)[:, race_laps - 1]
+    totals = (rain_factors[None, None, :, None] * lap_time_sum[:, None, None, :]
+              + pit_losses[None, :, None, None] * stops[:, None, None, :])
+    best = np.argmin(totals, axis=0)
+    return {'pit_loss': pit_losses, 'rain_factor': rain_factors, 'race_laps': race_laps, 'strategies': strategies,
+            'lap_time_sum': lap_time_sum, 'stops': stops, 'totals': totals, 'best': best,
+            'best_time': np.min(totals, axis=0)}
+
+
+# Where the best strategy changes along each axis with the other two held fixed. Along pit loss and rain
+# factor race time is linear, so the exact value where the two strategies tie is given as well
+def crossover_points(result):
+    strategies, best = result['strategies'], result['best']
+    lap_time_sum, stops = result['lap_time_sum'], result['stops']
+    pit_losses, rain_factors, race_laps = result['pit_loss'], result['rain_factor'], result['race_laps']
+    axes = [('pit_loss', pit_losses), ('rain_factor', rain_factors), ('race_laps', race_laps)]
+
+    crossovers = []
+    for axis, (name, values) in enumerate(axes):
+        changed = np.argwhere(np.diff(best, axis=axis) != 0)
+        for point in changed:
+            before = tuple(point)
+            after = tuple(point + np.eye(3, dtype=int)[axis])
+            a, b = best[before], best[after]
+            p, r, l = before
+            fixed = {'pit_loss': float(pit_losses[p]), 'rain_factor': float(rain_factors[r]),
+                     'race_laps': int(race_laps[l])}
+            del fixed[name]
+            at = None
+            if name == 'pit_loss' and stops[a, l] != stops[b, l]:
+                at = rain_factors[r] * (lap_time_sum[b, l] - lap_time_sum[a, l]) / (stops[a, l] - stops[b, l])
+            elif name == 'rain_factor' and lap_time_sum[a, l] != lap_time_sum[b, l]:
+                at = pit_losses[p] * (stops[b, l] - stops[a, l]) / (lap_time_sum[a, l] - lap_time_sum[b, l])
+            elif name == 'race_laps':
+                at = int(race_laps[after[2]])
+            crossovers.append({
+                'axis': name,
+                'between': [values[before[axis]].item(), values[after[axis]].item()],
+                'at': float(at) if name != 'race_laps' and at is not None else at,
+                'fixed': fixed,
+                'from': strategies[a],
+                'to': strategies[b],
+            })
+    return crossovers
+
+
+# Evenly spaced values from start to stop inclusive
+def value_range(start, stop, step):
+    return np.round(np.arange(start, stop + step / 2, step), 6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--gp', default='Monaco')
+    parser.add_argument('--years', type=int, nargs='+', default=[2022, 2023, 2024], help='seasons the model is trained on')
+    parser.add_argument('--pit-loss', type=float, nargs=3, default=[15, 30, 0.5], metavar=('MIN', 'MAX', 'STEP'))
+    parser.add_argument('--rain', type=float, nargs=3, default=[1.0, 1.3, 0.05], metavar=('MIN', 'MAX', 'STEP'))
+    parser.add_argument('--min-race-fraction', type=float, default=0.5,
+                        help='shortest red-flag race length swept, as a share of the full distance')
+    parser.add_argument('--synthetic', action='store_true', help='sweep a generated race instead of a recorded one')
+    parser.add_argument('--output', help='write the crossovers as JSON to this file')
+    args = parser.parse_args()
+
+    import backend
+
+    if args.synthetic:
+        import pandas as pd
+        from benchmarks.synthetic import synthetic_seasons
+        from lap_table import precompute_lap_table
+        sessions = synthetic_seasons(args.years, args.gp)
+        laps = pd.concat([s.laps for s in sessions], ignore_index=True)
+        model, feature_names = backend.train_ml_model(laps)
+        total_laps = int(laps['LapNumber'].max())
+        lap_table = precompute_lap_table(model, feature_names, total_laps, cache_dir=None,
+                                         weather=backend.get_f1_weather(sessions[-1]))
+    else:
+        gp_model = backend.get_gp_model(args.gp, args.years)
+        lap_table, total_laps = gp_model['lap_table'], gp_model['total_laps']
+
+    pit_losses, rain_factors = value_range(*args.pit_loss), value_range(*args.rain)
+    race_laps = np.arange(max(2, int(total_laps * args.min_race_fraction)), total_laps + 1)
+    strategies = candidate_strategies(lap_table, total_laps, pit_losses)
+    result = sweep(lap_table, strategies, total_laps, pit_losses, rain_factors, race_laps)
+    crossovers = crossover_points(result)
+
+    print(f"{len(strategies)} candidates x {len(pit_losses)} pit losses x {len(rain_factors)} rain factors x "
+          f"{len(race_laps)} race lengths")
+    full = result['best'][:, 0, -1]
+    for i in np.flatnonzero(np.r_[True, full[1:] != full[:-1]]):
+        stints = ', '.join(f"{start}-{end} {compound}" for start, end, compound in strategies[full[i]])
+        print(f"pit loss >= {pit_losses[i]:5.1f}s (rain factor {rain_factors[0]:g}, full distance): {stints}")
+    print(f"{len(crossovers)} crossovers")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(crossovers, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
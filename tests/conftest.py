@@ -0,0 +1,42 @@
+import importlib
+import os
+import sys
+
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+# The modules live at the repository root, next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import synthetic_seasons  # noqa: E402
+from lap_table import build_lap_time_table  # noqa: E402
+from training_frame import attach_weather, training_arrays, wet_laps  # noqa: E402
+
+SHORT_RACE_LAPS = 12
+
+
+# A small forest trained on two synthetic seasons of a 12-lap race, with its lap table for dry weather
+@pytest.fixture(scope='session')
+def short_race():
+    sessions = synthetic_seasons((2023, 2024), total_laps=SHORT_RACE_LAPS, drivers=8)
+    laps = pd.concat([attach_weather(s.laps, s.weather_data) for s in sessions], ignore_index=True)
+    features, target = training_arrays(laps)
+    model = RandomForestRegressor(n_estimators=10, random_state=0)
+    model.fit(features, target)
+    model.wet_laps_ = wet_laps(features)
+    weather = {'temperature': 25.0, 'track_temperature': 40.0, 'humidity': 50.0, 'weather_condition': 'Clear'}
+    return {'model': model, 'feature_names': features.columns, 'laps': laps, 'sessions': sessions,
+            'weather': weather, 'total_laps': SHORT_RACE_LAPS,
+            'lap_table': build_lap_time_table(model, features.columns, SHORT_RACE_LAPS, weather)}
+
+
+# Test client of the Flask backend with the short race registered as the 'Synthetic' GP
+@pytest.fixture
+def client(short_race, tmp_path, monkeypatch):
+    # backend enables the FastF1 cache and opens its stores relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    backend = importlib.import_module('backend')
+    gp_model = {key: short_race[key] for key in ('model', 'feature_names', 'weather', 'total_laps', 'lap_table')}
+    backend.model_registry.put(backend.gp_model_key('Synthetic', backend.DEFAULT_YEARS), gp_model)
+    return backend.app.test_client()
@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from benchmarks.run import REPO_ROOT, compare
+from benchmarks.synthetic import SC_SLOWDOWN, synthetic_laps, synthetic_session, synthetic_weather
+
+
+def test_synthetic_session_looks_like_fastf1():
+    session = synthetic_session(2024, total_laps=20, drivers=5)
+    laps = session.laps
+    assert laps.groupby('Driver')['LapNumber'].count().tolist() == [20] * 5
+    assert str(laps['LapTime'].dtype).startswith('timedelta64')
+    assert ((laps['Time'] - laps['LapStartTime']) == laps['LapTime']).all()
+    assert set(laps['Compound']) <= {'SOFT', 'MEDIUM', 'HARD'}
+    assert session.weather_data['Time'].max() >= laps['Time'].max()
+
+
+def test_safety_car_and_rain():
+    laps = synthetic_laps(total_laps=20, drivers=5, sc_laps={10})
+    lap_seconds = laps['LapTime'].dt.total_seconds()
+    assert (laps.loc[laps['LapNumber'] == 10, 'TrackStatus'] == '4').all()
+    assert lap_seconds[laps['LapNumber'] == 10].min() > lap_seconds[laps['LapNumber'] == 9].max() * SC_SLOWDOWN * 0.9
+
+    weather = synthetic_weather(3600, rain_from=1800)
+    np.testing.assert_array_equal(weather['Rainfall'], weather['Time'].dt.total_seconds() >= 1800)
+
+
+def test_suite_runs_offline(tmp_path):
+    output = tmp_path / 'bench.json'
+    subprocess.run([sys.executable, '-m', 'benchmarks.run', '--laps', '10', '--drivers', '4', '--seasons', '2',
+                    '--repeat', '1', '--output', str(output)], cwd=REPO_ROOT, check=True, capture_output=True,
+                   env={**os.environ, 'F1_WARM_GPS': ''})
+    report = json.loads(output.read_text())
+    assert {'train', 'strategy_search', 'predict_endpoint_cold', 'predict_endpoint_warm'} <= set(report['results'])
+    assert all(stage['min'] > 0 for stage in report['results'].values())
+    assert compare(report['results'], report, threshold=1.2) == []
@@ -0,0 +1,90 @@
+import os
+import pickle
+import sqlite3
+
+import fastf1
+import pytest
+
+import cache_manager
+from benchmarks.synthetic import synthetic_session
+from cache_manager import HTTP_CACHE_FILE, cache_entries, enforce_size_limit, verify_cache
+from lap_store import read_session
+
+
+# A FastF1 cache entry (one session directory of .ff1pkl files) last used at `mtime`, 1000 bytes of data
+def make_entry(cache_dir, path, mtime):
+    entry = cache_dir / path
+    entry.mkdir(parents=True)
+    with open(entry / 'laps.ff1pkl', 'wb') as f:
+        pickle.dump({'version': fastf1.Cache._API_CORE_VERSION, 'data': b'0' * 1000}, f)
+    for file in (entry / 'laps.ff1pkl', entry):
+        os.utime(file, (mtime, mtime))
+    return str(entry)
+
+
+def make_http_cache(cache_dir, mtime):
+    path = cache_dir / HTTP_CACHE_FILE
+    with sqlite3.connect(path) as connection:
+        connection.execute('CREATE TABLE responses (body BLOB)')
+        connection.execute('INSERT INTO responses VALUES (zeroblob(1000))')
+    connection.close()
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    # No HTTP cache held open by this process unless a test says so
+    monkeypatch.setattr(fastf1.Cache, '_CACHE_DIR', None)
+    (tmp_path / 'laps' / 'v2').mkdir(parents=True)
+    return tmp_path
+
+
+def test_evicts_least_recently_used_first(cache_dir):
+    old = make_entry(cache_dir, '2022/2022-05-29_Monaco_Grand_Prix/2022-05-29_Race', 1000)
+    http_cache = make_http_cache(cache_dir, 2000)
+    new = make_entry(cache_dir, '2024/2024-05-26_Monaco_Grand_Prix/2024-05-26_Race', 3000)
+    assert sorted(cache_entries(str(cache_dir))) == sorted([old, http_cache, new])
+
+    sizes = {path: cache_manager.entry_usage(path)[0] for path in (old, http_cache, new)}
+    removed = enforce_size_limit(sizes[http_cache] + sizes[new], str(cache_dir))
+    assert removed == [old]
+    assert enforce_size_limit(sizes[new], str(cache_dir)) == [http_cache]
+    assert os.path.isdir(new) and os.path.isdir(cache_dir / 'laps' / 'v2')
+
+
+def test_keeps_http_cache_held_open(cache_dir, monkeypatch):
+    monkeypatch.setattr(fastf1.Cache, '_CACHE_DIR', str(cache_dir))
+    monkeypatch.setattr(fastf1.Cache, '_requests_session_cached', object())
+    http_cache = make_http_cache(cache_dir, 1000)
+    entry = make_entry(cache_dir, '2024/2024-05-26_Monaco_Grand_Prix/2024-05-26_Race', 2000)
+
+    assert enforce_size_limit(1, str(cache_dir)) == [entry]
+    assert os.path.isfile(http_cache)
+
+
+def test_verify_finds_and_repairs_broken_files(cache_dir):
+    entry = make_entry(cache_dir, '2024/2024-05-26_Monaco_Grand_Prix/2024-05-26_Race', 1000)
+    good = make_entry(cache_dir, '2023/2023-05-28_Monaco_Grand_Prix/2023-05-28_Race', 1000)
+    open(os.path.join(entry, 'weather.ff1pkl'), 'wb').close()
+    with open(os.path.join(entry, 'laps.ff1pkl'), 'r+b') as f:
+        f.truncate(100)
+    with open(cache_dir / HTTP_CACHE_FILE, 'wb') as f:
+        f.write(b'SQLite format 3\x00' + b'\xff' * 200)
+
+    problems = dict(verify_cache(str(cache_dir)))
+    assert problems == {os.path.join(entry, 'laps.ff1pkl'): 'truncated', os.path.join(entry, 'weather.ff1pkl'): 'empty',
+                        str(cache_dir / HTTP_CACHE_FILE): problems[str(cache_dir / HTTP_CACHE_FILE)]}
+    assert problems[str(cache_dir / HTTP_CACHE_FILE)].startswith('corrupt database')
+
+    verify_cache(str(cache_dir), repair=True)
+    assert verify_cache(str(cache_dir)) == []
+    assert os.listdir(entry) == [] and os.path.isfile(os.path.join(good, 'laps.ff1pkl'))
+
+
+def test_prefetch_writes_lap_store_inside_cache_dir(cache_dir, monkeypatch):
+    monkeypatch.setattr(cache_manager, 'fetch_session', lambda year, gp_name, *args: synthetic_session(
+        year, gp_name, total_laps=6, drivers=2))
+    sessions = [(2024, 'Synthetic GP', 'R')]
+    assert cache_manager.prefetch(sessions, cache_dir=str(cache_dir)) == sessions
+    assert read_session(2024, 'Synthetic GP', store_dir=str(cache_dir / 'laps')) is not None
@@ -0,0 +1,29 @@
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from flat_forest import SMALL_BATCH, FlatForest, fast_predict
+from prediction import build_feature_matrix, expand_strategies
+
+
+def test_matches_model_predict(short_race):
+    model, feature_names = short_race['model'], short_race['feature_names']
+    strategies = [[(1, 5, 'SOFT'), (6, 12, 'HARD')], [(1, 12, 'MEDIUM')]]
+    laps, tyre_life, compounds, _ = expand_strategies(strategies)
+    X = build_feature_matrix(laps, tyre_life, compounds, feature_names)
+
+    np.testing.assert_array_equal(FlatForest.from_model(model).predict(X), model.predict(X))
+    np.testing.assert_array_equal(fast_predict(model, X), model.predict(X))
+
+
+# Trees fitted on data with missing values send NaNs down the side recorded at each split
+def test_matches_model_predict_with_missing_values():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 4))
+    y = 2 * X[:, 0] + X[:, 1] + rng.normal(0, 0.1, len(X))
+    X[rng.random(X.shape) < 0.2] = np.nan
+    model = RandomForestRegressor(n_estimators=8, random_state=0).fit(X, y)
+
+    queries = rng.normal(size=(SMALL_BATCH, 4))
+    queries[rng.random(queries.shape) < 0.3] = np.nan
+    np.testing.assert_array_equal(FlatForest.from_model(model).predict(queries), model.predict(queries))
+    np.testing.assert_array_equal(fast_predict(model, queries), model.predict(queries))
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_session
+from lap_store import LAP_COLUMNS, WEATHER_COLUMNS, load_sessions, read_session, write_session
+
+
+def memory_mapped(array):
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base
+    return array is not None
+
+
+def test_write_then_memory_map(tmp_path):
+    session = synthetic_session(2024, 'Synthetic GP', total_laps=10, drivers=4)
+    write_session(session, 2024, 'Synthetic GP', store_dir=tmp_path)
+    stored = read_session(2024, 'Synthetic GP', store_dir=tmp_path)
+
+    assert list(stored.laps.columns) == LAP_COLUMNS
+    assert list(stored.weather_data.columns) == WEATHER_COLUMNS
+    assert memory_mapped(stored.laps['LapNumber'].to_numpy())
+    for column in ('Driver', 'Compound', 'TrackStatus'):
+        assert stored.laps[column].astype(str).tolist() == session.laps[column].astype(str).tolist()
+    for column in ('LapNumber', 'TyreLife'):
+        np.testing.assert_array_equal(stored.laps[column], session.laps[column].astype(np.float32))
+    pd.testing.assert_series_equal(pd.to_timedelta(stored.laps['LapTime']), session.laps['LapTime'],
+                                   check_names=False)
+    np.testing.assert_array_equal(stored.weather_data['Rainfall'], session.weather_data['Rainfall'])
+
+
+def test_stored_sessions_load_without_fastf1(tmp_path):
+    for year in (2023, 2024):
+        write_session(synthetic_session(year, total_laps=10, drivers=4), year, 'Synthetic', store_dir=tmp_path)
+
+    sessions = load_sessions([(2023, 'Synthetic'), (2024, 'Synthetic')], store_dir=tmp_path)
+    assert [session.year for session in sessions] == [2023, 2024]
+    assert read_session(2022, 'Synthetic', store_dir=tmp_path) is None
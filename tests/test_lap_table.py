@@ -0,0 +1,39 @@
+import os
+
+from sklearn.ensemble import RandomForestRegressor
+
+import lap_table
+from lap_table import model_fingerprint, precompute_lap_table
+from model_store import save_model
+from training_frame import training_arrays
+
+
+def test_memory_cache_evicts_least_recently_used(short_race, monkeypatch):
+    monkeypatch.setattr(lap_table, '_tables', lap_table.ModelRegistry(2))
+    model, feature_names = short_race['model'], short_race['feature_names']
+
+    def table(temperature):
+        weather = {**short_race['weather'], 'temperature': temperature}
+        return precompute_lap_table(model, feature_names, 4, cache_dir=None, weather=weather)
+
+    first, second = table(20.0), table(25.0)
+    # The hit on the first table makes the second the least recently used, so the third evicts it
+    assert table(20.0) is first
+    table(30.0)
+    assert table(20.0) is first
+    assert table(25.0) is not second
+
+
+def test_replacing_a_model_prunes_its_lap_tables(short_race, tmp_path):
+    model, feature_names = short_race['model'], short_race['feature_names']
+    key = ('Synthetic', (2023, 2024), tuple(feature_names))
+    save_model(key, model, feature_names, 'old', model_dir=str(tmp_path))
+    precompute_lap_table(model, feature_names, 4, cache_dir=str(tmp_path), weather=short_race['weather'])
+    old_tables = [name for name in os.listdir(tmp_path)
+                  if name.startswith(f'lap_table_{model_fingerprint(model, feature_names)}')]
+    assert old_tables
+
+    features, target = training_arrays(short_race['laps'])
+    replacement = RandomForestRegressor(n_estimators=2, random_state=1).fit(features, target)
+    save_model(key, replacement, features.columns, 'new', model_dir=str(tmp_path))
+    assert not set(old_tables) & set(os.listdir(tmp_path))
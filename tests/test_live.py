@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from live import LiveStrategy, replay_laps
+from optimizer import MAX_STOPS
+
+
+@pytest.fixture
+def live(short_race):
+    return LiveStrategy(short_race['lap_table'], short_race['total_laps'], short_race['weather'])
+
+
+def test_plan_covers_rest_of_race(live):
+    plan = live.plan(4, 'SOFT', 4, 0, ['SOFT'])
+    strategy = plan['strategy']
+    assert strategy[0][0] == 5 and strategy[0][2] == 'SOFT' and strategy[-1][1] == 12
+    assert all(start == end + 1 for (_, end, _), (start, _, _) in zip(strategy, strategy[1:]))
+    assert len({compound for _, _, compound in strategy}) >= 2
+
+
+def test_infeasible_state_has_no_plan(live):
+    # One dry compound so far and no stops left: the two-compound rule cannot be met
+    assert live.plan(6, 'SOFT', 6, MAX_STOPS, ['SOFT']) is None
+    assert live.plan(12, 'SOFT', 12, 1, ['MEDIUM', 'SOFT']) is None
+    assert live.plan(6, 'WET', 6, 0, ['WET']) is None
+
+
+def test_resent_laps_are_skipped(short_race, live):
+    once = LiveStrategy(short_race['lap_table'], short_race['total_laps'], short_race['weather'])
+    for lap in range(1, 5):
+        once.add_lap(lap, 'SOFT', lap, 76.0)
+    for lap in range(1, 4):
+        live.add_lap(lap, 'SOFT', lap, 76.0)
+    assert [live.add_lap(lap, 'SOFT', lap, 76.0) for lap in range(1, 5)] == [False, False, False, True]
+    assert live.plan(4, 'SOFT', 4, 0, ['SOFT']) == once.plan(4, 'SOFT', 4, 0, ['SOFT'])
+
+
+def test_live_plan_rejects_infeasible_state(client):
+    state = {'gp_name': 'Synthetic', 'lap': 6, 'compound': 'SOFT', 'tyre_life': 6, 'compounds_used': ['SOFT']}
+    assert client.post('/live/plan', json={**state, 'stops': 0}).status_code == 200
+    assert client.post('/live/plan', json={**state, 'stops': MAX_STOPS}).status_code == 400
+    assert client.post('/live/plan', json={**state, 'compound': 'PURPLE'}).status_code == 400
+
+
+def test_live_plan_rejects_missing_or_non_numeric_state(client):
+    state = {'gp_name': 'Synthetic', 'lap': 6, 'compound': 'SOFT', 'tyre_life': 6, 'compounds_used': ['SOFT']}
+    missing = {key: value for key, value in state.items() if key != 'lap'}
+    response = client.post('/live/plan', json=missing)
+    assert response.status_code == 400 and 'lap' in response.get_json()['error']
+    assert client.post('/live/plan', json={**state, 'tyre_life': 'six'}).status_code == 400
+    assert client.post('/live/plan', json={**state, 'stops': None}).status_code == 400
+    assert client.post('/live/plan', json={**state, 'pit_loss': 'fast'}).status_code == 400
+
+
+def test_replay_skips_laps_without_tyre_data(short_race, live):
+    driver_laps = short_race['sessions'][-1].laps
+    driver_laps = driver_laps[driver_laps['Driver'] == 'D00'].copy()
+    driver_laps.loc[driver_laps['LapNumber'] == 1, 'TyreLife'] = np.nan
+    driver_laps.loc[driver_laps['LapNumber'] == 6, 'Compound'] = np.nan
+
+    replayed = [int(row.LapNumber) for row, _, _ in replay_laps(live, driver_laps)]
+    assert replayed == [lap for lap in range(1, 13) if lap not in (1, 6)]
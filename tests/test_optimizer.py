@@ -0,0 +1,37 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from optimizer import MAX_STOPS, optimize_strategies
+from prediction import COMPOUNDS
+
+
+# Every legal plan of up to max_stops stops using at least two compounds, scored lap by lap from the table
+def brute_force_plans(lap_table, total_laps, pit_loss, max_stops=MAX_STOPS):
+    times = lap_table.times[lap_table.statuses.index('1')]
+    plans = []
+    for stops in range(1, max_stops + 1):
+        for pits in itertools.combinations(range(1, total_laps), stops):
+            bounds = list(zip((1,) + tuple(p + 1 for p in pits), pits + (total_laps,)))
+            for compounds in itertools.product(range(len(COMPOUNDS)), repeat=stops + 1):
+                if len(set(compounds)) < 2:
+                    continue
+                cost = stops * pit_loss + sum(times[c, lap, lap - start + 1]
+                                              for (start, end), c in zip(bounds, compounds)
+                                              for lap in range(start, end + 1))
+                plans.append(([(start, end, COMPOUNDS[c]) for (start, end), c in zip(bounds, compounds)], cost))
+    return sorted(plans, key=lambda plan: plan[1])
+
+
+@pytest.mark.parametrize('pit_loss', [5.0, 20.0])
+def test_top_k_matches_brute_force(short_race, pit_loss):
+    total_laps = short_race['total_laps']
+    plans = brute_force_plans(short_race['lap_table'], total_laps, pit_loss)
+    found = optimize_strategies(short_race['lap_table'], total_laps, short_race['weather'], pit_loss=pit_loss, top_k=5)
+
+    # The forest's lap times can tie, so plans are checked by their brute-force cost rather than their order
+    np.testing.assert_allclose([cost for _, cost in found], [cost for _, cost in plans[:5]])
+    costs = {str(plan): cost for plan, cost in plans}
+    np.testing.assert_allclose([costs[str(plan)] for plan, _ in found], [cost for _, cost in found])
+    assert len({str(plan) for plan, _ in found}) == 5
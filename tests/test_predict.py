@@ -0,0 +1,19 @@
+import pytest
+
+FORECAST = [{'AirTemp': 24.0, 'TrackTemp': 38.0, 'Humidity': 55.0, 'Rainfall': 0}]
+
+
+@pytest.mark.parametrize('forecast', [{'AirTemp': 24.0}, [24.0], [{**FORECAST[0], 'Rainfall': 'heavy'}],
+                                      FORECAST + [{'AirTemp': None}]])
+def test_malformed_forecast_is_rejected(client, forecast):
+    body = {'gp_name': 'Synthetic', 'forecast': forecast}
+    for path, json in (('/predict', body), ('/predict/jobs', body), ('/predict/batch', {'requests': [body]})):
+        response = client.post(path, json=json)
+        assert response.status_code == 400, path
+        assert 'forecast' in response.get_json()['error'].lower()
+
+
+def test_prediction_follows_forecast(client):
+    response = client.post('/predict', json={'gp_name': 'Synthetic', 'driver_name': 'D00', 'forecast': FORECAST})
+    assert response.status_code == 200
+    assert response.get_json()['best_strategy']['strategy'][-1][1] == 12
@@ -0,0 +1,31 @@
+import numpy as np
+
+from optimizer import optimize_strategies, stint_cost_matrix
+from prediction import COMPOUNDS
+from surrogate import ForestCells, fit_surrogate, optimize_with_surrogate
+
+
+def test_prefix_sum_stint_costs(short_race):
+    total_laps = short_race['total_laps']
+    cells = ForestCells(short_race['model'], short_race['feature_names'], total_laps, short_race['weather'])
+    surrogate = fit_surrogate(cells, step=3)
+    lap, age = np.meshgrid(np.arange(total_laps + 1), np.arange(total_laps + 1), indexing='ij')
+    lap_times = np.stack([surrogate.lap_times(c, lap, age) for c in range(len(COMPOUNDS))])
+
+    costs = surrogate.stint_costs(total_laps)
+    np.testing.assert_allclose(costs, stint_cost_matrix(lap_times, total_laps))
+    assert np.isclose(surrogate.stint_cost('MEDIUM', 3, 9), lap_times[1, np.arange(3, 10), np.arange(1, 8)].sum())
+
+
+def test_finds_the_forest_optimum(short_race):
+    model, feature_names, total_laps = short_race['model'], short_race['feature_names'], short_race['total_laps']
+    expected = optimize_strategies(short_race['lap_table'], total_laps, short_race['weather'])
+    cells = ForestCells(model, feature_names, total_laps, short_race['weather'])
+    found = optimize_with_surrogate(model, feature_names, total_laps, short_race['weather'], step=3, cells=cells)
+
+    assert np.isclose(found[0][1], expected[0][1])
+    # The forest's lap times, predicted cell by cell instead of as a whole table
+    table = short_race['lap_table'].times[short_race['lap_table'].statuses.index('1')]
+    known = ~np.isnan(cells.times)
+    np.testing.assert_array_equal(cells.times[known], table[known])
+    assert cells.predicted < np.isfinite(table).sum()
@@ -0,0 +1,13 @@
+def test_sweep_finds_best_strategy_per_cell(client):
+    response = client.post('/sweep', json={'gp_name': 'Synthetic', 'pit_losses': [15, 25], 'rain_factors': [1.0],
+                                           'race_laps': [8, 12]})
+    assert response.status_code == 200
+    assert len(response.get_json()['best']) == 2
+
+
+def test_sweep_rejects_bad_grids(client):
+    for body in ({'pit_losses': []}, {'pit_losses': 20}, {'rain_factors': ['wet']}, {'rain_factors': [1.0, None]},
+                 {'race_laps': [40]}):
+        response = client.post('/sweep', json={'gp_name': 'Synthetic', **body})
+        assert response.status_code == 400, body
+        assert 'error' in response.get_json()
@@ -0,0 +1,191 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from prediction import WEATHER_FEATURES
+
+# Fixed model input shared by training and prediction: numbers, the weather during the lap, one flag per
+# compound and one per track status digit (FastF1 joins concurrent statuses, e.g. '41' is green after a safety car)
+COMPOUND_CATEGORIES = ['HARD', 'MEDIUM', 'SOFT', 'INTERMEDIATE', 'WET']
+TRACK_STATUS_FLAGS = ['1', '2', '4', '6', '7']
+NUMERIC_FEATURES = ['LapNumber', 'TyreLife'] + WEATHER_FEATURES
+FEATURE_NAMES = (NUMERIC_FEATURES + [f'Compound_{c}' for c in COMPOUND_CATEGORIES]
+                 + [f'TrackStatus_{s}' for s in TRACK_STATUS_FLAGS])
+
+CATEGORY_COLUMNS = ['Compound', 'TrackStatus', 'Driver', 'GP']
+
+
+# Session time each lap started, in ns; FastF1 leaves LapStartTime empty on some laps, where Time - LapTime is used
+def _lap_start_ns(laps):
+    if 'LapStartTime' in laps:
+        start = laps['LapStartTime'].to_numpy(dtype='timedelta64[ns]')
+    else:
+        start = np.full(len(laps), np.timedelta64('NaT'), dtype='timedelta64[ns]')
+    if 'Time' in laps and 'LapTime' in laps:
+        start = np.where(np.isnat(start), laps['Time'].to_numpy(dtype='timedelta64[ns]')
+                         - laps['LapTime'].to_numpy(dtype='timedelta64[ns]'), start)
+    return start
+
+
+# Weather reading in force when each lap started: an as-of join of weather_data on session time done with
+# one searchsorted per race. Laps before the first reading take the first one and laps without a start time
+# the last one; races without weather give NaN, which the forest treats as missing
+def lap_weather(laps, weather_data):
+    weather = {name: np.full(len(laps), np.nan, dtype=np.float32) for name in WEATHER_FEATURES}
+    if weather_data is None or 'Time' not in weather_data or not len(weather_data):
+        return weather
+    readings = weather_data.sort_values('Time')
+    reading_time = readings['Time'].to_numpy(dtype='timedelta64[ns]')
+    start = _lap_start_ns(laps)
+    idx = np.searchsorted(reading_time, start, side='right') - 1
+    idx = np.where(np.isnat(start), len(reading_time) - 1, np.clip(idx, 0, None))
+    for name in WEATHER_FEATURES:
+        if name in readings:
+            weather[name] = readings[name].to_numpy(dtype=np.float32)[idx]
+    return weather
+
+
+# Copy of a race's laps with the weather columns attached
+def attach_weather(laps, weather_data):
+    return laps.assign(**lap_weather(laps, weather_data))
+
+
+# Codes and string categories of the kept rows, reusing existing codes when the column is already
+# categorical (as it is when read from the lap store)
+def _codes(values, keep):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy()[keep], [str(c) for c in values.cat.categories]
+    codes, uniques = pd.factorize(values.to_numpy()[keep])
+    return codes, [str(u) for u in uniques]
+
+
+# Training columns of one race as plain arrays, with (codes, categories) pairs for the categorical ones.
+# Weather comes from weather_data when given, else from weather columns already on the laps
+def _compact_columns(laps, year=None, gp_name=None, weather_data=None):
+    keep = (laps['LapTime'].notna() & laps['LapNumber'].notna()).to_numpy()
+    n = int(keep.sum())
+    lap_time = laps['LapTime'].to_numpy()[keep]
+    if np.issubdtype(lap_time.dtype, np.timedelta64):
+        lap_time = lap_time / np.timedelta64(1, 's')
+
+    columns = {
+        'LapNumber': laps['LapNumber'].to_numpy()[keep].astype(np.int16),
+        'TyreLife': (laps['TyreLife'].to_numpy(dtype=np.float32)[keep] if 'TyreLife' in laps
+                     else np.full(n, np.nan, dtype=np.float32)),
+        'LapTimeSeconds': lap_time.astype(np.float32),
+    }
+    if weather_data is not None:
+        weather = lap_weather(laps, weather_data)
+    else:
+        weather = {name: (laps[name].to_numpy(dtype=np.float32) if name in laps
+                          else np.full(len(laps), np.nan, dtype=np.float32)) for name in WEATHER_FEATURES}
+    for name in WEATHER_FEATURES:
+        columns[name] = weather[name][keep]
+    columns.update({
+        'Compound': _codes(laps['Compound'], keep),
+        'TrackStatus': _codes(laps['TrackStatus'], keep),
+    })
+    if 'Driver' in laps:
+        columns['Driver'] = _codes(laps['Driver'], keep)
+    if 'GP' in laps:
+        columns['GP'] = _codes(laps['GP'], keep)
+    elif gp_name is not None:
+        columns['GP'] = (np.zeros(n, dtype=np.int8), [str(gp_name)])
+    if 'Year' in laps:
+        columns['Year'] = laps['Year'].to_numpy()[keep].astype(np.int16)
+    elif year is not None:
+        columns['Year'] = np.full(n, year, dtype=np.int16)
+    return columns
+
+
+# One categorical from per-race codes, translating each race's categories into a shared list. With fixed
+# categories (Compound), anything outside them becomes missing
+def _merge_codes(parts, categories=None):
+    index = {c: i for i, c in enumerate(categories or [])}
+    merged = []
+    for codes, uniques in parts:
+        if categories is None:
+            remap = [index.setdefault(u, len(index)) for u in uniques]
+        else:
+            remap = [index.get(u, -1) for u in uniques]
+        merged.append(np.array(remap + [-1], dtype=np.int32)[codes])
+    return pd.Categorical.from_codes(np.concatenate(merged), categories=list(index))
+
+
+def _frame(races):
+    columns = {}
+    for name in races[0]:
+        parts = [race[name] for race in races]
+        if name in CATEGORY_COLUMNS:
+            columns[name] = _merge_codes(parts, COMPOUND_CATEGORIES if name == 'Compound' else None)
+        else:
+            columns[name] = np.concatenate(parts)
+    return pd.DataFrame(columns, copy=False)
+
+
+# Timed laps reduced to the training columns: int16 lap numbers, float32 tyre life and lap time in
+# seconds, categorical Compound/TrackStatus/Driver/GP
+def compact_laps(laps, year=None, gp_name=None):
+    return _frame([_compact_columns(laps, year, gp_name)])
+
+
+# Compact training frame for many races with their weather, built one race at a time so no full-width copy
+# of every race's laps is ever made
+def training_frame_from_sessions(sessions):
+    return _frame([_compact_columns(session.laps, session.year, session.gp_name, session.weather_data)
+                   for session in sessions])
+
+
+# float32 model input in the FEATURE_NAMES layout, written column by column into one preallocated block
+def feature_array(frame):
+    n = len(frame)
+    X = np.zeros((n, len(FEATURE_NAMES)), dtype=np.float32)
+    for i, name in enumerate(NUMERIC_FEATURES):
+        X[:, i] = frame[name].to_numpy() if name in frame else np.nan
+
+    offset = len(NUMERIC_FEATURES)
+    compound_codes = frame['Compound'].cat.codes.to_numpy()
+    known = np.flatnonzero(compound_codes >= 0)
+    X[known, offset + compound_codes[known]] = 1
+
+    status = frame['TrackStatus'].cat
+    offset += len(COMPOUND_CATEGORIES)
+    # One row per category plus a zero row that missing codes (-1) index
+    flags = np.zeros((len(status.categories) + 1, len(TRACK_STATUS_FLAGS)), dtype=np.float32)
+    for i, category in enumerate(status.categories):
+        flags[i] = [flag in str(category) for flag in TRACK_STATUS_FLAGS]
+    status_codes = status.codes.to_numpy()
+    for j in range(len(TRACK_STATUS_FLAGS)):
+        X[:, offset + j] = flags[status_codes, j]
+    return X
+
+
+# Features (a DataFrame over the float32 block, not a copy) and float32 targets for a laps frame or a
+# compact frame
+def training_arrays(laps):
+    frame = laps if 'LapTimeSeconds' in laps.columns else compact_laps(laps)
+    features = pd.DataFrame(feature_array(frame), columns=FEATURE_NAMES, copy=False)
+    return features, frame['LapTimeSeconds'].to_numpy()
+
+
+# Laps of a training set run in the rain; the training functions keep it on the model as wet_laps_ so
+# prediction.learns_rain can tell whether the model's Rainfall feature means anything
+def wet_laps(features):
+    return int((features['Rainfall'] > 0).sum()) if 'Rainfall' in features else 0
+
+
+# Run fn and report the peak Python/NumPy memory it allocated, in bytes
+def peak_memory(fn, *args, **kwargs):
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        result = fn(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return result, peak